@@ -1,68 +1,102 @@
 # chat/ai_services.py
 import time
+import asyncio
 import logging
-from typing import List, Dict, Optional
-import google.generativeai as genai
-from decouple import config
+from typing import AsyncIterator, List, Dict, Optional
+from django.conf import settings
+from core import metrics
+from .llm_providers import LLMProvider, circuit_states, in_flight, provider_from_settings
+from .resilience import Deadline, RetryPolicy, is_retryable
 
 logger = logging.getLogger(__name__)
 
+LLM_SECONDS = metrics.histogram(
+    "llm_request_seconds", "LLM calls per attempt (streams: until the last chunk).",
+    ("provider", "method", "outcome"),
+)
+LLM_RETRIES = metrics.counter("llm_retries_total", "LLM attempts that failed and were retried.", ("provider", "method"))
+LLM_FAILURES = metrics.counter(
+    "llm_failed_requests_total",
+    "Requests left without an LLM answer, by reason: circuit_open, bulkhead_full (failed fast), "
+    "non_retryable, deadline, attempts.",
+    ("provider", "method", "reason"),
+)
+metrics.gauge("llm_circuit_state", "LLM circuit breakers: 0 closed, 1 half-open, 2 open.", circuit_states,
+              ("provider",))
+metrics.gauge("llm_in_flight", "LLM calls in flight.", in_flight, ("provider",))
+
+NOT_CONFIGURED_RESPONSE = "AI service is not configured."
+EMPTY_RESPONSE = "I couldn't generate a response."
+ERROR_RESPONSE = "Sorry, I had trouble generating a response. Please try again later."
+# Placeholder answers (never worth caching)
+FALLBACK_RESPONSES = frozenset({NOT_CONFIGURED_RESPONSE, EMPTY_RESPONSE, ERROR_RESPONSE})
+
+
+class StreamInterrupted(RuntimeError):
+    """A streamed answer failed after part of it was sent (the answer is incomplete)."""
+
+
+def retry_policy_from_settings() -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=getattr(settings, "LLM_MAX_ATTEMPTS", 3),
+        backoff_base=getattr(settings, "LLM_BACKOFF_BASE", 0.2),
+        backoff_max=getattr(settings, "LLM_BACKOFF_MAX", 2.0),
+        deadline=getattr(settings, "LLM_DEADLINE_SECONDS", 15),
+        queue_wait=getattr(settings, "LLM_QUEUE_WAIT_SECONDS", 1.0),
+    )
+
 
 class AIService:
     """
-    Gemini wrapper for chat-style generation with RAG context.
-    Expects history as a list of dicts:
+    Chat-style generation with RAG context on an LLM provider (see
+    chat/llm_providers.py). Expects history as a list of dicts:
         [{"role": "user"/"assistant", "content": "..."}]
-    """
 
-    def __init__(self, model_name: Optional[str] = None):
-        api_key = config("GEMINI_API_KEY", default="")
-        if not api_key:
-            logger.error("GEMINI_API_KEY not set — AIService disabled.")
-            self.model = None
-            return
+    The first provider is the default; the others can be picked per request
+    with provider="<name>".
 
-        # Configure Gemini client
-        genai.configure(api_key=api_key)
+    Each request gets policy.deadline seconds in total. Only transient
+    errors are retried, after a jittered exponential backoff. While the
+    provider's circuit breaker is open, or all its bulkhead slots stay busy
+    for policy.queue_wait, requests fail fast with ERROR_RESPONSE.
+    """
 
-        self.model_name = model_name or config("GEMINI_MODEL", default="gemini-2.5-flash")
-        self.temperature = float(config("GEMINI_TEMPERATURE", default="0.7"))
-        self.max_tokens = int(config("GEMINI_MAX_TOKENS", default="512"))
+    # Bump whenever _build_messages changes, so cached answers are not reused
+    PROMPT_VERSION = "1"
 
-        try:
-            self.model = genai.GenerativeModel(self.model_name)
-            logger.info("AIService initialized with model: %s", self.model_name)
-        except Exception as e:
-            logger.error("Failed to initialize Gemini model: %s", e)
-            self.model = None
+    def __init__(self, providers: Optional[List[LLMProvider]] = None, policy: Optional[RetryPolicy] = None):
+        self.providers: Dict[str, LLMProvider] = {p.name: p for p in providers or []}
+        self.default = providers[0].name if providers else None
+        self.policy = policy or retry_policy_from_settings()
 
-    def generate_response(
-        self, query: str, context: str = "", history: Optional[List[Dict]] = None
-    ) -> str:
-        """
-        Generate a response using Gemini with RAG context and optional history.
-        - query:   the user’s question
-        - context: retrieved chunks from FAISS
-        - history: list of previous messages [{"role": "user"/"assistant", "content": "..."}]
-        """
-        if not self.model:
-            return "AI service is not configured."
+    def provider(self, name: Optional[str] = None) -> Optional[LLMProvider]:
+        """The named provider (default: the first one)."""
+        name = name or self.default
+        if name is not None and name not in self.providers:
+            raise ValueError(f"LLM provider {name!r} is not enabled")
+        return self.providers.get(name)
+
+    @property
+    def model_name(self) -> str:
+        llm = self.provider()
+        return llm.model_name if llm else ""
 
-        if history is None:
-            history = []
+    def prompt_version(self, provider: Optional[str] = None) -> str:
+        """Identifies the provider (default: the first one), model and prompt template of an answer."""
+        llm = self.provider(provider)
+        return f"{llm.name if llm else ''}:{llm.model_name if llm else ''}:{self.PROMPT_VERSION}"
 
+    def _build_messages(
+        self, query: str, context: str = "", history: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """Chat messages for history + the context-augmented query."""
         messages = []
 
-        # Add conversation history (map assistant → model)
-        for msg in history:
-            role = msg.get("role", "user")
-            if role == "assistant":
-                role = "model"
-            elif role != "user":
-                role = "user"
+        for msg in history or []:
+            role = "assistant" if msg.get("role") == "assistant" else "user"
             content = msg.get("content", "")
             if content:
-                messages.append({"role": role, "parts": [{"text": content}]})
+                messages.append({"role": role, "content": content})
 
         # Build query with context instructions
         if context:
@@ -78,28 +112,186 @@ class AIService:
             full_query = query
 
         # Add current user query
-        messages.append({"role": "user", "parts": [{"text": full_query}]})
+        messages.append({"role": "user", "content": full_query})
+        return messages
+
+    def generate_response(
+        self, query: str, context: str = "", history: Optional[List[Dict]] = None, provider: Optional[str] = None
+    ) -> str:
+        """
+        Generate a response with RAG context and optional history.
+        - query:    the user’s question
+        - context:  retrieved chunks from FAISS
+        - history:  list of previous messages [{"role": "user"/"assistant", "content": "..."}]
+        - provider: name of the provider to use (default: the first one)
+        """
+        llm = self.provider(provider)
+        if llm is None or not llm.configured:
+            return NOT_CONFIGURED_RESPONSE
+
+        messages = self._build_messages(query, context, history)
+        deadline = Deadline(self.policy.deadline)
+
+        for attempt in range(self.policy.max_attempts):
+            acquired = llm.bulkhead.acquire(min(self.policy.queue_wait, deadline.remaining()))
+            if not self._admitted(llm, "generate", acquired):
+                break
+            start = time.perf_counter()
+            try:
+                text, error = llm.generate(messages, deadline.remaining()).strip(), None
+            except Exception as e:
+                text, error = "", e
+            finally:
+                llm.bulkhead.release()
+
+            if self._succeeded(llm, "generate", start, error):
+                return text or EMPTY_RESPONSE
+            delay = self._retry_delay(llm, "generate", attempt, error, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+
+        return ERROR_RESPONSE
+
+    async def agenerate_response(
+        self, query: str, context: str = "", history: Optional[List[Dict]] = None, provider: Optional[str] = None
+    ) -> str:
+        """generate_response() for async callers (waits without blocking the event loop)."""
+        llm = self.provider(provider)
+        if llm is None or not llm.configured:
+            return NOT_CONFIGURED_RESPONSE
+
+        messages = self._build_messages(query, context, history)
+        deadline = Deadline(self.policy.deadline)
 
-        # Retry loop for robustness
-        for attempt in range(3):
+        for attempt in range(self.policy.max_attempts):
+            acquired = await llm.bulkhead.acquire_async(min(self.policy.queue_wait, deadline.remaining()))
+            if not self._admitted(llm, "agenerate", acquired):
+                break
+            start = time.perf_counter()
             try:
-                resp = self.model.generate_content(
-                    messages,
-                    generation_config={
-                        "temperature": self.temperature,
-                        "max_output_tokens": self.max_tokens,
-                    },
-                )
-                text = (resp.text or "").strip()
-                if text:
-                    return text
-                return "I couldn't generate a response."
+                text, error = (await llm.agenerate(messages, deadline.remaining())).strip(), None
+            except Exception as e:
+                text, error = "", e
+            except BaseException:  # cancelled: no verdict on the provider
+                llm.breaker.cancel()
+                raise
+            finally:
+                llm.bulkhead.release()
+
+            if self._succeeded(llm, "agenerate", start, error):
+                return text or EMPTY_RESPONSE
+            delay = self._retry_delay(llm, "agenerate", attempt, error, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        return ERROR_RESPONSE
+
+    async def stream_response(
+        self, query: str, context: str = "", history: Optional[List[Dict]] = None, provider: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield response text chunks as the provider produces them.
+        Failures are retried only until the first chunk has been sent; after
+        that a partial answer can't be taken back, so StreamInterrupted is
+        raised to mark it incomplete.
+        """
+        llm = self.provider(provider)
+        if llm is None or not llm.configured:
+            yield NOT_CONFIGURED_RESPONSE
+            return
+
+        messages = self._build_messages(query, context, history)
+        deadline = Deadline(self.policy.deadline)
+
+        for attempt in range(self.policy.max_attempts):
+            acquired = await llm.bulkhead.acquire_async(min(self.policy.queue_wait, deadline.remaining()))
+            if not self._admitted(llm, "stream", acquired):
+                break
+            sent = False
+            error = None
+            start = time.perf_counter()
+            try:  # the slot is held until the stream ends
+                async for text in llm.stream(messages, deadline.remaining()):
+                    if text:
+                        sent = True
+                        yield text
             except Exception as e:
-                logger.warning("Gemini API attempt %s failed: %s", attempt + 1, e)
-                time.sleep(1)
+                error = e
+            except BaseException:  # client went away mid-stream: no verdict on the provider
+                llm.breaker.cancel()
+                raise
+            finally:
+                llm.bulkhead.release()
+
+            if self._succeeded(llm, "stream", start, error):
+                if not sent:
+                    yield EMPTY_RESPONSE
+                return
+            if sent:
+                self._record_failure(llm, error)
+                logger.error("%s stream interrupted: %s", llm.name, error)
+                raise StreamInterrupted(str(error)) from error
+            delay = self._retry_delay(llm, "stream", attempt, error, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        yield ERROR_RESPONSE
+
+    # --- Resilience ---
+    def _admitted(self, llm: LLMProvider, method: str, acquired: bool) -> bool:
+        """Whether an attempt may call the provider: it holds a bulkhead slot and the circuit lets it through."""
+        if not acquired:
+            LLM_FAILURES.inc(provider=llm.name, method=method, reason="bulkhead_full")
+            logger.warning("%s %s rejected: %d calls already in flight", llm.name, method, llm.bulkhead.max_concurrent)
+            return False
+        if not llm.breaker.allow():
+            llm.bulkhead.release()
+            LLM_FAILURES.inc(provider=llm.name, method=method, reason="circuit_open")
+            logger.warning("%s %s rejected: circuit open", llm.name, method)
+            return False
+        return True
+
+    def _succeeded(self, llm: LLMProvider, method: str, start: float, error: Optional[Exception]) -> bool:
+        """Record the outcome of an attempt; True if it succeeded."""
+        outcome = "ok" if error is None else "error"
+        LLM_SECONDS.observe(time.perf_counter() - start, provider=llm.name, method=method, outcome=outcome)
+        if error is None:
+            llm.breaker.record_success()
+        return error is None
+
+    def _record_failure(self, llm: LLMProvider, error: Exception):
+        if is_retryable(error):
+            llm.breaker.record_failure()
+        else:
+            llm.breaker.record_success()  # the provider is up; this request was refused
+
+    def _retry_delay(self, llm: LLMProvider, method: str, attempt: int, error: Exception,
+                     deadline: Deadline) -> Optional[float]:
+        """Backoff before retrying a failed attempt, or None to give up."""
+        self._record_failure(llm, error)
+        if not is_retryable(error):
+            reason, delay = "non_retryable", None
+        else:
+            delay = self.policy.next_delay(attempt, deadline)
+            reason = "attempts" if attempt + 1 >= self.policy.max_attempts else "deadline"
+        if delay is None:
+            LLM_FAILURES.inc(provider=llm.name, method=method, reason=reason)
+            logger.error("%s %s failed after %d attempt(s) (%s): %s", llm.name, method, attempt + 1, reason, error)
+            return None
+        LLM_RETRIES.inc(provider=llm.name, method=method)
+        logger.warning("%s %s attempt %d failed, retrying in %.2fs: %s", llm.name, method, attempt + 1, delay, error)
+        return delay
+
 
-        return "Sorry, I had trouble generating a response. Please try again later."
+def ai_service_from_settings() -> AIService:
+    """LLM_PROVIDER first (the default), then the other LLM_PROVIDERS for per-request routing."""
+    default = getattr(settings, "LLM_PROVIDER", "gemini")
+    names = [default] + [n for n in getattr(settings, "LLM_PROVIDERS", []) if n and n != default]
+    return AIService([provider_from_settings(name) for name in dict.fromkeys(names)])
 
 
 # Singleton instance for reuse
-ai_service = AIService()
+ai_service = ai_service_from_settings()
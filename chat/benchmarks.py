@@ -0,0 +1,313 @@
+# chat/benchmarks.py
+"""
+Reproducible performance benchmarks for the RAG pipeline
+(run them with `manage.py benchmark_rag`).
+
+Everything is synthetic and seeded, so results from the same machine can
+be compared across commits:
+    - corpus:   n chunks spread over topics; each chunk's text starts with
+                its topic word
+    - embedder: SyntheticEmbedder maps a text to its topic's centroid plus
+                text-seeded noise. There is no model download, and the
+                vectors cluster like real embeddings. --embedder model uses
+                all-MiniLM-L6-v2 instead.
+    - LLM:      the stub provider (chat/llm_providers.py) answers after a
+                fixed latency
+
+Measured per corpus size and index type:
+    - ingest throughput (add_documents, embedding included)
+    - VectorStore cold start (loading the persisted index)
+    - search latency p50/p99, for search (query embedding included) and
+      search_by_vector
+    - recall@k against exact search
+Measured once: ChatView requests/s end to end, against the stub LLM.
+
+Nothing here touches the configured database: benchmark_rag runs the
+ChatView benchmark against a throwaway test database it creates.
+"""
+import os
+import time
+import hashlib
+import logging
+import platform
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+import faiss
+import numpy as np
+from .index_factory import index_settings
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = 1000
+ANN_TRAIN_THRESHOLD = 1000  # ANN indexes are built from this corpus size on
+WORDS = (
+    "order shipping refund return delivery payment invoice warranty size color stock discount "
+    "account password address tracking carrier exchange policy support gift card store pickup "
+    "damaged item express standard international customs tax receipt coupon"
+).split()
+
+
+# --- Synthetic data ---
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SyntheticEmbedder:
+    """
+    Stand-in for SentenceTransformer: a text's vector is its topic centroid
+    (from the first word) plus noise seeded by the whole text, normalized.
+    """
+
+    def __init__(self, dim: int = 384, noise: float = 0.6):
+        self.dim = dim
+        self.noise = noise
+        self._centroids: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _centroid(self, topic: str) -> np.ndarray:
+        with self._lock:
+            centroid = self._centroids.get(topic)
+            if centroid is None:
+                centroid = np.random.default_rng(_seed(topic)).standard_normal(self.dim)
+                centroid = self._centroids[topic] = centroid / np.linalg.norm(centroid)
+            return centroid
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        vecs = np.empty((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            noise = np.random.default_rng(_seed(text)).standard_normal(self.dim) / np.sqrt(self.dim)
+            vec = self._centroid(text.split(" ", 1)[0]) + self.noise * noise
+            vecs[i] = vec / np.linalg.norm(vec)
+        return vecs
+
+
+def synthetic_corpus(size: int, topics: int = 100, seed: int = 0) -> List[Dict]:
+    """size chunks in VectorStore format, spread evenly over topics."""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(size):
+        topic = i % topics
+        words = " ".join(rng.choice(WORDS, size=24))
+        corpus.append({
+            "id": f"bench_{i}",
+            "document_id": i // 10,
+            "title": f"Topic {topic}",
+            "category": f"category_{topic % 10}",
+            "content": f"topic{topic} chunk {i}: {words}.",
+            "source": "benchmark",
+        })
+    return corpus
+
+
+def synthetic_queries(corpus: List[Dict], count: int, seed: int = 0) -> List[str]:
+    """Questions about randomly chosen chunks (same topic word, different text)."""
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(len(corpus), size=min(count, len(corpus)), replace=False)
+    return [
+        f"{corpus[i]['content'].split(' ', 1)[0]} question {n}: {' '.join(rng.choice(WORDS, size=8))}?"
+        for n, i in enumerate(picks)
+    ]
+
+
+# --- Measurements ---
+def latency_summary(samples_ms: Sequence[float]) -> Dict[str, float]:
+    samples = np.asarray(samples_ms, dtype="float64")
+    if not len(samples):
+        return {"p50": None, "p99": None, "mean": None}
+    return {
+        "p50": round(float(np.percentile(samples, 50)), 3),
+        "p99": round(float(np.percentile(samples, 99)), 3),
+        "mean": round(float(samples.mean()), 3),
+    }
+
+
+def _bench_id(doc_id: str) -> int:
+    return int(doc_id.rsplit("_", 1)[1])
+
+
+def _index_config(index_type: str, size: int) -> Dict:
+    """The configured index settings, for index_type trained at benchmark sizes."""
+    return dict(index_settings(), index_type=index_type, train_threshold=min(ANN_TRAIN_THRESHOLD, size))
+
+
+def benchmark_index(corpus: List[Dict], index_type: str, queries: List[str], embedder, top_k: int = 10,
+                    exact: Optional[np.ndarray] = None, workdir: Optional[str] = None) -> Dict:
+    """
+    Ingest corpus into a fresh VectorStore of index_type (in workdir), then
+    time a cold start and the queries. exact: the exact top_k corpus
+    positions per query, for recall@k.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    paths = {
+        "index_path": os.path.join(workdir, f"{index_type}.index"),
+        "docstore_path": os.path.join(workdir, f"{index_type}.sqlite3"),
+    }
+    options = dict(paths, read_only=False, embedder=embedder, index_config=_index_config(index_type, len(corpus)),
+                   cache_embeddings=False)
+    store = VectorStore(**options)
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), INGEST_BATCH_SIZE):
+        if not store.add_documents(corpus[offset:offset + INGEST_BATCH_SIZE]):
+            raise RuntimeError(f"Ingesting the {index_type} benchmark corpus failed")
+    ingest_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cold = VectorStore(**options)
+    cold_start_seconds = time.perf_counter() - start
+
+    search_ms, vector_ms, found = [], [], []
+    query_vectors = embedder.encode(queries)
+    for query, vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        cold.search(query, top_k=top_k)
+        search_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        results = cold.search_by_vector(vector, top_k=top_k)
+        vector_ms.append((time.perf_counter() - start) * 1000)
+        found.append({_bench_id(r["document"]["id"]) for r in results})
+
+    recall = None
+    if exact is not None and len(queries):
+        hits = sum(len(f & set(e.tolist())) for f, e in zip(found, exact))
+        recall = round(hits / float(exact.size), 4)
+
+    return {
+        "size": len(corpus),
+        "index_type": index_type,
+        "built_index_type": cold.build_report.get("index_type", "flat"),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_chunks_per_second": round(len(corpus) / ingest_seconds, 1) if ingest_seconds else None,
+        "cold_start_seconds": round(cold_start_seconds, 4),
+        "index_bytes": os.path.getsize(paths["index_path"]),
+        "search_ms": latency_summary(search_ms),
+        "search_by_vector_ms": latency_summary(vector_ms),
+        "recall_at_k": recall,
+        "k": top_k,
+        "build_recall_at_k": cold.build_report.get("recall_at_k"),
+    }
+
+
+def exact_neighbours(corpus: List[Dict], queries: List[str], embedder, top_k: int) -> np.ndarray:
+    """Exact top_k corpus positions per query (flat L2 over the same embeddings)."""
+    vectors = np.vstack([
+        embedder.encode([d["content"] for d in corpus[offset:offset + INGEST_BATCH_SIZE]])
+        for offset in range(0, len(corpus), INGEST_BATCH_SIZE)
+    ])
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    _, positions = index.search(embedder.encode(queries), min(top_k, len(corpus)))
+    return positions
+
+
+def benchmark_chat(user, queries: List[str], requests: int = 50, concurrency: int = 4) -> Dict:
+    """
+    ChatView requests/s end to end (auth, DB writes, retrieval, context
+    packing), sent as user. The view uses whatever vector store, LLM and
+    database are in place; benchmark_rag swaps in the benchmark store, a
+    stub LLM and a throwaway database first.
+    """
+    from django.db import connection
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from .views import ChatView
+
+    view = ChatView.as_view()
+    factory = APIRequestFactory()
+
+    def one(n: int):
+        try:
+            request = factory.post("/api/chat/send/", {"message": queries[n % len(queries)]}, format="json")
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            response = view(request)
+            return (time.perf_counter() - start) * 1000, response.status_code
+        finally:
+            connection.close()  # one connection per worker thread
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, status in outcomes if status != 200),
+        "requests_per_second": round(requests / elapsed, 2) if elapsed else None,
+        "latency_ms": latency_summary([ms for ms, _ in outcomes]),
+    }
+
+
+def environment() -> Dict:
+    """What the numbers depend on, so runs can be compared."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "faiss": getattr(faiss, "__version__", None),
+        "numpy": np.__version__,
+    }
+
+
+def run_benchmarks(sizes: Sequence[int], index_types: Sequence[str], queries: int = 200, top_k: int = 10,
+                   chat_requests: int = 50, chat_concurrency: int = 4, llm_latency_ms: float = 300,
+                   embedder: str = "synthetic", seed: int = 0, progress=None,
+                   chat: Optional[Callable[[VectorStore, List[str]], Dict]] = None) -> Dict:
+    """
+    All benchmarks; the result is JSON-serializable. chat(store, queries)
+    runs the ChatView benchmark (see benchmark_rag); without it, or with
+    chat_requests = 0, that benchmark is skipped.
+    """
+    progress = progress or (lambda message: None)
+    if embedder == "model":
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer("all-MiniLM-L6-v2")
+    else:
+        encoder = SyntheticEmbedder()
+
+    results = {
+        "environment": environment(),
+        "parameters": {
+            "sizes": list(sizes), "index_types": list(index_types), "queries": queries, "top_k": top_k,
+            "chat_requests": chat_requests, "chat_concurrency": chat_concurrency,
+            "llm_latency_ms": llm_latency_ms, "embedder": embedder, "seed": seed,
+        },
+        "index": [],
+        "chat": None,
+    }
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir:
+        chat_store = None
+        for size in sizes:
+            corpus = synthetic_corpus(size, seed=seed)
+            questions = synthetic_queries(corpus, queries, seed=seed)
+            exact = exact_neighbours(corpus, questions, encoder, top_k)
+            for index_type in index_types:
+                progress(f"{index_type} index, {size} chunks")
+                directory = os.path.join(workdir, str(size))
+                os.makedirs(directory, exist_ok=True)
+                results["index"].append(
+                    benchmark_index(corpus, index_type, questions, encoder, top_k, exact, directory)
+                )
+            if chat_store is None and chat_requests and chat is not None:
+                chat_store = VectorStore(
+                    index_path=os.path.join(directory, f"{index_types[0]}.index"),
+                    docstore_path=os.path.join(directory, f"{index_types[0]}.sqlite3"),
+                    read_only=False, embedder=encoder,
+                    index_config=_index_config(index_types[0], size), cache_embeddings=False,
+                )
+                chat_questions = questions
+
+        if chat_store is not None:
+            progress(f"ChatView, {chat_requests} requests")
+            results["chat"] = chat(chat_store, chat_questions)
+    return results
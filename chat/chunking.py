@@ -0,0 +1,177 @@
+# chat/chunking.py
+"""
+Splits document content into chunks for the vector store.
+
+Chunkers (selected with CHUNKER):
+    - "structured": heading- and sentence-aware. Sections start at markdown
+      headings, chunks are packed from whole sentences up to
+      CHUNK_MAX_TOKENS and consecutive chunks share up to
+      CHUNK_OVERLAP_TOKENS of trailing sentences. Each chunk is prefixed
+      with its section heading so it embeds with that context.
+    - "fixed": the original fixed-size character slices (CHUNK_SIZE chars).
+
+Token counts use the embedding model's tokenizer when it is available
+(all-MiniLM-L6-v2 truncates input at 256 word pieces, so chunks should stay
+below that), with a word/punctuation estimate as fallback.
+"""
+import re
+import logging
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Whitespace after ., ! or ?, also behind up to two closing quotes/brackets (kept with the sentence)
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]])|(?<=[.!?][\"')\]]{2}))\s+")
+_ESTIMATE_TOKENS = re.compile(r"\w+|[^\w\s]")
+
+
+class Chunk(NamedTuple):
+    content: str
+    section: Optional[str] = None
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of text, paragraph by paragraph, with whitespace collapsed."""
+    sentences = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        sentences.extend(s for s in _SENTENCE_END.split(paragraph) if s)
+    return sentences
+
+
+def estimate_tokens(text: str) -> int:
+    """Word + punctuation count: a close lower bound for word-piece tokenizers."""
+    return len(_ESTIMATE_TOKENS.findall(text))
+
+
+@lru_cache(maxsize=None)
+def embedder_token_counter() -> Callable[[str], int]:
+    """
+    Token counter of the vector store's embedding model (which ingestion
+    loads anyway). Falls back to estimate_tokens when the model lives in
+    another process (run_vector_server) or has no tokenizer.
+    """
+    from .vector_store import VectorStore, vector_db  # local import: vector_store loads the index
+
+    if not isinstance(vector_db, VectorStore):
+        return estimate_tokens
+    try:
+        tokenizer = vector_db.embedder.tokenizer
+    except Exception as e:
+        logger.info("Embedder tokenizer unavailable (%s), estimating chunk tokens", e)
+        return estimate_tokens
+    return lambda text: len(tokenizer.tokenize(text))
+
+
+class Chunker:
+    """Base class: split(text) -> list of Chunk."""
+
+    def split(self, text: str) -> List[Chunk]:
+        raise NotImplementedError
+
+
+class FixedSizeChunker(Chunker):
+    """Fixed-size character slices (no overlap)."""
+
+    def __init__(self, size: int = 500):
+        self.size = max(1, int(size))
+
+    def split(self, text: str) -> List[Chunk]:
+        return [Chunk(text[i:i + self.size]) for i in range(0, len(text), self.size)]
+
+
+class StructuredChunker(Chunker):
+    """Heading-aware sections, packed from whole sentences with token overlap."""
+
+    def __init__(self, max_tokens: int = 200, overlap_tokens: int = 40,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max(8, int(max_tokens))
+        self.overlap_tokens = max(0, min(int(overlap_tokens), self.max_tokens // 2))
+        self.count_tokens = count_tokens or estimate_tokens
+
+    def split(self, text: str) -> List[Chunk]:
+        chunks = []
+        for heading, body in self._sections(text):
+            chunks.extend(self._pack(heading, split_sentences(body)))
+        return chunks
+
+    @staticmethod
+    def _sections(text: str):
+        """Yield (heading, body) pairs; text before the first heading has no heading."""
+        heading, lines = None, []
+        for line in text.splitlines():
+            match = _HEADING.match(line)
+            if match:
+                if any(l.strip() for l in lines):
+                    yield heading, "\n".join(lines)
+                heading, lines = match.group(2), []
+            else:
+                lines.append(line)
+        if any(l.strip() for l in lines):
+            yield heading, "\n".join(lines)
+
+    def _pieces(self, sentence: str, budget: int) -> List[str]:
+        """A sentence, or word windows of it if it alone exceeds the budget."""
+        if self.count_tokens(sentence) <= budget:
+            return [sentence]
+        # Word-piece tokenizers split on whitespace first, so word counts add up
+        pieces, current, used = [], [], 0
+        for word in sentence.split():
+            tokens = self.count_tokens(word)
+            if current and used + tokens > budget:
+                pieces.append(" ".join(current))
+                current, used = [], 0
+            current.append(word)
+            used += tokens
+        if current:
+            pieces.append(" ".join(current))
+        return pieces
+
+    def _pack(self, heading: Optional[str], sentences: List[str]) -> List[Chunk]:
+        prefix = f"{heading}\n" if heading else ""
+        budget = max(8, self.max_tokens - (self.count_tokens(prefix) if prefix else 0))
+
+        units = [(piece, self.count_tokens(piece)) for s in sentences for piece in self._pieces(s, budget)]
+        chunks, current, used = [], [], 0
+        for unit, tokens in units:
+            if current and used + tokens > budget:
+                chunks.append(Chunk(prefix + " ".join(u for u, _ in current), heading))
+                current, used = self._overlap(current, budget - tokens)
+            current.append((unit, tokens))
+            used += tokens
+        if current:
+            chunks.append(Chunk(prefix + " ".join(u for u, _ in current), heading))
+        return chunks
+
+    def _overlap(self, previous, room: int):
+        """Trailing units of the previous chunk to repeat (within overlap and remaining room)."""
+        carried, used = [], 0
+        for unit, tokens in reversed(previous):
+            if used + tokens > min(self.overlap_tokens, room):
+                break
+            carried.insert(0, (unit, tokens))
+            used += tokens
+        return carried, used
+
+
+CHUNKERS = {
+    "structured": lambda: StructuredChunker(
+        max_tokens=getattr(settings, "CHUNK_MAX_TOKENS", 200),
+        overlap_tokens=getattr(settings, "CHUNK_OVERLAP_TOKENS", 40),
+        count_tokens=embedder_token_counter(),
+    ),
+    "fixed": lambda: FixedSizeChunker(getattr(settings, "CHUNK_SIZE", 500)),
+}
+
+
+def get_chunker() -> Chunker:
+    """The chunker configured by the CHUNKER setting."""
+    name = getattr(settings, "CHUNKER", "structured")
+    if name not in CHUNKERS:
+        logger.warning("Unknown CHUNKER %r, falling back to structured", name)
+        name = "structured"
+    return CHUNKERS[name]()
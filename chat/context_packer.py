@@ -0,0 +1,162 @@
+# chat/context_packer.py
+"""
+Fits retrieved chunks and conversation history into a token budget before
+they are sent to Gemini.
+
+Documents (best first):
+    - text a chunk shares with a better-ranked chunk of the same document
+      (the chunker's sentence overlap) is removed, and chunks left empty are
+      dropped;
+    - chunks are kept in rank order while they fit CONTEXT_MAX_TOKENS; the
+      first one that doesn't is trimmed to the remaining room (if worth it)
+      and the rest are dropped.
+History (newest first, within HISTORY_MAX_TOKENS):
+    - the HISTORY_RECENT_TURNS latest messages are kept whole (if they fit),
+      older ones are truncated to HISTORY_TURN_TOKENS;
+    - the current question, already saved as the last message, is not
+      repeated.
+
+Tokens are counted with chunking.estimate_tokens (word + punctuation), a
+close approximation of Gemini's tokenizer that needs no model or API call.
+"""
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from django.conf import settings
+from .chunking import estimate_tokens, split_sentences
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_OVERHEAD_TOKENS = 12  # "Document n: title", type and category lines
+MIN_TRIM_TOKENS = 32  # a trimmed chunk shorter than this isn't worth sending
+
+
+class PackedContext(NamedTuple):
+    documents: List[Dict]
+    history: List[Dict]
+    usage: Dict
+
+
+def truncate_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int] = estimate_tokens) -> str:
+    """text cut at a word boundary to at most max_tokens (with an ellipsis if cut)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words, used = [], 1  # room for the ellipsis
+    for word in text.split():
+        tokens = count_tokens(word)
+        if used + tokens > max_tokens:
+            break
+        words.append(word)
+        used += tokens
+    return " ".join(words) + " …" if words else ""
+
+
+class ContextPacker:
+    """Token-budgeted selection of retrieved documents and history turns."""
+
+    def __init__(
+        self,
+        context_tokens: int = 1500,
+        history_tokens: int = 600,
+        turn_tokens: int = 150,
+        recent_turns: int = 2,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.context_tokens = max(0, int(context_tokens))
+        self.history_tokens = max(0, int(history_tokens))
+        self.turn_tokens = max(1, int(turn_tokens))
+        self.recent_turns = max(0, int(recent_turns))
+        self.count_tokens = count_tokens or estimate_tokens
+
+    # --- Documents ---
+    @staticmethod
+    def _source(doc: Dict):
+        return doc.get("document_id") or doc.get("id")
+
+    def _deduplicate(self, documents: List[Dict]) -> Tuple[List[Dict], int]:
+        """Strip sentences already included from the same source document."""
+        seen: Dict = {}
+        kept, removed = [], 0
+        for result in documents:
+            doc = result.get("document", {})
+            content = doc.get("content") or ""
+            heading = f"{doc['section']}\n" if doc.get("section") else ""
+            if not content.startswith(heading):
+                heading = ""
+            sentences = split_sentences(content[len(heading):])  # as the chunker split them
+            known = seen.setdefault(self._source(doc), set())
+            fresh = [s for s in sentences if s not in known]
+            if sentences and not fresh:
+                removed += 1
+                continue
+            known.update(fresh)
+            if len(fresh) < len(sentences):
+                result = dict(result, document=dict(doc, content=heading + " ".join(fresh)))
+            kept.append(result)
+        return kept, removed
+
+    def pack_documents(self, documents: List[Dict]) -> Tuple[List[Dict], Dict]:
+        documents, duplicates = self._deduplicate(documents)
+        kept, used, trimmed = [], 0, 0
+        for result in documents:
+            doc = result.get("document", {})
+            content = doc.get("content") or ""
+            overhead = DOCUMENT_OVERHEAD_TOKENS + self.count_tokens(doc.get("title") or "")
+            tokens = overhead + self.count_tokens(content)
+            if used + tokens <= self.context_tokens:
+                kept.append(result)
+                used += tokens
+                continue
+            room = self.context_tokens - used - overhead
+            if room >= MIN_TRIM_TOKENS:
+                content = truncate_tokens(content, room, self.count_tokens)
+                kept.append(dict(result, document=dict(doc, content=content)))
+                used += overhead + self.count_tokens(content)
+                trimmed = 1
+            break
+        return kept, {
+            "documents_retrieved": len(documents) + duplicates,
+            "documents_used": len(kept),
+            "documents_trimmed": trimmed,
+            "duplicates_removed": duplicates,
+        }
+
+    # --- History ---
+    def pack_history(self, query: str, history: List[Dict]) -> Tuple[List[Dict], int]:
+        """History that fits the budget, oldest first, and its token count."""
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == query:
+            history = history[:-1]  # the question itself is sent after the context
+
+        packed, used = [], 0
+        for age, msg in enumerate(reversed(history)):
+            if not msg.get("content"):
+                continue
+            remaining = self.history_tokens - used
+            limit = remaining if age < self.recent_turns else min(self.turn_tokens, remaining)
+            content = truncate_tokens(msg["content"], limit, self.count_tokens)
+            if not content:
+                break
+            packed.append(dict(msg, content=content))
+            used += self.count_tokens(content)
+        packed.reverse()
+        return packed, used
+
+    def pack(self, query: str, documents: List[Dict], history: List[Dict]) -> PackedContext:
+        documents, usage = self.pack_documents(documents)
+        history, history_used = self.pack_history(query, history)
+        usage.update({
+            "history_tokens": history_used,
+            "history_messages": len(history),
+            "query_tokens": self.count_tokens(query),
+            "context_budget": self.context_tokens,
+            "history_budget": self.history_tokens,
+        })
+        return PackedContext(documents, history, usage)
+
+
+def context_packer_from_settings() -> ContextPacker:
+    return ContextPacker(
+        context_tokens=getattr(settings, "CONTEXT_MAX_TOKENS", 1500),
+        history_tokens=getattr(settings, "HISTORY_MAX_TOKENS", 600),
+        turn_tokens=getattr(settings, "HISTORY_TURN_TOKENS", 150),
+        recent_turns=getattr(settings, "HISTORY_RECENT_TURNS", 2),
+    )
@@ -0,0 +1,417 @@
+# chat/docstore.py
+"""
+SQLite-backed document store for VectorStore.
+
+Each chunk is one row keyed by its FAISS id, so search hits are resolved
+with a single primary-key lookup and writes only touch the rows that
+changed (no whole-file rewrites). Workers share the file through SQLite's
+page cache / mmap instead of each holding the full corpus in memory.
+
+A full-text index (FTS5, BM25-ranked) over each chunk's title and content
+is kept in the same transactions, for lexical search next to FAISS, and
+so is a facet table (category / doc_type / tags -> FAISS ids) that turns
+metadata filters into id sets for FAISS IDSelectors.
+"""
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_SECONDS = metrics.histogram("rag_docstore_lookup_seconds", "Docstore reads of search hits (get_many).")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    faiss_id     INTEGER PRIMARY KEY,
+    doc_id       TEXT NOT NULL UNIQUE,
+    document_id  TEXT,
+    content_hash TEXT NOT NULL,
+    data         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_document_id ON docs (document_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS facets (
+    facet    TEXT NOT NULL,
+    value    TEXT NOT NULL,
+    faiss_id INTEGER NOT NULL,
+    PRIMARY KEY (facet, value, faiss_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS facets_faiss_id ON facets (faiss_id);
+"""
+
+# Filterable chunk fields. Scalar facets match any of the given values;
+# tags must all be present (like DocumentViewSet's ?tags= filter).
+FACETS = ("category", "doc_type", "tags")
+ALL_OF_FACETS = ("tags",)
+
+# rowid = faiss_id; unicode61 splits "SKU-1234" into "sku" + "1234" (matched as a phrase)
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    title, content, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+FTS_WEIGHTS = (2.0, 1.0)  # bm25 column weights: title, content
+
+_QUERY_TERMS = re.compile(r"[^\W_]+(?:[-_./][^\W_]+)*")
+
+
+def normalize_filters(filters: Optional[Dict]) -> Tuple:
+    """
+    {"category": "Shipping", "tags": ["eu", "express"]} -> hashable, ordered
+    ((facet, (values...)), ...). Empty values are dropped; unknown facets raise ValueError.
+    """
+    normalized = []
+    for facet, values in (filters or {}).items():
+        if facet not in FACETS:
+            raise ValueError(f"Unknown filter {facet!r}; expected one of {FACETS}")
+        if values is None or values == "" or values == []:
+            continue
+        if isinstance(values, (str, int)):
+            values = [values]
+        normalized.append((facet, tuple(sorted({str(v) for v in values}))))
+    return tuple(sorted(normalized))
+
+
+def _facet_values(doc: Dict):
+    for facet in FACETS:
+        values = doc.get(facet)
+        if isinstance(values, (list, tuple)):
+            for value in values:
+                if value not in (None, ""):
+                    yield facet, str(value)
+        elif values not in (None, ""):
+            yield facet, str(values)
+
+
+def fts_query(text: str) -> str:
+    """OR of quoted terms, so user input never hits FTS5 query syntax."""
+    terms = dict.fromkeys(t.lower() for t in _QUERY_TERMS.findall(text))
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+def content_hash(content: Optional[str]) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def _row_digest(doc_id: str, chash: str) -> int:
+    return int.from_bytes(hashlib.sha256(f"{doc_id}\0{chash}".encode("utf-8")).digest(), "big")
+
+
+class DocStore:
+    """
+    Persistent mapping faiss_id -> doc dict.
+    - get_many(faiss_ids) resolves search hits without loading the corpus
+    - checksum() is an order-independent digest over (doc_id, content),
+      maintained incrementally so it costs O(1) at startup
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+        self.fts_enabled = self._init_fts()
+        self._backfill_once("facets_synced", self._facets_put)
+
+    # --- Connections ---
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _init_fts(self) -> bool:
+        conn = self._conn()
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite FTS5 unavailable (%s), lexical search disabled", e)
+            return False
+        self._backfill_once("fts_synced", self._fts_put)
+        return True
+
+    def _backfill_once(self, meta_key: str, put) -> None:
+        """Fill a derived table for docstores created before it existed."""
+        if self.get_meta(meta_key) == "1":
+            return
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for faiss_id, data in conn.execute("SELECT faiss_id, data FROM docs").fetchall():
+                    put(conn, faiss_id, json.loads(data))
+                self.set_meta(meta_key, "1")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        logger.info("Backfilled %s for %d docs", meta_key.replace("_synced", ""), self.count())
+
+    @staticmethod
+    def _facets_put(conn, faiss_id: int, doc: Dict):
+        conn.execute("DELETE FROM facets WHERE faiss_id = ?", (int(faiss_id),))
+        conn.executemany(
+            "INSERT OR IGNORE INTO facets (facet, value, faiss_id) VALUES (?, ?, ?)",
+            [(facet, value, int(faiss_id)) for facet, value in _facet_values(doc)],
+        )
+
+    @staticmethod
+    def _fts_put(conn, faiss_id: int, doc: Dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO docs_fts (rowid, title, content) VALUES (?, ?, ?)",
+            (int(faiss_id), doc.get("title") or "", doc.get("content") or ""),
+        )
+
+    # --- Checksum ---
+    def _get_checksum(self, conn) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'checksum'").fetchone()
+        return int(row[0], 16) if row else 0
+
+    def _set_checksum(self, conn, value: int):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('checksum', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (format(value, "064x"),),
+        )
+
+    def checksum(self) -> str:
+        return format(self._get_checksum(self._conn()), "064x")
+
+    def generation(self) -> int:
+        """Write counter, bumped by every put_many / delete_many."""
+        return int(self.get_meta("generation") or 0)
+
+    def _bump_generation(self, conn):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self._conn().execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    # --- Reads ---
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def contains(self, doc_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row is not None
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT data FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, faiss_ids: List[int]) -> Dict[int, Dict]:
+        """Fetch docs by FAISS id (e.g. the top-k hits of a search)."""
+        docs = {}
+        with LOOKUP_SECONDS.time():
+            for start in range(0, len(faiss_ids), 500):  # stay under SQLite's bound-parameter limit
+                batch = [int(i) for i in faiss_ids[start:start + 500]]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn().execute(
+                    f"SELECT faiss_id, data FROM docs WHERE faiss_id IN ({placeholders})", batch
+                )
+                docs.update((faiss_id, json.loads(data)) for faiss_id, data in rows)
+        return docs
+
+    def content_hashes(self, doc_ids: List[str]) -> Dict[str, str]:
+        """doc_id -> content hash for the ids that exist."""
+        result = {}
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn().execute(
+                f"SELECT doc_id, content_hash FROM docs WHERE doc_id IN ({placeholders})", batch
+            )
+            result.update(dict(rows))
+        return result
+
+    def ids_for_document(self, document_id) -> List[str]:
+        rows = self._conn().execute(
+            "SELECT doc_id FROM docs WHERE document_id = ? ORDER BY faiss_id", (str(document_id),)
+        )
+        return [row[0] for row in rows]
+
+    def lexical_search(self, query: str, limit: int = 20, filters: Tuple = ()) -> List[Tuple[int, float]]:
+        """
+        (faiss_id, bm25 score) best first; higher scores are better.
+        filters (see normalize_filters) restrict matches inside the FTS query.
+        """
+        match = fts_query(query)
+        if not self.fts_enabled or not match:
+            return []
+        sql = "SELECT rowid, bm25(docs_fts, ?, ?) AS score FROM docs_fts WHERE docs_fts MATCH ?"
+        params = [*FTS_WEIGHTS, match]
+        if filters:
+            facet_sql, facet_params = self._facet_query(filters)
+            sql += f" AND rowid IN ({facet_sql})"
+            params += facet_params
+        rows = self._conn().execute(sql + " ORDER BY score LIMIT ?", (*params, int(limit)))
+        return [(faiss_id, -score) for faiss_id, score in rows]  # SQLite's bm25 is negated
+
+    @staticmethod
+    def _facet_query(filters: Tuple) -> Tuple[str, List]:
+        """SQL selecting the faiss_ids that match every facet in filters."""
+        parts, params = [], []
+        for facet, values in filters:
+            placeholders = ",".join("?" * len(values))
+            sql = f"SELECT faiss_id FROM facets WHERE facet = ? AND value IN ({placeholders})"
+            if facet in ALL_OF_FACETS:
+                sql += f" GROUP BY faiss_id HAVING COUNT(*) = {len(values)}"
+            parts.append(sql)
+            params += [facet, *values]
+        return " INTERSECT ".join(parts), params
+
+    def facet_ids(self, filters: Tuple) -> List[int]:
+        """FAISS ids of the chunks matching normalized filters."""
+        if not filters:
+            return []
+        sql, params = self._facet_query(filters)
+        return [row[0] for row in self._conn().execute(sql, params)]
+
+    def faiss_ids(self) -> List[int]:
+        return [row[0] for row in self._conn().execute("SELECT faiss_id FROM docs")]
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[Tuple[List[int], List[str], List[str]]]:
+        """Yield (faiss_ids, doc_ids, contents) over the whole store, in rowid order."""
+        last = None
+        conn = self._conn()
+        while True:
+            if last is None:
+                rows = conn.execute(
+                    "SELECT faiss_id, doc_id, data FROM docs ORDER BY faiss_id LIMIT ?", (batch_size,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT faiss_id, doc_id, data FROM docs WHERE faiss_id > ? ORDER BY faiss_id LIMIT ?",
+                    (last, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield (
+                [r[0] for r in rows],
+                [r[1] for r in rows],
+                [json.loads(r[2]).get("content", "") or "" for r in rows],
+            )
+
+    # --- Writes ---
+    def put_many(self, docs: List[Tuple[int, Dict]]) -> None:
+        """Insert or replace (faiss_id, doc) pairs in one transaction."""
+        if not docs:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                checksum = self._get_checksum(conn)
+                existing = self.content_hashes([d["id"] for _, d in docs])
+                for faiss_id, doc in docs:
+                    chash = content_hash(doc.get("content"))
+                    if doc["id"] in existing:
+                        checksum ^= _row_digest(doc["id"], existing[doc["id"]])
+                    checksum ^= _row_digest(doc["id"], chash)
+                    existing[doc["id"]] = chash
+                    document_id = doc.get("document_id")
+                    conn.execute(
+                        "INSERT INTO docs (faiss_id, doc_id, document_id, content_hash, data) "
+                        "VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(faiss_id) DO UPDATE SET document_id = excluded.document_id, "
+                        "content_hash = excluded.content_hash, data = excluded.data",
+                        (
+                            int(faiss_id),
+                            doc["id"],
+                            str(document_id) if document_id is not None else None,
+                            chash,
+                            json.dumps(doc, ensure_ascii=False),
+                        ),
+                    )
+                    if self.fts_enabled:
+                        self._fts_put(conn, faiss_id, doc)
+                    self._facets_put(conn, faiss_id, doc)
+                self._set_checksum(conn, checksum)
+                self._bump_generation(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete_many(self, doc_ids: List[str]) -> int:
+        if not doc_ids:
+            return 0
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                checksum = self._get_checksum(conn)
+                existing = self.content_hashes(doc_ids)
+                for doc_id, chash in existing.items():
+                    checksum ^= _row_digest(doc_id, chash)
+                if self.fts_enabled:
+                    conn.executemany(
+                        "DELETE FROM docs_fts WHERE rowid = (SELECT faiss_id FROM docs WHERE doc_id = ?)",
+                        [(d,) for d in existing],
+                    )
+                conn.executemany(
+                    "DELETE FROM facets WHERE faiss_id = (SELECT faiss_id FROM docs WHERE doc_id = ?)",
+                    [(d,) for d in existing],
+                )
+                conn.executemany("DELETE FROM docs WHERE doc_id = ?", [(d,) for d in existing])
+                self._set_checksum(conn, checksum)
+                self._bump_generation(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(existing)
+
+    def clear(self) -> None:
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM docs")
+            if self.fts_enabled:
+                conn.execute("DELETE FROM docs_fts")
+            conn.execute("DELETE FROM facets")
+            conn.execute("DELETE FROM meta WHERE key NOT IN ('generation', 'fts_synced', 'facets_synced')")
+            self._bump_generation(conn)
+            conn.execute("COMMIT")
+
+    def size_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
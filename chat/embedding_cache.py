@@ -0,0 +1,233 @@
+# chat/embedding_cache.py
+"""
+On-disk embedding cache keyed by (model_name, sha256(content)).
+
+Vectors live in a memory-mapped float32 matrix (one row per cached text);
+a small SQLite index maps each key to its row and last-use time, so lookups
+and use-time updates touch only the requested keys and every process sees
+the same eviction order. When the cache is full, the least recently used
+rows are evicted and reused.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+from .locks import FileLock
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       TEXT PRIMARY KEY,
+    row       INTEGER NOT NULL UNIQUE,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embedding vectors.
+    - vectors.f32:    raw float32 matrix, grown geometrically up to max_entries rows
+    - index.sqlite3:  entries(key, row, last_used) and meta(dim, capacity)
+    Readers hold the shared process lock while copying rows out, writers the
+    exclusive one, so a row is never reused while another process reads it.
+    """
+
+    EVICT_FRACTION = 0.1
+
+    def __init__(self, directory: str, model_name: str, dim: int, max_entries: int = 200_000):
+        self.directory = directory
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max(1, int(max_entries))
+
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.sqlite3")
+        self.legacy_index_path = os.path.join(directory, "index.json")
+        self.lock_path = os.path.join(directory, ".lock")
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._matrix = None
+
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, self._process_lock():
+            conn = self._conn()
+            conn.executescript(SCHEMA)
+            self._check_dim(conn)
+            self._import_legacy_index(conn)
+
+    # --- Keys ---
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    # --- Persistence ---
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_meta(self, conn, key: str, default: int = 0) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    def _set_meta(self, conn, key: str, value: int):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _check_dim(self, conn):
+        dim = self._get_meta(conn, "dim", None)
+        if dim is not None and dim != self.dim:
+            logger.info("Embedding cache dim changed (%s -> %s), starting empty", dim, self.dim)
+            conn.execute("DELETE FROM entries")
+            self._set_meta(conn, "capacity", 0)
+        self._set_meta(conn, "dim", self.dim)
+
+    def _import_legacy_index(self, conn):
+        """Caches written before the SQLite index kept it in index.json."""
+        if not os.path.exists(self.legacy_index_path):
+            return
+        try:
+            with open(self.legacy_index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if data.get("dim") == self.dim:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR IGNORE INTO entries (key, row, last_used) VALUES (?, ?, ?)",
+                [(key, row, tick) for key, (row, tick) in data.get("rows", {}).items()],
+            )
+            self._set_meta(conn, "capacity", data.get("capacity", 0))
+            conn.execute("COMMIT")
+            logger.info("Imported %d embedding cache entries from index.json", len(data.get("rows", {})))
+        os.remove(self.legacy_index_path)
+
+    def _open_matrix(self, capacity: int):
+        size = capacity * self.dim * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self.vectors_path, dtype="float32", mode="r+", shape=(capacity, self.dim))
+
+    def _matrix_view(self, capacity: int):
+        if capacity == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != capacity:
+            self._open_matrix(capacity)
+        return self._matrix
+
+    def _process_lock(self, shared: bool = False):
+        return FileLock(self.lock_path, shared)
+
+    # --- Public API ---
+    def get_many(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Look up cached vectors (and mark them used).
+        Returns ({position: vector} for hits, [positions of misses]).
+        """
+        keys = [self.key(t) for t in texts]
+        hits: Dict[int, np.ndarray] = {}
+        missing: List[int] = []
+        with self._lock, self._process_lock(shared=True):
+            conn = self._conn()
+            rows = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(conn.execute(f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch))
+            matrix = self._matrix_view(self._get_meta(conn, "capacity"))
+            for pos, key in enumerate(keys):
+                row = rows.get(key)
+                if row is None or matrix is None or row >= matrix.shape[0]:
+                    missing.append(pos)
+                    continue
+                hits[pos] = np.array(matrix[row])
+
+        if rows:
+            try:
+                self._conn().executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", [(time.time(), key) for key in rows]
+                )
+            except sqlite3.OperationalError as e:  # busy writer: recency is best-effort
+                logger.debug("Embedding cache use-time update skipped: %s", e)
+        return hits, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Store vectors for texts, evicting least recently used rows if full."""
+        if not texts:
+            return
+        with self._lock, self._process_lock():
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                keys = [self.key(t) for t in texts]
+                known = dict(conn.execute("SELECT key, row FROM entries"))
+                new_keys = list(dict.fromkeys(k for k in keys if k not in known))
+                capacity, free_rows = self._allocate_rows(conn, known, len(new_keys))
+                known.update(zip(new_keys, free_rows))
+
+                matrix = self._matrix_view(capacity)
+                now = time.time()
+                written = {}
+                for key, vec in zip(keys, vectors):
+                    row = known.get(key)
+                    if row is None:
+                        continue  # no room left within this batch (batch larger than the cache)
+                    matrix[row] = vec
+                    written[key] = row
+                matrix.flush()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, row, last_used) VALUES (?, ?, ?)",
+                    [(key, row, now) for key, row in written.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _allocate_rows(self, conn, known: Dict[str, int], count: int) -> Tuple[int, List[int]]:
+        """(capacity, free rows for count new keys); evicts from known and the table when full."""
+        capacity = self._get_meta(conn, "capacity")
+        needed = len(known) + count
+
+        if needed > capacity and capacity < self.max_entries:
+            capacity = min(self.max_entries, max(needed, capacity * 2, 1024))
+            self._open_matrix(capacity)
+            self._set_meta(conn, "capacity", capacity)
+
+        if needed > capacity:
+            evict = min(len(known), max(needed - capacity, int(capacity * self.EVICT_FRACTION)))
+            evicted = [key for key, in conn.execute(
+                "SELECT key FROM entries ORDER BY last_used LIMIT ?", (evict,)
+            )]
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+            for key in evicted:
+                del known[key]
+            logger.info("Embedding cache evicted %d rows", len(evicted))
+
+        used = set(known.values())
+        free = (row for row in range(capacity) if row not in used)
+        return capacity, [next(free) for _ in range(min(count, capacity - len(used)))]
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
@@ -0,0 +1,202 @@
+# chat/index_factory.py
+"""
+Builds the FAISS index used by VectorStore.
+
+Supported VECTOR_INDEX_TYPE values:
+    - "flat":     exact brute-force search (IndexFlatL2)
+    - "hnsw":     graph-based ANN (IndexHNSWFlat), tuned with efSearch
+    - "ivf_flat": inverted lists over raw vectors (IndexIVFFlat), tuned with nprobe
+    - "ivf_pq":   inverted lists over product-quantized vectors (IndexIVFPQ)
+
+Approximate indexes only pay off on larger corpora (and IVF needs enough
+vectors to train), so below VECTOR_INDEX_TRAIN_THRESHOLD vectors a flat
+index is always used.
+
+HNSW graphs cannot drop vectors: replaced and deleted ones are tombstoned
+(excluded from search by position, see search_excluding) until more than
+VECTOR_INDEX_COMPACT_FRACTION of the index is dead and it is compacted.
+"""
+import logging
+import math
+from typing import Dict, Optional
+import faiss
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def index_settings() -> Dict:
+    """Index configuration from Django settings (with defaults)."""
+    index_type = getattr(settings, "VECTOR_INDEX_TYPE", "flat")
+    if index_type not in INDEX_TYPES:
+        logger.warning("Unknown VECTOR_INDEX_TYPE %r, falling back to flat", index_type)
+        index_type = "flat"
+    return {
+        "index_type": index_type,
+        "train_threshold": getattr(settings, "VECTOR_INDEX_TRAIN_THRESHOLD", 10000),
+        "hnsw_m": getattr(settings, "VECTOR_INDEX_HNSW_M", 32),
+        "ef_construction": getattr(settings, "VECTOR_INDEX_EF_CONSTRUCTION", 80),
+        "ef_search": getattr(settings, "VECTOR_INDEX_EF_SEARCH", 64),
+        "nlist": getattr(settings, "VECTOR_INDEX_NLIST", 0),  # 0 = ~sqrt(n)
+        "nprobe": getattr(settings, "VECTOR_INDEX_NPROBE", 8),
+        "pq_m": getattr(settings, "VECTOR_INDEX_PQ_M", 48),
+        "pq_nbits": getattr(settings, "VECTOR_INDEX_PQ_NBITS", 8),
+        "recall_sample": getattr(settings, "VECTOR_INDEX_RECALL_SAMPLE", 200),
+        "recall_k": getattr(settings, "VECTOR_INDEX_RECALL_K", 10),
+        "compact_fraction": getattr(settings, "VECTOR_INDEX_COMPACT_FRACTION", 0.2),
+    }
+
+
+def effective_index_type(config: Dict, n_vectors: int) -> str:
+    """Index type to build for a corpus of n_vectors (flat below the threshold)."""
+    if config["index_type"] == "flat" or n_vectors < config["train_threshold"]:
+        return "flat"
+    if config["index_type"] == "ivf_pq" and n_vectors < 2 ** config["pq_nbits"] * 4:
+        return "flat"  # not enough vectors to train the PQ codebooks
+    return config["index_type"]
+
+
+def _nlist(config: Dict, n_vectors: int) -> int:
+    if config["nlist"]:
+        return max(1, min(config["nlist"], n_vectors))
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39 or 1))
+
+
+def _pq_m(config: Dict, dim: int) -> int:
+    m = min(config["pq_m"], dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def new_index(dim: int, index_type: str = "flat", config: Optional[Dict] = None,
+              training_vectors: Optional[np.ndarray] = None):
+    """
+    Create an empty, ID-addressable index of the given type.
+    IVF indexes are trained on training_vectors and support ids natively;
+    other types are wrapped in IndexIDMap2.
+    """
+    config = config or index_settings()
+
+    if index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, config["hnsw_m"])
+        base.hnsw.efConstruction = config["ef_construction"]
+        index = faiss.IndexIDMap2(base)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        if training_vectors is None or not len(training_vectors):
+            raise ValueError(f"{index_type} index needs training vectors")
+        nlist = _nlist(config, len(training_vectors))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(config, dim), config["pq_nbits"])
+        index.train(training_vectors)
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)  # reconstruct/remove by id
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+    configure_search(index, config)
+    return index
+
+
+def index_type_of(index) -> str:
+    """Inverse of new_index: the INDEX_TYPES name of a (loaded) index."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+    return "flat"
+
+
+def is_id_mapped(index) -> bool:
+    """True if search returns stable ids (not positions)."""
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF))
+
+
+def supports_remove(index) -> bool:
+    """HNSW graphs cannot drop vectors; every other type supports remove_ids."""
+    return index_type_of(index) != "hnsw"
+
+
+def id_map_view(index) -> np.ndarray:
+    """Position -> id array of an IndexIDMap (a view: valid until the index changes)."""
+    return faiss.rev_swig_ptr(index.id_map.data(), index.id_map.size())
+
+
+def configure_search(index, config: Optional[Dict] = None) -> None:
+    """Apply query-time knobs (nprobe / efSearch); persisted indexes lose them."""
+    config = config or index_settings()
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(config["nprobe"], index.nlist)
+    elif isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = config["ef_search"]
+
+
+def search_parameters(index, selector):
+    """
+    SearchParameters restricting a search to selector. Per-call parameters
+    replace the index's own query-time knobs, so nprobe / efSearch are copied.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_excluding(index, queries: np.ndarray, k: int, dead, selector=None):
+    """
+    index.search on an IndexIDMap, skipping the vectors at the positions
+    selected by dead (tombstones). selector, if given, is over ids as usual.
+    Positions are needed because a replaced vector keeps its id.
+    """
+    alive = faiss.IDSelectorNot(dead)
+    if selector is not None:
+        allowed = faiss.IDSelectorTranslated(index.id_map, selector)
+        keep = faiss.IDSelectorAnd(alive, allowed)
+    else:
+        keep = alive
+    distances, positions = faiss.downcast_index(index.index).search(
+        queries, k, params=search_parameters(index, keep)
+    )
+    ids = np.where(positions >= 0, id_map_view(index)[np.maximum(positions, 0)], -1)
+    return distances, ids
+
+
+def measure_recall(index, vectors: np.ndarray, ids: np.ndarray, config: Optional[Dict] = None,
+                   seed: int = 0) -> Optional[float]:
+    """
+    recall@k of index against exact search, using a sample of the indexed
+    vectors (slightly perturbed) as queries. vectors[i] must have been added
+    under ids[i]. None for flat indexes.
+    """
+    config = config or index_settings()
+    if index_type_of(index) == "flat" or not len(vectors):
+        return None
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(config["recall_sample"], len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(scale=0.01, size=(len(sample), vectors.shape[1])).astype("float32")
+    k = min(config["recall_k"], len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    truth_ids = ids[truth]
+
+    _, found = index.search(queries, k)
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth_ids, found))
+    return hits / float(truth.size)
+
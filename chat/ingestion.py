@@ -1,16 +1,61 @@
 """
 Handles ingestion of documents into the retrieval system (FAISS).
 """
+import time
 import logging
-from typing import List
+from typing import Dict, List, Optional
+from core import metrics
+from .chunking import Chunker, get_chunker
 from .vector_store import vector_db  # use the singleton instance
 
 logger = logging.getLogger(__name__)
 
+INGESTION_SECONDS = metrics.histogram(
+    "rag_ingestion_seconds", "Vector store updates per ingestion call (chunking and embedding included).",
+    ("operation", "outcome"),
+)
+INGESTED_CHUNKS = metrics.counter(
+    "rag_ingested_chunks_total", "Chunks written to (or removed from) the vector store.", ("operation",)
+)
+
+
+def _record(operation: str, start: float, success: bool, chunks: int) -> None:
+    """Ingestion metrics: rate(rag_ingested_chunks_total) is the throughput in chunks/s."""
+    INGESTION_SECONDS.observe(time.perf_counter() - start, operation=operation, outcome="ok" if success else "error")
+    if success:
+        INGESTED_CHUNKS.inc(chunks, operation=operation)
+
+
+def document_chunks(document, chunker: Optional[Chunker] = None) -> List[Dict]:
+    """
+    Vector store docs for a Document's content, one per chunk
+    (ids "<document id>_<n>", n starting at 1). Empty for empty content.
+    """
+    if not document or not document.content or not document.content.strip():
+        return []
+
+    chunker = chunker or get_chunker()
+    return [
+        {
+            "id": f"{document.id}_{idx}",
+            "document_id": document.id,
+            "title": document.title,
+            "section": chunk.section,
+            "doc_type": getattr(document, "doc_type", None),
+            "category": getattr(document, "category", None),
+            "tags": getattr(document, "tags", []),
+            "content": chunk.content,
+            "source": "database",
+        }
+        for idx, chunk in enumerate(chunker.split(document.content), start=1)
+    ]
+
 
 def ingest_document(document) -> bool:
     """
     Ingest a single Document model instance into FAISS.
+    Re-ingesting replaces the document's chunks: unchanged chunks are kept,
+    changed ones are re-embedded and chunks that no longer exist are removed.
 
     Args:
         document (Document): Django Document instance
@@ -18,35 +63,41 @@ def ingest_document(document) -> bool:
     Returns:
         bool: True if ingestion succeeded, False otherwise
     """
-    if not document or not document.content or not document.content.strip():
+    start = time.perf_counter()
+    docs = document_chunks(document)
+    if not docs:
         logger.warning("Skipping ingestion: empty or invalid document")
         return False
 
-    # Split content into chunks (simple fixed-size)
-    chunks = [document.content[i:i+500] for i in range(0, len(document.content), 500)]
-
-    docs = []
-    for idx, chunk in enumerate(chunks, start=1):
-        docs.append({
-            "id": f"{document.id}_{idx}",
-            "title": document.title,
-            "doc_type": getattr(document, "doc_type", None),
-            "category": getattr(document, "category", None),
-            "tags": getattr(document, "tags", []),
-            "content": chunk,
-            "source": "database",
-        })
-
-    success = vector_db.add_documents(docs)
+    new_ids = {d["id"] for d in docs}
+    stale = [doc_id for doc_id in vector_db.chunk_ids_for_document(document.id) if doc_id not in new_ids]
+    success = vector_db.sync_documents(docs, stale)
+    _record("ingest", start, success, len(docs))
 
     if success:
-        logger.info("Ingested document %s (%d chunks)", document.id, len(chunks))
+        logger.info("Ingested document %s (%d chunks, %d stale removed)", document.id, len(docs), len(stale))
     else:
         logger.error("Failed to ingest document %s", document.id)
 
     return success
 
 
+def remove_document(document_id) -> bool:
+    """
+    Remove every chunk of a Document from FAISS
+    (used when a document is deleted or deactivated).
+    """
+    start = time.perf_counter()
+    chunk_ids = vector_db.chunk_ids_for_document(document_id)
+    success = vector_db.delete_documents(chunk_ids)
+    _record("remove", start, success, len(chunk_ids))
+    if success:
+        logger.info("Removed document %s (%d chunks) from vector store", document_id, len(chunk_ids))
+    else:
+        logger.error("Failed to remove document %s from vector store", document_id)
+    return success
+
+
 def ingest_documents_bulk(documents: List) -> bool:
     """
     Ingest multiple Document model instances at once.
@@ -57,24 +108,22 @@ def ingest_documents_bulk(documents: List) -> bool:
     Returns:
         bool: True if all ingested successfully, False otherwise
     """
-    prepared = []
-    for doc in documents:
-        if not doc.content or not doc.content.strip():
-            continue
-        chunks = [doc.content[i:i+500] for i in range(0, len(doc.content), 500)]
-        for idx, chunk in enumerate(chunks, start=1):
-            prepared.append({
-                "id": f"{doc.id}_{idx}",
-                "title": doc.title,
-                "doc_type": getattr(doc, "doc_type", None),
-                "category": getattr(doc, "category", None),
-                "tags": getattr(doc, "tags", []),
-                "content": chunk,
-                "source": "database",
-            })
+    start = time.perf_counter()
+    chunker = get_chunker()
+    prepared = [chunk for doc in documents for chunk in document_chunks(doc, chunker)]
 
     if not prepared:
         logger.warning("No valid documents to ingest")
         return False
 
-    return vector_db.add_documents(prepared)
+    # Re-chunking can leave fewer chunks than before; drop the leftovers
+    new_ids = {d["id"] for d in prepared}
+    stale = [
+        chunk_id
+        for doc in documents
+        for chunk_id in vector_db.chunk_ids_for_document(doc.id)
+        if chunk_id not in new_ids
+    ]
+    success = vector_db.sync_documents(prepared, stale)
+    _record("bulk", start, success, len(prepared))
+    return success
@@ -0,0 +1,323 @@
+# chat/llm_providers.py
+"""
+LLM backends behind AIService.
+
+Every provider turns the same chat messages
+    [{"role": "user" | "assistant", "content": "..."}]
+into text, in three forms: generate (sync), agenerate (async) and stream
+(async iterator of text chunks). Each takes a timeout in seconds for the
+whole call.
+
+    - gemini: Google Gemini (google-generativeai)
+    - openai: any OpenAI-compatible /chat/completions endpoint (OpenAI,
+              vLLM, Ollama, LiteLLM, ...), over HTTP with requests
+    - stub:   deterministic local answers with configurable latency and
+              token rate, for load tests and offline benchmarks
+
+Retries, deadlines and the circuit breaker live in AIService. Each provider
+carries its own circuit breaker and bulkhead, so a failing backend does not
+affect the others. These are shared by every provider instance with the
+same name in the process.
+"""
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import AsyncIterator, Dict, List, Optional
+from django.conf import settings
+from .resilience import Bulkhead, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("gemini", "openai", "stub")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_bulkheads: Dict[str, Bulkhead] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_breaker(name: str) -> CircuitBreaker:
+    with _shared_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=getattr(settings, "LLM_CIRCUIT_FAILURES", 5),
+                reset_timeout=getattr(settings, "LLM_CIRCUIT_RESET_SECONDS", 30),
+            )
+        return _breakers[name]
+
+
+def shared_bulkhead(name: str) -> Bulkhead:
+    with _shared_lock:
+        if name not in _bulkheads:
+            _bulkheads[name] = Bulkhead(getattr(settings, "LLM_MAX_CONCURRENCY", 16))
+        return _bulkheads[name]
+
+
+def circuit_states() -> Dict[str, int]:
+    return {name: breaker.state_value() for name, breaker in _breakers.items()}
+
+
+def in_flight() -> Dict[str, int]:
+    return {name: bulkhead.in_flight for name, bulkhead in _bulkheads.items()}
+
+
+class ProviderError(RuntimeError):
+    """An HTTP error response from a provider; code is the HTTP status (see resilience.is_retryable)."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class LLMProvider:
+    """A chat-completion backend (see the module docstring)."""
+
+    name = "base"
+
+    def __init__(self, model_name: str = "", temperature: float = 0.7, max_tokens: int = 512,
+                 breaker: Optional[CircuitBreaker] = None, bulkhead: Optional[Bulkhead] = None):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.breaker = breaker or shared_breaker(self.name)
+        self.bulkhead = bulkhead or shared_bulkhead(self.name)
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    def generate(self, messages: List[Dict], timeout: float) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, messages: List[Dict], timeout: float) -> str:
+        return "".join([text async for text in self.stream(messages, timeout)])
+
+    async def stream(self, messages: List[Dict], timeout: float) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", api_key: str = "", model=None, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.model = model
+        if self.model is None and api_key:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            try:
+                self.model = genai.GenerativeModel(model_name)
+                logger.info("Gemini provider initialized with model: %s", model_name)
+            except Exception as e:
+                logger.error("Failed to initialize Gemini model: %s", e)
+        elif self.model is None:
+            logger.error("GEMINI_API_KEY not set — Gemini provider disabled.")
+
+    @property
+    def configured(self) -> bool:
+        return self.model is not None
+
+    @staticmethod
+    def _contents(messages: List[Dict]) -> List[Dict]:
+        """Gemini `contents` (assistant → model)."""
+        return [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+            for m in messages
+        ]
+
+    def _generation_config(self) -> Dict:
+        return {"temperature": self.temperature, "max_output_tokens": self.max_tokens}
+
+    def generate(self, messages: List[Dict], timeout: float) -> str:
+        resp = self.model.generate_content(
+            self._contents(messages),
+            generation_config=self._generation_config(),
+            request_options={"timeout": timeout},
+        )
+        return resp.text or ""
+
+    async def agenerate(self, messages: List[Dict], timeout: float) -> str:
+        resp = await self.model.generate_content_async(
+            self._contents(messages),
+            generation_config=self._generation_config(),
+            request_options={"timeout": timeout},
+        )
+        return resp.text or ""
+
+    async def stream(self, messages: List[Dict], timeout: float) -> AsyncIterator[str]:
+        resp = await self.model.generate_content_async(
+            self._contents(messages),
+            generation_config=self._generation_config(),
+            stream=True,
+            request_options={"timeout": timeout},
+        )
+        async for chunk in resp:
+            try:
+                text = chunk.text
+            except ValueError:  # chunk without text parts (e.g. safety stop)
+                continue
+            if text:
+                yield text
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    POST {base_url}/chat/completions. The async forms run the blocking HTTP
+    reads on worker threads, so they don't stall the event loop.
+    """
+
+    name = "openai"
+
+    def __init__(self, model_name: str = "gpt-4o-mini", api_key: str = "",
+                 base_url: str = "https://api.openai.com/v1", **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+        if not api_key:
+            logger.error("OPENAI_API_KEY not set — OpenAI-compatible provider disabled.")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _session(self):
+        import requests
+
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return session
+
+    def _post(self, messages: List[Dict], timeout: float, stream: bool = False):
+        import requests
+
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": stream,
+        }
+        try:
+            resp = self._session().post(
+                f"{self.base_url}/chat/completions", json=payload, timeout=timeout, stream=stream
+            )
+        except requests.Timeout as e:
+            raise TimeoutError(str(e)) from e
+        except requests.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        if resp.status_code >= 400:
+            raise ProviderError(f"{resp.status_code}: {resp.text[:200]}", code=resp.status_code)
+        return resp
+
+    def generate(self, messages: List[Dict], timeout: float) -> str:
+        data = self._post(messages, timeout).json()
+        return data["choices"][0]["message"].get("content") or ""
+
+    async def agenerate(self, messages: List[Dict], timeout: float) -> str:
+        return await asyncio.to_thread(self.generate, messages, timeout)
+
+    def _stream_lines(self, messages: List[Dict], timeout: float):
+        """Text deltas from the server-sent events of a streamed completion."""
+        with self._post(messages, timeout, stream=True) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
+    async def stream(self, messages: List[Dict], timeout: float) -> AsyncIterator[str]:
+        lines = self._stream_lines(messages, timeout)
+        try:
+            while True:
+                text = await asyncio.to_thread(next, lines, None)
+                if text is None:
+                    return
+                yield text
+        finally:
+            lines.close()
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline stand-in: answers with the first answer_tokens words of the
+    prompt's last message (so the same prompt always gets the same answer),
+    after latency_ms, then at tokens_per_second (0: all at once).
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 300, tokens_per_second: float = 50, answer_tokens: int = 64,
+                 model_name: str = "stub", **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+
+    def _tokens(self, messages: List[Dict]) -> List[str]:
+        prompt = messages[-1]["content"] if messages else ""
+        words = prompt.split() or ["stub"]
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        tokens = [f"[stub {digest}]"] + [words[i % len(words)] for i in range(max(0, self.answer_tokens - 1))]
+        return [tokens[0]] + [f" {t}" for t in tokens[1:]]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def generate(self, messages: List[Dict], timeout: float) -> str:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency_ms / 1000 + self._token_delay() * (len(tokens) - 1))
+        return "".join(tokens)
+
+    async def agenerate(self, messages: List[Dict], timeout: float) -> str:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency_ms / 1000 + self._token_delay() * (len(tokens) - 1))
+        return "".join(tokens)
+
+    async def stream(self, messages: List[Dict], timeout: float) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(self._tokens(messages)):
+            if i and self._token_delay():
+                await asyncio.sleep(self._token_delay())
+            yield token
+
+
+def provider_from_settings(name: str) -> LLMProvider:
+    """A provider by name (see PROVIDERS), configured from Django settings."""
+    common = {
+        "temperature": getattr(settings, "LLM_TEMPERATURE", 0.7),
+        "max_tokens": getattr(settings, "LLM_MAX_TOKENS", 512),
+    }
+    if name == "gemini":
+        return GeminiProvider(
+            model_name=getattr(settings, "GEMINI_MODEL", "gemini-2.5-flash"),
+            api_key=getattr(settings, "GEMINI_API_KEY", ""),
+            **common,
+        )
+    if name == "openai":
+        return OpenAICompatibleProvider(
+            model_name=getattr(settings, "GEN_MODEL", "gpt-4o-mini"),
+            api_key=getattr(settings, "OPENAI_API_KEY", ""),
+            base_url=getattr(settings, "OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            **common,
+        )
+    if name == "stub":
+        return StubProvider(
+            latency_ms=getattr(settings, "STUB_LLM_LATENCY_MS", 300),
+            tokens_per_second=getattr(settings, "STUB_LLM_TOKENS_PER_SECOND", 50),
+            answer_tokens=getattr(settings, "STUB_LLM_ANSWER_TOKENS", 64),
+            **common,
+        )
+    raise ValueError(f"Unknown LLM provider {name!r}; expected one of {', '.join(PROVIDERS)}")
@@ -0,0 +1,104 @@
+import json
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+from chat.benchmarks import benchmark_chat, run_benchmarks
+from chat.index_factory import INDEX_TYPES
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+@contextmanager
+def throwaway_database():
+    """
+    A freshly migrated test database in place of the configured one (a temp
+    file for SQLite, test_<NAME> elsewhere), dropped afterwards: the ChatView
+    benchmark's users, sessions and messages never reach real data.
+    """
+    settings_dict = connection.settings_dict
+    old_name, old_test = settings_dict["NAME"], settings_dict.get("TEST", {})
+    with tempfile.TemporaryDirectory(prefix="rag-bench-db-") as workdir:
+        if connection.vendor == "sqlite":
+            # A file, not the shared in-memory default: the benchmark writes from several threads
+            settings_dict["TEST"] = {**old_test, "NAME": f"{workdir}/chat.sqlite3"}
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            settings_dict["TEST"] = old_test
+
+
+def chat_benchmark(requests: int, concurrency: int, llm_latency_ms: float):
+    """run_benchmarks' chat(store, queries): ChatView on store, a stub LLM and a throwaway database."""
+    from chat import services
+    from chat.ai_services import AIService
+    from chat.llm_providers import StubProvider
+    from chat.response_cache import ResponseCache
+    from users.models import User
+
+    def run(store, queries):
+        llm = AIService([StubProvider(llm_latency_ms, tokens_per_second=0)])
+        with throwaway_database(), \
+                mock.patch.object(services, "vector_db", store), \
+                mock.patch.object(services, "ai_service", llm), \
+                mock.patch.object(services.rag_service, "response_cache", ResponseCache(enabled=False)):
+            user = User.objects.create_user(username="benchmark", email="benchmark@example.invalid")
+            result = benchmark_chat(user, queries, requests, concurrency)
+        return dict(result, llm_latency_ms=llm_latency_ms)
+
+    return run
+
+
+class Command(BaseCommand):
+    help = "Benchmark ingest, index cold start, search latency/recall and ChatView throughput (JSON output)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated corpus sizes (chunks).")
+        parser.add_argument("--index-types", default=",".join(INDEX_TYPES),
+                            help="Comma-separated index types to benchmark.")
+        parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size.")
+        parser.add_argument("--top-k", type=int, default=10, help="k for search latency and recall@k.")
+        parser.add_argument("--chat-requests", type=int, default=50, help="ChatView requests to send.")
+        parser.add_argument("--chat-concurrency", type=int, default=4, help="Concurrent ChatView clients.")
+        parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latency of the fake AI service.")
+        parser.add_argument("--skip-chat", action="store_true", help="Only benchmark the vector store.")
+        parser.add_argument("--embedder", choices=("synthetic", "model"), default="synthetic",
+                            help="synthetic (seeded, no model download) or the real embedding model.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus and queries.")
+        parser.add_argument("--output", default="", help="Write the JSON results here instead of stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in _csv(options["sizes"])]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        index_types = _csv(options["index_types"])
+        unknown = sorted(set(index_types) - set(INDEX_TYPES))
+        if unknown or not index_types or not sizes:
+            raise CommandError(f"Pass sizes and index types from {', '.join(INDEX_TYPES)} (unknown: {unknown}).")
+
+        results = run_benchmarks(
+            sizes,
+            index_types,
+            queries=options["queries"],
+            top_k=options["top_k"],
+            chat_requests=0 if options["skip_chat"] else options["chat_requests"],
+            chat_concurrency=options["chat_concurrency"],
+            llm_latency_ms=options["llm_latency_ms"],
+            embedder=options["embedder"],
+            seed=options["seed"],
+            progress=lambda message: self.stderr.write(f"Benchmarking {message}..."),
+            chat=chat_benchmark(options["chat_requests"], options["chat_concurrency"], options["llm_latency_ms"]),
+        )
+        report = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(report + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(report)
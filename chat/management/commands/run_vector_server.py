@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.vector_store import VectorStore, vector_db
+from chat.vector_service import VectorStoreServer
+
+
+class Command(BaseCommand):
+    help = "Serve the vector store over a Unix socket so web workers share one model and index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=getattr(settings, "VECTOR_STORE_SOCKET", ""),
+            help="Unix socket path (defaults to VECTOR_STORE_SOCKET).",
+        )
+
+    def handle(self, *args, **options):
+        address = options["socket"]
+        if not address:
+            raise CommandError("Pass --socket or set VECTOR_STORE_SOCKET.")
+
+        # The server owns all writes, so it always runs a writable in-process store
+        store = vector_db if isinstance(vector_db, VectorStore) and not vector_db.read_only else VectorStore(read_only=False)
+        self.stdout.write(self.style.SUCCESS(f"Serving vector store ({store.count()} chunks) on {address}"))
+        try:
+            VectorStoreServer(store, address).serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Vector store server stopped.")
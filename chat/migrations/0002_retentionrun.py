@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateTimeField(help_text='Messages created before this are deleted')),
+                ('phase', models.CharField(choices=[('messages', 'Deleting old messages'), ('sessions', 'Deleting empty sessions'), ('done', 'Done')], default='messages', max_length=10)),
+                ('position', models.BigIntegerField(default=0, help_text='Next id to scan in the current phase')),
+                ('messages_deleted', models.PositiveBigIntegerField(default=0)),
+                ('sessions_deleted', models.PositiveBigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
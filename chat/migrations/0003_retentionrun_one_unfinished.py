@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_retentionrun'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='retentionrun',
+            constraint=models.UniqueConstraint(models.Value(True), condition=models.Q(('finished_at__isnull', True)), name='one_unfinished_retention_run'),
+        ),
+    ]
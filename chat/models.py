@@ -1,6 +1,23 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Substr
 from django.conf import settings
 
+LAST_MESSAGE_PREVIEW_CHARS = 200
+
+
+class ChatSessionQuerySet(models.QuerySet):
+    def with_summary(self):
+        """
+        Annotates message_count and last_message (a preview of the newest
+        message) in the same query, without loading any message bodies.
+        """
+        last = ChatMessage.objects.filter(session=OuterRef("pk")).order_by("-created_at", "-id")
+        return self.annotate(
+            message_count=Count("messages"),
+            last_message=Subquery(last.values(preview=Substr("content", 1, LAST_MESSAGE_PREVIEW_CHARS))[:1]),
+        )
+
 
 class ChatSession(models.Model):
     """
@@ -20,6 +37,8 @@ class ChatSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ChatSessionQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [
@@ -62,17 +81,54 @@ class ChatMessage(models.Model):
     def save(self, *args, **kwargs):
         """
         Ensure the session gets a title from the first user message.
-        Only set once, on the first user message.
+        Only set once, on the first user message. Chat views save turns
+        through chat/repository.py, which titles sessions itself.
         """
         is_new = self._state.adding
         super().save(*args, **kwargs)
 
-        if (
-            is_new
-            and self.role == "user"
-            and not self.session.title
-        ):
-            self.session.title = (
-                self.content[:50] + "..." if len(self.content) > 50 else self.content
-            )
-            self.session.save(update_fields=["title"])
+        if not is_new or self.role != "user":
+            return
+        session = self._state.fields_cache.get("session")  # never fetched just for this
+        if session is not None and session.title:
+            return
+        title = self.content[:50] + "..." if len(self.content) > 50 else self.content
+        if ChatSession.objects.filter(pk=self.session_id, title="").update(title=title) and session is not None:
+            session.title = title
+
+
+class RetentionRun(models.Model):
+    """
+    Progress of one chat retention cleanup (see chat/retention.py).
+    Saved after every batch, so an interrupted run resumes where it
+    stopped, with the same cutoff.
+    """
+    PHASE_MESSAGES = "messages"
+    PHASE_SESSIONS = "sessions"
+    PHASE_DONE = "done"
+    PHASE_CHOICES = [
+        (PHASE_MESSAGES, "Deleting old messages"),
+        (PHASE_SESSIONS, "Deleting empty sessions"),
+        (PHASE_DONE, "Done"),
+    ]
+
+    cutoff = models.DateTimeField(help_text="Messages created before this are deleted")
+    phase = models.CharField(max_length=10, choices=PHASE_CHOICES, default=PHASE_MESSAGES)
+    position = models.BigIntegerField(default=0, help_text="Next id to scan in the current phase")
+    messages_deleted = models.PositiveBigIntegerField(default=0)
+    sessions_deleted = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+        constraints = [
+            # At most one unfinished run: a second process's create() fails instead of starting another
+            models.UniqueConstraint(
+                models.Value(True), condition=models.Q(finished_at__isnull=True), name="one_unfinished_retention_run"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Retention run {self.pk} (cutoff {self.cutoff:%Y-%m-%d %H:%M}, {self.phase})"
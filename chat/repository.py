@@ -0,0 +1,86 @@
+# chat/repository.py
+"""
+Persistence of chat turns, in as few writes as possible.
+
+A turn from ChatView is saved after generation, in one transaction: the
+new session (created with its title), or a conditional title update of an
+untitled one, plus a single bulk insert of the user and assistant
+messages. That is at most two writes; every autocommit write would take
+SQLite's writer lock on its own.
+
+Sessions returned here carry message_count and last_message, like
+ChatSession.objects.with_summary(), so serializing them costs no queries.
+"""
+import logging
+from typing import Optional, Tuple
+from django.db import transaction
+from .models import LAST_MESSAGE_PREVIEW_CHARS, ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+TITLE_CHARS = 50
+
+
+def session_title(message: str) -> str:
+    """Session title from its first user message."""
+    return message[:TITLE_CHARS] + ("..." if len(message) > TITLE_CHARS else "")
+
+
+def get_session(user, session_id: int) -> Optional[ChatSession]:
+    """The user's session with session_id (with its summary), or None if not theirs."""
+    return ChatSession.objects.with_summary().filter(id=session_id, user=user).first()
+
+
+def _titled_session(user, session: Optional[ChatSession], user_message: str) -> ChatSession:
+    """session, created (with a title) if None, or titled if it has none yet."""
+    title = session_title(user_message)
+    if session is None:
+        session = ChatSession.objects.create(user=user, title=title)
+        session.message_count, session.last_message = 0, None
+    elif not session.title:
+        # Only the first turn to get here sets the title
+        if ChatSession.objects.filter(pk=session.pk, title="").update(title=title):
+            session.title = title
+        else:
+            session.refresh_from_db(fields=["title"])
+    return session
+
+
+def _add_to_summary(session: ChatSession, *messages: ChatMessage):
+    session.message_count = getattr(session, "message_count", 0) + len(messages)
+    session.last_message = messages[-1].content[:LAST_MESSAGE_PREVIEW_CHARS]
+
+
+def save_turn(user, session: Optional[ChatSession], user_message: str,
+              ai_response: str) -> Tuple[ChatSession, ChatMessage, ChatMessage]:
+    """
+    Save a question and its answer. session: the user's session, or None to
+    start a new one. Returns (session, user message, assistant message).
+    """
+    with transaction.atomic():
+        session = _titled_session(user, session, user_message)
+        user_msg, ai_msg = ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, role="user", content=user_message),
+            ChatMessage(session=session, role="assistant", content=ai_response),
+        ])
+    _add_to_summary(session, user_msg, ai_msg)
+    return session, user_msg, ai_msg
+
+
+def start_turn(user, session: Optional[ChatSession], user_message: str) -> Tuple[ChatSession, ChatMessage]:
+    """
+    First half of a streamed turn: the question is saved before generation
+    starts (the client gets its id right away). Returns (session, user message).
+    """
+    with transaction.atomic():
+        session = _titled_session(user, session, user_message)
+        user_msg = ChatMessage.objects.create(session=session, role="user", content=user_message)
+    _add_to_summary(session, user_msg)
+    return session, user_msg
+
+
+def finish_turn(session: ChatSession, ai_response: str) -> ChatMessage:
+    """Second half of a streamed turn: save the answer."""
+    ai_msg = ChatMessage.objects.create(session=session, role="assistant", content=ai_response)
+    _add_to_summary(session, ai_msg)
+    return ai_msg
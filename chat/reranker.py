@@ -0,0 +1,118 @@
+# chat/reranker.py
+"""
+Optional cross-encoder rerank stage between retrieval and generation.
+
+The retriever over-fetches RERANK_CANDIDATES chunks, a small local
+cross-encoder (RERANK_MODEL) scores every (query, chunk) pair in one batched
+pass and the best top_k are kept. CPU cost is bounded:
+    - pairs are truncated to RERANK_MAX_LENGTH tokens,
+    - at most RERANK_MAX_CONCURRENCY scoring passes run at once (requests
+      arriving while all slots are busy skip the rerank),
+    - a request waits at most RERANK_BUDGET_MS for its scores.
+Whenever the rerank is skipped, times out or fails, retrieval order is kept.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """Reorders retrieval results by cross-encoder relevance, within a time budget."""
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        budget_ms: int = 250,
+        max_length: int = 256,
+        max_concurrency: int = 1,
+        batch_size: int = 32,
+        enabled: bool = True,
+        model=None,
+    ):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._model = model  # lazy init
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="rerank")
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    try:
+                        self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+                    except Exception:
+                        self._load_failed = True
+                        raise
+                    logger.info("Loaded rerank model %s", self.model_name)
+        return self._model
+
+    @staticmethod
+    def _passage(result: Dict) -> str:
+        doc = result.get("document", {})
+        title = doc.get("title") or ""
+        content = doc.get("content") or ""
+        return f"{title}\n{content}" if title else content
+
+    def _score(self, query: str, results: List[Dict]) -> np.ndarray:
+        try:
+            pairs = [(query, self._passage(r)) for r in results]
+            return np.asarray(
+                self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False),
+                dtype="float32",
+            ).reshape(-1)
+        finally:
+            self._slots.release()
+
+    def rerank(self, query: str, results: List[Dict], top_k: int = 3) -> List[Dict]:
+        """
+        The top_k of results by cross-encoder score (added as "rerank_score"),
+        or the first top_k in their original order if the rerank can't finish
+        within the budget.
+        """
+        if not self.enabled or self._load_failed or len(results) < 2 or not query.strip():
+            return results[:top_k]
+        if not self._slots.acquire(blocking=False):
+            logger.debug("Rerank skipped: all scoring slots busy")
+            return results[:top_k]
+
+        try:
+            future = self._pool.submit(self._score, query, results)
+        except Exception:
+            self._slots.release()
+            logger.exception("Rerank failed, keeping retrieval order")
+            return results[:top_k]
+        try:
+            # On timeout the pass finishes in the background, still holding its slot
+            scores = future.result(timeout=self.budget_ms / 1000.0)
+        except FutureTimeout:
+            logger.info("Rerank exceeded %d ms budget, keeping retrieval order", self.budget_ms)
+            return results[:top_k]
+        except Exception:
+            logger.exception("Rerank failed, keeping retrieval order")
+            return results[:top_k]
+
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [dict(results[i], rerank_score=round(float(scores[i]), 6)) for i in order]
+
+
+def reranker_from_settings() -> CrossEncoderReranker:
+    return CrossEncoderReranker(
+        model_name=getattr(settings, "RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        budget_ms=getattr(settings, "RERANK_BUDGET_MS", 250),
+        max_length=getattr(settings, "RERANK_MAX_LENGTH", 256),
+        max_concurrency=getattr(settings, "RERANK_MAX_CONCURRENCY", 1),
+        enabled=getattr(settings, "RERANK_ENABLED", False),
+    )
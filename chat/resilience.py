@@ -0,0 +1,176 @@
+# chat/resilience.py
+"""
+Building blocks that keep calls to a flaky upstream (Gemini) from tying up
+request workers:
+
+    - backoff_delay:  jittered exponential backoff ("full jitter")
+    - is_retryable:   only timeouts, throttling and 5xx are worth retrying
+    - Deadline:       the time left for a whole request, retries included
+    - CircuitBreaker: after repeated failures, fail fast for a while and then
+                      let a single probe call through
+    - Bulkhead:       caps the calls in flight; callers wait briefly for a
+                      slot and are rejected if none frees up
+
+State is per process and shared by every caller that uses the same instance.
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Optional
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_TRANSITIONS = metrics.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes.", ("breaker", "state")
+)
+
+# HTTP statuses (google.api_core exceptions carry them as .code) worth retrying
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient upstream failures: timeouts, connection errors, throttling, 5xx."""
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    code = getattr(exc, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Sleep before retry number attempt + 1: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class Deadline:
+    """A point in time by which a request must be done."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls pass; failure_threshold consecutive failures open it
+    open      -> calls are rejected until reset_timeout has passed
+    half_open -> one probe call passes; its success closes the circuit,
+                 its failure opens it again
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            CIRCUIT_TRANSITIONS.inc(breaker=self.name, state=state)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now (a True in half_open is the probe)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def cancel(self):
+        """An allowed call ended without an outcome (e.g. cancelled); frees the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def state_value(self) -> int:
+        return self.STATE_VALUES[self.state]
+
+
+class Bulkhead:
+    """At most max_concurrent calls in flight; acquire() waits up to timeout for a slot."""
+
+    ASYNC_POLL_SECONDS = 0.01
+
+    def __init__(self, max_concurrent: int = 16):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def _try_acquire(self) -> bool:
+        if self.in_flight >= self.max_concurrent:
+            return False
+        self.in_flight += 1
+        return True
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        with self._cond:
+            return self._cond.wait_for(self._try_acquire, timeout=max(0.0, timeout))
+
+    async def acquire_async(self, timeout: float = 0.0) -> bool:
+        """acquire() for coroutines: polls instead of blocking the event loop."""
+        deadline = Deadline(timeout)
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    return True
+            if deadline.expired():
+                return False
+            await asyncio.sleep(min(self.ASYNC_POLL_SECONDS, deadline.remaining()))
+
+    def release(self):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify()
+
+
+class RetryPolicy:
+    """How hard to try: attempts, backoff and the per-request deadline (seconds)."""
+
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.2, backoff_max: float = 2.0,
+                 deadline: float = 15.0, queue_wait: float = 1.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.queue_wait = queue_wait  # longest wait for a bulkhead slot
+
+    def next_delay(self, attempt: int, deadline: Deadline) -> Optional[float]:
+        """Backoff before the next attempt, or None if there is none (attempts or time used up)."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        return delay if delay < deadline.remaining() else None
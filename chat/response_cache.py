@@ -0,0 +1,187 @@
+# chat/response_cache.py
+"""
+In-process cache of generated answers, in front of the LLM call.
+
+Two tiers, both scoped to the exact set of retrieved documents (so a hit
+always answers from the same context):
+    - exact:    normalized query + retrieved doc ids + prompt version
+    - semantic: a cached query whose embedding is within
+                RESPONSE_CACHE_SIMILARITY (cosine) of the new one
+
+Entries expire after RESPONSE_CACHE_TTL seconds, the least recently used
+are evicted beyond RESPONSE_CACHE_MAX_ENTRIES, and everything is dropped
+when the vector store's version changes (documents added, edited, removed).
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the question."""
+    return _WHITESPACE.sub(" ", query.strip().lower()).rstrip(" ?!.")
+
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache of {"response", "vector"} entries.
+    stats() exposes hit/miss counters per tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float = 3600,
+        similarity: float = 0.95,
+        enabled: bool = True,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.similarity = similarity
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._by_context: Dict[Tuple, List[str]] = {}  # (prompt_version, doc_ids) -> keys
+        self._version = None
+        self._counters = dict.fromkeys(
+            ("exact_hits", "semantic_hits", "misses", "evictions", "expirations", "invalidations"), 0
+        )
+
+    @staticmethod
+    def _context(doc_ids: List[str], prompt_version: str) -> Tuple:
+        return (prompt_version, tuple(doc_ids))
+
+    @staticmethod
+    def _key(query: str, context: Tuple) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8"))
+        digest.update(repr(context).encode("utf-8"))
+        return digest.hexdigest()
+
+    # --- Internal (call with self._lock held) ---
+    def _check_version(self, version: Optional[str]):
+        if version != self._version:
+            if self._entries:
+                self._counters["invalidations"] += 1
+                logger.info("Vector store changed, dropping %d cached responses", len(self._entries))
+            self._entries.clear()
+            self._by_context.clear()
+            self._version = version
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        keys = self._by_context.get(entry["context"], [])
+        if key in keys:
+            keys.remove(key)
+        if not keys:
+            self._by_context.pop(entry["context"], None)
+
+    def _live(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry["created"] > self.ttl:
+            self._remove(key)
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    # --- Public API ---
+    def get_exact(self, query: str, doc_ids: List[str], prompt_version: str,
+                  version: Optional[str] = None) -> Optional[str]:
+        """Cached response for the same (normalized) query and context, if any."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version(version)
+            entry = self._live(self._key(query, self._context(doc_ids, prompt_version)), time.time())
+            if entry is None:
+                return None
+            self._counters["exact_hits"] += 1
+            return entry["response"]
+
+    def has_context(self, doc_ids: List[str], prompt_version: str) -> bool:
+        """True if some cached answer used this context (worth a semantic lookup)."""
+        with self._lock:
+            return bool(self._by_context.get(self._context(doc_ids, prompt_version)))
+
+    def get_semantic(self, query_vector: Optional[np.ndarray], doc_ids: List[str], prompt_version: str,
+                     version: Optional[str] = None) -> Optional[str]:
+        """
+        Cached response for the most similar query with the same context, if
+        its cosine similarity reaches the threshold. Counts a miss otherwise
+        (call after get_exact).
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version(version)
+            best_key, best_score = None, self.similarity
+            if query_vector is not None:
+                now = time.time()
+                for key in list(self._by_context.get(self._context(doc_ids, prompt_version), [])):
+                    entry = self._live(key, now)
+                    if entry is None or entry["vector"] is None:
+                        continue
+                    score = float(np.dot(entry["vector"], query_vector))  # embeddings are normalized
+                    if score >= best_score:
+                        best_key, best_score = key, score
+            if best_key is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._counters["semantic_hits"] += 1
+            return self._entries[best_key]["response"]
+
+    def put(self, query: str, doc_ids: List[str], prompt_version: str, response: str,
+            query_vector: Optional[np.ndarray] = None, version: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        context = self._context(doc_ids, prompt_version)
+        key = self._key(query, context)
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "response": response,
+                "vector": None if query_vector is None else np.asarray(query_vector, dtype="float32"),
+                "context": context,
+                "created": time.time(),
+            }
+            self._by_context.setdefault(context, []).append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters, size=len(self._entries))
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def response_cache_from_settings() -> ResponseCache:
+    return ResponseCache(
+        max_entries=getattr(settings, "RESPONSE_CACHE_MAX_ENTRIES", 1000),
+        ttl=getattr(settings, "RESPONSE_CACHE_TTL", 3600),
+        similarity=getattr(settings, "RESPONSE_CACHE_SIMILARITY", 0.95),
+        enabled=getattr(settings, "RESPONSE_CACHE_ENABLED", True),
+    )
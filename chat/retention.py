@@ -0,0 +1,149 @@
+# chat/retention.py
+"""
+Chat retention cleanup, run nightly by core/scheduler.py.
+
+Messages older than CHAT_RETENTION_DAYS are deleted, then sessions from
+before the cutoff that have no messages left. Both phases delete id ranges
+of RETENTION_BATCH_SIZE, each starting at the next matching id (ids that
+don't match, like old sessions still in use, are skipped, not scanned):
+    - each range is one raw DELETE (no objects are loaded and no Python-side
+      cascade runs) in its own short transaction, which also saves the
+      progress in a RetentionRun,
+    - after a batch that deleted rows the job pauses RETENTION_BATCH_PAUSE
+      seconds so request writers get the database lock,
+    - empty sessions are found with NOT EXISTS on the (session, created_at)
+      index, instead of an anti-join over every session.
+An interrupted run (crash, deploy, RETENTION_MAX_SECONDS budget used up) is
+resumed by the next one, with the same cutoff and position.
+"""
+import time
+import logging
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+from .models import ChatMessage, ChatSession, RetentionRun
+
+logger = logging.getLogger(__name__)
+
+LOG_EVERY_SECONDS = 10
+
+
+def _claim_run(days: int) -> Optional[RetentionRun]:
+    """
+    The unfinished run to resume, or a new one; None if another process is
+    working on it. Resuming is a conditional UPDATE of updated_at (only one
+    process can win it); the one_unfinished_retention_run constraint makes
+    a concurrent second create() fail.
+    """
+    now = timezone.now()
+    lease = getattr(settings, "RETENTION_LEASE_SECONDS", 300)
+    try:
+        with transaction.atomic():
+            run = RetentionRun.objects.select_for_update().filter(finished_at__isnull=True).first()
+            if run is None:
+                return RetentionRun.objects.create(cutoff=now - timedelta(days=days))
+            claimed = RetentionRun.objects.filter(
+                pk=run.pk, updated_at__lte=now - timedelta(seconds=lease)
+            ).update(updated_at=now)
+    except IntegrityError:
+        return None
+    if not claimed:
+        return None
+    run.updated_at = now
+    logger.info("Resuming %s at id %s", run, run.position)
+    return run
+
+
+def _id_bounds(queryset, position: int):
+    bounds = queryset.filter(id__gte=position).aggregate(lo=Min("id"), hi=Max("id"))
+    return bounds["lo"], bounds["hi"]
+
+
+def purge_old_chats(days: Optional[int] = None, batch_size: Optional[int] = None, pause: Optional[float] = None,
+                    max_seconds: Optional[float] = None,
+                    progress: Optional[Callable[[Dict], None]] = None) -> Optional[Dict]:
+    """
+    Run (or resume) the retention cleanup. Returns its stats, or None if
+    another process is already running it. progress is called with the
+    stats after every batch.
+    """
+    days = getattr(settings, "CHAT_RETENTION_DAYS", 30) if days is None else days
+    batch_size = max(1, batch_size or getattr(settings, "RETENTION_BATCH_SIZE", 1000))
+    pause = getattr(settings, "RETENTION_BATCH_PAUSE", 0.05) if pause is None else pause
+    max_seconds = getattr(settings, "RETENTION_MAX_SECONDS", 0) if max_seconds is None else max_seconds
+
+    run = _claim_run(days)
+    if run is None:
+        logger.info("Retention cleanup already running in another process")
+        return None
+
+    started = time.monotonic()
+    last_log = started
+    deleted = 0
+
+    def stats(finished: bool) -> Dict:
+        elapsed = time.monotonic() - started
+        return {
+            "run": run.pk,
+            "cutoff": run.cutoff.isoformat(),
+            "phase": run.phase,
+            "messages_deleted": run.messages_deleted,
+            "sessions_deleted": run.sessions_deleted,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(deleted / elapsed, 1) if elapsed else None,
+            "finished": finished,
+        }
+
+    phases = [
+        (RetentionRun.PHASE_MESSAGES, "messages_deleted",
+         lambda: ChatMessage.objects.filter(created_at__lt=run.cutoff)),
+        (RetentionRun.PHASE_SESSIONS, "sessions_deleted",
+         lambda: ChatSession.objects.filter(created_at__lt=run.cutoff).filter(
+             ~Exists(ChatMessage.objects.filter(session=OuterRef("pk")))
+         )),
+    ]
+    for index, (phase, counter, candidates) in enumerate(phases):
+        if run.phase != phase:
+            continue
+        lo, hi = _id_bounds(candidates(), run.position)
+        while lo is not None:
+            upper = lo + batch_size
+            with transaction.atomic():
+                batch = candidates().filter(id__gte=lo, id__lt=upper)
+                count = batch._raw_delete(batch.db)
+                run.position = upper
+                setattr(run, counter, getattr(run, counter) + count)
+                run.save(update_fields=["position", counter, "updated_at"])
+            deleted += count
+            # Seek to the next candidate: skips the ids in between (recent rows, sessions still in use)
+            lo, _ = _id_bounds(candidates().filter(id__lte=hi), upper)
+
+            now = time.monotonic()
+            if progress is not None:
+                progress(stats(False))
+            if now - last_log >= LOG_EVERY_SECONDS:
+                last_log = now
+                current = stats(False)
+                logger.info("Retention cleanup: %s messages, %s sessions deleted (%s rows/s)",
+                            current["messages_deleted"], current["sessions_deleted"], current["rows_per_second"])
+            if max_seconds and now - started >= max_seconds:
+                logger.info("Retention cleanup paused after %.0fs at %s id %s", now - started, phase, run.position)
+                return stats(False)
+            if pause and count and lo is not None:
+                time.sleep(pause)  # let request writers take the lock
+
+        next_phase = phases[index + 1][0] if index + 1 < len(phases) else RetentionRun.PHASE_DONE
+        run.phase, run.position = next_phase, 0
+        if next_phase == RetentionRun.PHASE_DONE:
+            run.finished_at = timezone.now()
+        run.save(update_fields=["phase", "position", "finished_at", "updated_at"])
+
+    result = stats(True)
+    logger.info(
+        "Cleanup job: deleted %s old messages and %s empty sessions in %.1fs (%s rows/s)",
+        result["messages_deleted"], result["sessions_deleted"], result["seconds"], result["rows_per_second"],
+    )
+    return result
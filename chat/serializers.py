@@ -1,6 +1,6 @@
 # chat/serializers.py
 from rest_framework import serializers
-from .models import ChatSession, ChatMessage
+from .models import LAST_MESSAGE_PREVIEW_CHARS, ChatSession, ChatMessage
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
@@ -16,6 +16,8 @@ class ChatSessionSerializer(serializers.ModelSerializer):
     """
     Lightweight serializer for chat sessions.
     Includes message count and last message preview, but not full history.
+    Sessions from ChatSession.objects.with_summary() carry both already;
+    others cost two queries each.
     """
     message_count = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
@@ -33,11 +35,15 @@ class ChatSessionSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
     def get_message_count(self, obj):
+        if hasattr(obj, "message_count"):
+            return obj.message_count
         return obj.messages.count()
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        return last_msg.content if last_msg else None
+        if hasattr(obj, "last_message"):
+            return obj.last_message
+        last_msg = obj.messages.order_by("-created_at", "-id").only("content").first()
+        return last_msg.content[:LAST_MESSAGE_PREVIEW_CHARS] if last_msg else None
 
 
 class ChatSessionDetailSerializer(serializers.ModelSerializer):
@@ -1,25 +1,41 @@
 # chat/services.py
 import time
 import logging
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Dict, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from documents.models import Document
 from .vector_store import vector_db
-from .ai_services import ai_service
+from .ai_services import FALLBACK_RESPONSES, ai_service
+from .context_packer import ContextPacker, context_packer_from_settings
+from .reranker import CrossEncoderReranker, reranker_from_settings
+from .response_cache import ResponseCache, response_cache_from_settings
 
 logger = logging.getLogger(__name__)
 
 
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
 class AdvancedRAGService:
     """
     Advanced Retrieval-Augmented Generation (RAG) service.
     Handles:
       - Loading documents into the vector store
-      - Retrieving relevant chunks
-      - Building optimized context
+      - Retrieving relevant chunks (optionally reranked by a cross-encoder)
+      - Building optimized context within a token budget (see context_packer)
       - Passing query + context + history to Gemini
+      - Caching answers to first-turn questions (see response_cache)
     """
 
-    def __init__(self, preload: bool = False):
+    def __init__(self, preload: bool = False, response_cache: Optional[ResponseCache] = None,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 context_packer: Optional[ContextPacker] = None):
+        self.response_cache = response_cache if response_cache is not None else default_response_cache
+        self.reranker = reranker if reranker is not None else default_reranker
+        self.context_packer = context_packer or context_packer_from_settings()
         # Vector index is initialized in ChatConfig.ready()
         if preload:
             self.load_documents_to_vector_db()
@@ -50,11 +66,34 @@ class AdvancedRAGService:
             vector_db.add_documents(vector_docs)
             logger.info("Added %s new documents to vector DB", len(vector_docs))
 
-    def retrieve_relevant_documents(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search vector DB for top_k relevant documents."""
+    def retrieve_relevant_documents(self, query: str, top_k: int = 3, filters: Optional[Dict] = None,
+                                    timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Search vector DB for top_k relevant documents (hybrid vector + BM25 by
+        default), optionally restricted to a category / doc_type / tags.
+        With the reranker enabled, RERANK_CANDIDATES are fetched and the
+        cross-encoder picks the top_k.
+        Stage durations (ms) are added to timings: the vector store's own
+        (embed, vector_search, lexical_search), "retrieval" for the whole
+        search and "rerank".
+        """
+        timings = {} if timings is None else timings
         if not query.strip():
             return []
-        return vector_db.search(query, top_k)
+        started = time.perf_counter()
+        fetch = max(top_k, getattr(settings, "RERANK_CANDIDATES", 20)) if self.reranker.enabled else top_k
+        if getattr(settings, "HYBRID_SEARCH_ENABLED", True):
+            candidates = vector_db.hybrid_search(query, fetch, filters=filters, timings=timings)
+        else:
+            candidates = vector_db.search(query, fetch, filters=filters, timings=timings)
+        timings["retrieval"] = _elapsed_ms(started)
+        if not self.reranker.enabled:
+            return candidates
+
+        started = time.perf_counter()
+        candidates = self.reranker.rerank(query, candidates, top_k)
+        timings["rerank"] = _elapsed_ms(started)
+        return candidates
 
     def build_gemini_optimized_context(self, documents: List[Dict]) -> str:
         """Format retrieved documents into a context string for Gemini."""
@@ -83,31 +122,93 @@ class AdvancedRAGService:
         messages = (
             ChatMessage.objects.filter(session_id=session_id)
             .only("role", "content")
-            .order_by("-created_at")[:limit]
+            .order_by("-created_at", "-id")[:limit]
         )
         return [{"role": m.role, "content": m.content} for m in reversed(messages)]
 
-    def process_query(self, query: str, session_id: Optional[int] = None) -> Dict:
+    def prepare_query(self, query: str, session_id: Optional[int] = None,
+                      filters: Optional[Dict] = None) -> Dict:
         """
-        Main entrypoint: process a user query with RAG + Gemini.
-        Returns a dict with response, context, metadata.
+        Retrieval half of the pipeline: relevant docs and history, packed into
+        the token budget, the context built from them and the token usage.
+
+        Retrieval (embedding + search) runs on _retrieval_pool while history
+        is read on this one (keeping the ORM on the request's connection);
+        "timings" holds each stage's duration in ms.
         """
-        start_time = time.time()
+        timings: Dict[str, float] = {}
+        # Read before retrieval so a concurrent ingest can't get cached under the new version
+        store_version = vector_db.version() if self.response_cache.enabled else None
+        retrieval = _retrieval_pool.submit(self.retrieve_relevant_documents, query, filters=filters, timings=timings)
 
-        relevant = self.retrieve_relevant_documents(query)
-        context = self.build_gemini_optimized_context(relevant)
+        started = time.perf_counter()
         history = self.get_conversation_history(session_id) if session_id else []
+        timings["history"] = _elapsed_ms(started)
+        relevant = retrieval.result()
 
-        try:
-            response = ai_service.generate_response(query, context, history)
-            success = True
-        except Exception as e:
-            logger.error("AI generation failed: %s", e, exc_info=True)
-            response = "Sorry, I couldn’t generate a response this time."
-            success = False
+        started = time.perf_counter()
+        packed = self.context_packer.pack(query, relevant, history)
+        context = self.build_gemini_optimized_context(packed.documents)
+        timings["context_build"] = _elapsed_ms(started)
 
+        usage = dict(packed.usage, context_tokens=self.context_packer.count_tokens(context))
+        usage["total_tokens"] = usage["context_tokens"] + usage["history_tokens"] + usage["query_tokens"]
+        return {
+            "relevant": packed.documents,
+            "context": context,
+            "history": packed.history,
+            "store_version": store_version,
+            "token_usage": usage,
+            "timings": timings,
+        }
+
+    # --- Response cache ---
+    @staticmethod
+    def _is_first_turn(query: str, history: List[Dict]) -> bool:
+        """
+        Answers only depend on query + context when there is no earlier
+        conversation (the current message may already be saved in history).
+        """
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == query:
+            history = history[:-1]
+        return not history
+
+    def _cache_scope(self, query: str, prepared: Dict, provider: Optional[str] = None) -> Optional[Dict]:
+        """Cache lookup arguments for answers from provider, or None when this query must not use the cache."""
+        if not self.response_cache.enabled or not self._is_first_turn(query, prepared["history"]):
+            return None
+        return {
+            "doc_ids": [r.get("document", {}).get("id") for r in prepared["relevant"]],
+            "prompt_version": ai_service.prompt_version(provider),
+            "version": prepared["store_version"],
+        }
+
+    def _cached_response(self, query: str, scope: Optional[Dict]) -> Optional[str]:
+        if scope is None:
+            return None
+        cached = self.response_cache.get_exact(query, **scope)
+        if cached is not None:
+            return cached
+        query_vector = None
+        if self.response_cache.has_context(scope["doc_ids"], scope["prompt_version"]):
+            # Retrieval just embedded this query, so this is a memo lookup, not a model call
+            query_vector = vector_db.cached_query_vector(query)
+        return self.response_cache.get_semantic(query_vector, **scope)
+
+    def _cache_response(self, query: str, scope: Optional[Dict], response: str):
+        """Store an answer; only call this once generation has completed successfully."""
+        if scope is None or not response or response in FALLBACK_RESPONSES:
+            return
+        self.response_cache.put(
+            query, response=response, query_vector=vector_db.cached_query_vector(query), **scope
+        )
+
+    def _result(self, prepared: Dict, response: str, success: bool, start_time: float,
+                cached: bool = False) -> Dict:
+        relevant, context = prepared["relevant"], prepared["context"]
         latency = time.time() - start_time
-        logger.info("Processed query in %.3fs (success=%s)", latency, success)
+        timings = dict(prepared["timings"], total=round(latency * 1000, 1))
+        logger.info("Processed query in %.3fs (success=%s, cached=%s, timings=%s)", latency, success, cached, timings)
 
         return {
             "response": response,
@@ -116,8 +217,99 @@ class AdvancedRAGService:
             "documents_count": len(relevant),
             "context_used": context[:500] + "..." if len(context) > 500 else context,
             "success": success,
+            "cached": cached,
+            "token_usage": prepared["token_usage"],
+            "timings": timings,
         }
 
+    def process_query(self, query: str, session_id: Optional[int] = None,
+                      filters: Optional[Dict] = None, provider: Optional[str] = None) -> Dict:
+        """
+        Main entrypoint: process a user query with RAG + the LLM provider
+        (default: LLM_PROVIDER). Returns a dict with response, context, metadata.
+        """
+        start_time = time.time()
+        prepared = self.prepare_query(query, session_id, filters)
+
+        scope = self._cache_scope(query, prepared, provider)
+        started = time.perf_counter()
+        cached = self._cached_response(query, scope)
+        prepared["timings"]["cache"] = _elapsed_ms(started)
+        if cached is not None:
+            return self._result(prepared, cached, True, start_time, cached=True)
+
+        started = time.perf_counter()
+        try:
+            response = ai_service.generate_response(
+                query, prepared["context"], prepared["history"], provider=provider
+            )
+            prepared["timings"]["generate"] = _elapsed_ms(started)
+            success = True
+        except Exception as e:
+            logger.error("AI generation failed: %s", e, exc_info=True)
+            response = "Sorry, I couldn’t generate a response this time."
+            prepared["timings"]["generate"] = _elapsed_ms(started)
+            success = False
+
+        if success:
+            self._cache_response(query, scope, response)
+
+        return self._result(prepared, response, success, start_time)
+
+    async def stream_query(self, query: str, session_id: Optional[int] = None,
+                           filters: Optional[Dict] = None, provider: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        Streaming process_query for async views. Yields
+            {"type": "token", "text": "..."}  for each generated chunk, then
+            {"type": "done", "result": {...}} with the same dict process_query returns.
+        Retrieval (FAISS + ORM) runs in a worker thread; generation is awaited.
+        """
+        start_time = time.time()
+        prepared = await sync_to_async(self.prepare_query)(query, session_id, filters)
+
+        scope = self._cache_scope(query, prepared, provider)
+        started = time.perf_counter()
+        cached = await sync_to_async(self._cached_response)(query, scope)
+        prepared["timings"]["cache"] = _elapsed_ms(started)
+        if cached is not None:
+            yield {"type": "token", "text": cached}
+            yield {"type": "done", "result": self._result(prepared, cached, True, start_time, cached=True)}
+            return
+
+        parts = []
+        timings = prepared["timings"]
+        started = time.perf_counter()
+        try:
+            async for text in ai_service.stream_response(
+                query, prepared["context"], prepared["history"], provider=provider
+            ):
+                if not parts:
+                    timings["first_token"] = _elapsed_ms(started)
+                parts.append(text)
+                yield {"type": "token", "text": text}
+            timings["generate"] = _elapsed_ms(started)
+            success = True
+        except Exception as e:
+            logger.error("AI generation failed: %s", e, exc_info=True)
+            timings["generate"] = _elapsed_ms(started)
+            if not parts:
+                parts.append("Sorry, I couldn’t generate a response this time.")
+                yield {"type": "token", "text": parts[0]}
+            success = False
+
+        if success:  # an interrupted stream raises, so a partial answer is never cached
+            await sync_to_async(self._cache_response)(query, scope, "".join(parts).strip())
+        yield {"type": "done", "result": self._result(prepared, "".join(parts).strip(), success, start_time)}
+
+
+# Retrieval runs here while the request thread reads history from the DB
+_retrieval_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, "RAG_RETRIEVAL_WORKERS", 8), thread_name_prefix="rag-retrieval"
+)
+
+# Shared by all service instances (and exposed for stats / clearing)
+default_response_cache = response_cache_from_settings()
+default_reranker = reranker_from_settings()
 
 # Singleton instance for reuse
 rag_service = AdvancedRAGService()
@@ -0,0 +1,34 @@
+"""Shared helpers for vector store tests (no model download needed)."""
+import hashlib
+import numpy as np
+from chat import vector_store
+from chat.embedding_cache import EmbeddingCache
+from chat.vector_store import VectorStore
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for SentenceTransformer (no model download)."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True):
+        self.calls += 1
+        vecs = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim)
+            vecs.append(vec / np.linalg.norm(vec))
+        return np.array(vecs, dtype="float32")
+
+
+def make_store(tmp_path, monkeypatch, embedder=None, **kwargs):
+    embedder = embedder or FakeEmbedder()
+    monkeypatch.setattr(vector_store, "SentenceTransformer", lambda model_name: embedder)
+    return VectorStore(
+        index_path=str(tmp_path / "faiss.index"),
+        docstore_path=str(tmp_path / "docstore.sqlite3"),
+        embedding_cache=EmbeddingCache(str(tmp_path / "embedding_cache"), "all-MiniLM-L6-v2", 384),
+        **kwargs,
+    )
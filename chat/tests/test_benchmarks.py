@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import sqlite3
+import subprocess
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from chat.benchmarks import (
+    SyntheticEmbedder, benchmark_chat, benchmark_index, exact_neighbours, synthetic_corpus, synthetic_queries,
+)
+from chat.tests.helpers import make_store
+
+
+def test_synthetic_data_is_reproducible():
+    embedder = SyntheticEmbedder(dim=32)
+    assert synthetic_corpus(20, seed=3) == synthetic_corpus(20, seed=3)
+    first = embedder.encode(["topic1 a", "topic1 b"])
+    assert (embedder.encode(["topic1 a", "topic1 b"]) == first).all()  # cached centroids give the same vectors
+    same_topic, other_topic = embedder.encode(["topic1 a", "topic1 b"]), embedder.encode(["topic2 a"])
+    assert same_topic[0] @ same_topic[1] > same_topic[0] @ other_topic[0]
+
+
+@pytest.mark.django_db
+def test_index_benchmark_reports_latency_and_recall(tmp_path):
+    embedder = SyntheticEmbedder()
+    corpus = synthetic_corpus(300, topics=10)
+    queries = synthetic_queries(corpus, 20)
+    exact = exact_neighbours(corpus, queries, embedder, top_k=5)
+
+    flat = benchmark_index(corpus, "flat", queries, embedder, 5, exact, str(tmp_path))
+    assert flat["built_index_type"] == "flat"
+    assert flat["recall_at_k"] == 1.0
+    assert flat["search_ms"]["p99"] >= flat["search_ms"]["p50"] > 0
+    assert flat["ingest_chunks_per_second"] > 0 and flat["cold_start_seconds"] > 0
+
+    hnsw = benchmark_index(corpus, "hnsw", queries, embedder, 5, exact, str(tmp_path))
+    assert hnsw["built_index_type"] == "hnsw"
+    assert 0 < hnsw["recall_at_k"] <= 1.0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_chat_benchmark_sends_requests_through_the_view(tmp_path, monkeypatch):
+    from chat import services
+    from chat.ai_services import AIService
+    from chat.llm_providers import StubProvider
+    from users.models import User
+
+    store = make_store(tmp_path, monkeypatch, read_only=False)
+    store.add_documents([{"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"}])
+    monkeypatch.setattr(services, "vector_db", store)
+    monkeypatch.setattr(services, "ai_service", AIService([StubProvider(0, tokens_per_second=0)]))
+    user = User.objects.create_user(username="bench", email="bench@example.com")
+
+    result = benchmark_chat(user, ["Ships in 5 days"], requests=3, concurrency=1)
+    assert result["errors"] == 0
+    assert result["requests_per_second"] > 0
+
+
+def test_command_runs_the_chat_benchmark_on_a_throwaway_database(tmp_path):
+    """The configured database (here unmigrated) is never written."""
+    database = tmp_path / "configured.sqlite3"
+    output = tmp_path / "results.json"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", DJANGO_SETTINGS_MODULE="core.settings")
+    subprocess.run(
+        [sys.executable, "manage.py", "benchmark_rag", "--sizes", "100", "--index-types", "flat", "--queries", "3",
+         "--chat-requests", "4", "--chat-concurrency", "2", "--llm-latency-ms", "0", "--output", str(output)],
+        cwd=settings.BASE_DIR, env=env, check=True, capture_output=True,
+    )
+
+    chat = json.loads(output.read_text())["chat"]
+    assert chat["requests"] == 4 and chat["errors"] == 0
+    assert sqlite3.connect(database).execute("SELECT count(*) FROM sqlite_master").fetchone() == (0,)
+
+
+@pytest.mark.django_db
+def test_command_writes_json_results(tmp_path):
+    output = tmp_path / "results.json"
+    call_command("benchmark_rag", sizes="100", index_types="flat", queries=5, skip_chat=True, output=str(output))
+
+    results = json.loads(output.read_text())
+    assert results["parameters"]["sizes"] == [100]
+    assert results["index"][0]["recall_at_k"] == 1.0
+    assert results["chat"] is None
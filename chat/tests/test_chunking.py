@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from chat import ingestion
+from chat.chunking import FixedSizeChunker, StructuredChunker, estimate_tokens, split_sentences
+from chat.tests.helpers import make_store
+
+POLICY = """Intro line before any heading.
+
+# Shipping
+Orders ship within 5 business days. Express shipping takes 2 days! Tracking links are emailed.
+
+## Returns
+Items can be returned within 30 days. Refunds are issued to the original payment method.
+"""
+
+
+def test_sections_follow_headings_and_carry_them():
+    chunks = StructuredChunker(max_tokens=200).split(POLICY)
+
+    assert [c.section for c in chunks] == [None, "Shipping", "Returns"]
+    assert chunks[1].content.startswith("Shipping\nOrders ship")
+    assert "Refunds" not in chunks[1].content
+
+
+def test_chunks_keep_whole_sentences_within_budget_with_overlap():
+    sentences = [f"Sentence number {i} talks about shipping times." for i in range(40)]
+    chunker = StructuredChunker(max_tokens=40, overlap_tokens=10)
+    chunks = chunker.split(" ".join(sentences))
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk.content) <= 40
+        assert chunk.content.endswith("times.")
+    # The last sentence of a chunk opens the next one
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.content.startswith(prev.content.rsplit(". ", 1)[-1])
+
+
+def test_oversized_sentence_is_split_into_word_windows():
+    chunks = StructuredChunker(max_tokens=20, overlap_tokens=0).split(" ".join(["word"] * 50))
+    assert [estimate_tokens(c.content) for c in chunks] == [20, 20, 10]
+
+
+def test_fixed_chunker_matches_legacy_slicing():
+    assert [c.content for c in FixedSizeChunker(4).split("abcdefghij")] == ["abcd", "efgh", "ij"]
+
+
+def test_bulk_ingest_shares_chunking_and_drops_stale_chunks(tmp_path, monkeypatch, settings):
+    settings.CHUNKER = "fixed"
+    settings.CHUNK_SIZE = 10
+    store = make_store(tmp_path, monkeypatch)
+    monkeypatch.setattr(ingestion, "vector_db", store)
+
+    doc = SimpleNamespace(id=7, title="Policy", content="x" * 30, doc_type=None, category=None, tags=[])
+    assert ingestion.ingest_documents_bulk([doc])
+    assert sorted(store.chunk_ids_for_document(7)) == ["7_1", "7_2", "7_3"]
+
+    doc.content = "y" * 15
+    assert ingestion.ingest_documents_bulk([doc])
+    assert sorted(store.chunk_ids_for_document(7)) == ["7_1", "7_2"]
+    assert ingestion.document_chunks(doc) == [store.docstore.get("7_1"), store.docstore.get("7_2")]
+
+
+def test_sentences_keep_closing_quotes_and_brackets():
+    assert split_sentences('He said "ship it." Then (in May.) Done?\n\nNext') == [
+        'He said "ship it."', "Then (in May.)", "Done?", "Next",
+    ]
@@ -0,0 +1,74 @@
+from chat.context_packer import ContextPacker, truncate_tokens
+from chat.services import AdvancedRAGService
+
+
+def result(doc_id, content, document_id=1, section=None):
+    return {"document": {"id": doc_id, "document_id": document_id, "title": "T", "section": section,
+                         "content": content}, "score": 1.0}
+
+
+def test_truncate_tokens_cuts_at_word_boundary():
+    assert truncate_tokens("one two three", 10) == "one two three"
+    assert truncate_tokens("one two three four", 3) == "one two …"
+
+
+def test_overlapping_chunks_of_same_document_are_deduplicated():
+    packer = ContextPacker()
+    docs, usage = packer.pack_documents([
+        result("1_1", "Intro\nFirst fact. Shared sentence.", section="Intro"),
+        result("1_2", "Intro\nShared sentence. New fact.", section="Intro"),
+        result("1_3", "Shared sentence."),
+        result("2_1", "Shared sentence.", document_id=2),  # other document: kept
+    ])
+    assert [d["document"]["content"] for d in docs] == [
+        "Intro\nFirst fact. Shared sentence.", "Intro\nNew fact.", "Shared sentence.",
+    ]
+    assert usage["duplicates_removed"] == 1
+
+
+def test_deduplication_splits_sentences_like_the_chunker():
+    docs, usage = ContextPacker().pack_documents([
+        result("1_1", 'He said "ship it." Then it shipped (in May.)'),
+        result("1_2", 'Then it shipped (in May.) Returns "rose."'),
+    ])
+    assert docs[1]["document"]["content"] == 'Returns "rose."'
+
+
+def test_lowest_ranked_chunks_are_trimmed_then_dropped():
+    packer = ContextPacker(context_tokens=140)
+    words = " ".join(f"w{i}" for i in range(60))
+    docs, usage = packer.pack_documents([
+        result("1_1", words, document_id=1),
+        result("2_1", words, document_id=2),
+        result("3_1", words, document_id=3),
+    ])
+    assert [d["document"]["id"] for d in docs] == ["1_1", "2_1"]
+    assert docs[1]["document"]["content"].endswith("…")
+    assert usage == {"documents_retrieved": 3, "documents_used": 2, "documents_trimmed": 1,
+                     "duplicates_removed": 0}
+
+
+def test_history_keeps_recent_turns_and_truncates_older_ones():
+    packer = ContextPacker(history_tokens=40, turn_tokens=5, recent_turns=1)
+    long = " ".join(["word"] * 20)
+    history = [
+        {"role": "user", "content": long},
+        {"role": "assistant", "content": long},
+        {"role": "user", "content": "Current question?"},
+    ]
+    packed, used = packer.pack_history("Current question?", history)
+    assert [m["content"] for m in packed] == ["word word word word …", long]
+    assert used == 25
+
+
+def test_prepare_query_reports_token_usage(monkeypatch):
+    service = AdvancedRAGService(context_packer=ContextPacker(context_tokens=200))
+    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [
+        result("1_1", "Orders ship in 5 days."),
+    ])
+    prepared = service.prepare_query("When will my order ship?")
+
+    usage = prepared["token_usage"]
+    assert usage["documents_used"] == 1
+    assert usage["context_tokens"] > 0
+    assert usage["total_tokens"] == usage["context_tokens"] + usage["history_tokens"] + usage["query_tokens"]
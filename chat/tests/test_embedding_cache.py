@@ -0,0 +1,58 @@
+import numpy as np
+from chat.embedding_cache import EmbeddingCache
+
+
+def test_cache_roundtrip_and_persistence(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model-a", dim=4)
+    vecs = np.eye(4, dtype="float32")[:2]
+    cache.put_many(["alpha", "beta"], vecs)
+
+    reopened = EmbeddingCache(str(tmp_path), "model-a", dim=4)
+    hits, missing = reopened.get_many(["beta", "gamma", "alpha"])
+    assert missing == [1]
+    np.testing.assert_array_equal(hits[0], vecs[1])
+    np.testing.assert_array_equal(hits[2], vecs[0])
+
+
+def test_cache_is_keyed_by_model(tmp_path):
+    EmbeddingCache(str(tmp_path), "model-a", dim=4).put_many(["alpha"], np.ones((1, 4), dtype="float32"))
+    _, missing = EmbeddingCache(str(tmp_path), "model-b", dim=4).get_many(["alpha"])
+    assert missing == [0]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model-a", dim=2, max_entries=2)
+    cache.put_many(["a", "b"], np.ones((2, 2), dtype="float32"))
+    cache.get_many(["a"])  # "b" is now least recently used
+    cache.put_many(["c"], np.zeros((1, 2), dtype="float32"))
+
+    hits, missing = cache.get_many(["a", "b", "c"])
+    assert missing == [1]
+    assert len(cache) == 2
+
+
+def test_recency_is_shared_between_cache_instances(tmp_path):
+    writer = EmbeddingCache(str(tmp_path), "model-a", dim=2, max_entries=2)
+    reader = EmbeddingCache(str(tmp_path), "model-a", dim=2, max_entries=2)
+    writer.put_many(["a", "b"], np.ones((2, 2), dtype="float32"))
+    reader.get_many(["a"])  # another process used "a": "b" is least recently used everywhere
+    writer.put_many(["c"], np.zeros((1, 2), dtype="float32"))
+
+    _, missing = EmbeddingCache(str(tmp_path), "model-a", dim=2, max_entries=2).get_many(["a", "b", "c"])
+    assert missing == [1]
+
+
+def test_legacy_json_index_is_imported(tmp_path):
+    import json
+
+    cache = EmbeddingCache(str(tmp_path), "model-a", dim=2)
+    cache.put_many(["a"], np.full((1, 2), 3, dtype="float32"))
+    (tmp_path / "index.json").write_text(json.dumps(
+        {"dim": 2, "capacity": 1024, "tick": 1, "rows": {cache.key("b"): [0, 1]}}
+    ))
+    (tmp_path / "index.sqlite3").unlink()
+
+    hits, missing = EmbeddingCache(str(tmp_path), "model-a", dim=2).get_many(["a", "b"])
+    assert missing == [0]
+    np.testing.assert_array_equal(hits[1], [3, 3])
+    assert not (tmp_path / "index.json").exists()
@@ -0,0 +1,56 @@
+from chat.docstore import DocStore, fts_query
+from chat.tests.helpers import make_store
+
+DOCS = [
+    {"id": "doc_1", "title": "Mugs", "content": "The SKU-4471 mug is blue and holds 350 ml."},
+    {"id": "doc_2", "title": "Plates", "content": "Dinner plates come in packs of four."},
+    {"id": "doc_3", "title": "Returns", "content": "Items can be returned within 30 days."},
+    {"id": "doc_4", "title": "Shipping", "content": "Orders ship within 5 business days."},
+]
+
+
+def test_fts_query_quotes_terms_and_drops_syntax():
+    assert fts_query('SKU-4471 "mug"* OR NEAR(') == '"sku-4471" OR "mug" OR "or" OR "near"'
+    assert fts_query("?!") == ""
+
+
+def test_hybrid_search_ranks_exact_token_match_first(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+
+    assert store.lexical_search("sku-4471", top_k=1)[0]["document"]["id"] == "doc_1"
+    results = store.hybrid_search("Do you have SKU-4471?", top_k=2)
+    assert results[0]["document"]["id"] == "doc_1"
+    assert results[0]["score"] > results[1]["score"]
+
+
+def test_lexical_index_follows_upserts_and_deletes(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+
+    store.upsert_documents([{"id": "doc_1", "title": "Mugs", "content": "The SKU-9000 mug is red."}])
+    assert store.lexical_search("SKU-4471") == []
+    assert store.lexical_search("SKU-9000")[0]["document"]["id"] == "doc_1"
+
+    store.delete_documents(["doc_1"])
+    assert store.lexical_search("SKU-9000") == []
+
+
+def test_existing_docstore_is_backfilled_once(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+    conn = store.docstore._conn()
+    conn.execute("DELETE FROM docs_fts")
+    conn.execute("DELETE FROM meta WHERE key = 'fts_synced'")
+
+    reopened = DocStore(store.docstore_path)
+    assert [faiss_id for faiss_id, _ in reopened.lexical_search("returned")] == [store.faiss_id("doc_3")]
+
+
+def test_hybrid_search_reports_stage_timings(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+
+    timings = {}
+    store.hybrid_search("Do you have SKU-4471?", top_k=2, timings=timings)
+    assert set(timings) == {"embed", "vector_search", "lexical_search"}
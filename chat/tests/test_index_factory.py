@@ -0,0 +1,79 @@
+import pytest
+from chat import vector_store
+from chat.index_factory import index_type_of
+from chat.tests.helpers import FakeEmbedder, make_store
+
+
+def corpus(n):
+    return [{"id": f"doc_{i}", "title": f"Doc {i}", "content": f"chunk number {i}"} for i in range(n)]
+
+
+@pytest.fixture
+def ann_settings(settings):
+    settings.VECTOR_INDEX_TRAIN_THRESHOLD = 100
+    settings.VECTOR_INDEX_PQ_NBITS = 4
+    settings.VECTOR_INDEX_NPROBE = 64
+    return settings
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf_flat", "ivf_pq"])
+def test_ann_index_built_past_threshold(tmp_path, monkeypatch, ann_settings, index_type):
+    ann_settings.VECTOR_INDEX_TYPE = index_type
+    store = make_store(tmp_path, monkeypatch)
+
+    store.add_documents(corpus(50))
+    assert index_type_of(store.index) == "flat"
+
+    store.add_documents(corpus(300))  # crosses the threshold -> trained ANN index
+    assert index_type_of(store.index) == index_type
+    assert 0 < store.build_report["recall_at_k"] <= 1
+    assert store.search("chunk number 42", top_k=1)[0]["document"]["id"] == "doc_42"
+
+    store.upsert_documents([{"id": "doc_42", "title": "Doc 42", "content": "rewritten chunk"}])
+    store.delete_documents(["doc_7"])
+    assert store.count() == store._live_count() == 299
+    assert store.search("rewritten chunk", top_k=1)[0]["document"]["id"] == "doc_42"
+
+    embedder = FakeEmbedder()
+    warm = make_store(tmp_path, monkeypatch, embedder)
+    assert index_type_of(warm.index) == index_type
+    assert embedder.calls == 0
+
+
+def test_hnsw_updates_tombstone_instead_of_rebuilding(tmp_path, monkeypatch, ann_settings):
+    ann_settings.VECTOR_INDEX_TYPE = "hnsw"
+    ann_settings.VECTOR_INDEX_COMPACT_FRACTION = 0.02
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(corpus(300))
+    measured = []
+    monkeypatch.setattr(vector_store, "measure_recall", lambda *args, **kwargs: measured.append(1) or 0.5)
+    calls = store.embedder.calls
+
+    store.upsert_documents([{"id": "doc_42", "title": "Doc 42", "content": "rewritten chunk"}])
+    store.delete_documents(["doc_7"])
+    assert store.embedder.calls == calls + 1  # only the rewritten chunk was embedded
+    assert store.index.ntotal == 301 and store._live_count() == 299
+    assert store.search("chunk number 42", top_k=1)[0]["document"]["id"] != "doc_42"
+    assert store.search("chunk number 7", top_k=1)[0]["document"]["id"] != "doc_7"
+    assert [r["document"]["id"] for r in store.search("rewritten chunk", top_k=1)] == ["doc_42"]
+
+    # Tombstones are derived again when the index is loaded
+    warm = make_store(tmp_path, monkeypatch)
+    assert warm._live_count() == 299
+    assert warm.search("chunk number 42", top_k=1)[0]["document"]["id"] != "doc_42"
+
+    # Past VECTOR_INDEX_COMPACT_FRACTION dead vectors the graph is compacted
+    store.delete_documents([f"doc_{i}" for i in range(100, 110)])
+    assert store.index.ntotal == store._live_count() == 289
+    assert [r["document"]["id"] for r in store.search("chunk number 200", top_k=1)] == ["doc_200"]
+    assert measured == []
+
+
+def test_changing_index_type_triggers_rebuild(tmp_path, monkeypatch, ann_settings):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(corpus(150))
+    assert index_type_of(store.index) == "flat"
+
+    ann_settings.VECTOR_INDEX_TYPE = "hnsw"
+    rebuilt = make_store(tmp_path, monkeypatch)
+    assert index_type_of(rebuilt.index) == "hnsw"
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import faiss
+from chat.tests.helpers import FakeEmbedder, make_store
+
+
+def test_warm_start_reuses_persisted_index(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([
+        {"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"},
+        {"id": "doc_2", "title": "Refund", "content": "Refund in 10 days"},
+    ])
+
+    embedder = FakeEmbedder()
+    warm = make_store(tmp_path, monkeypatch, embedder)
+    assert warm.index.ntotal == 2
+    assert embedder.calls == 0
+
+
+def test_stale_manifest_triggers_rebuild(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([{"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"}])
+
+    # Docstore edited behind the index's back
+    store.docstore.put_many([
+        (store.faiss_id("doc_1"), {"id": "doc_1", "title": "Shipping", "content": "Ships in 2 days"}),
+    ])
+
+    embedder = FakeEmbedder()
+    cold = make_store(tmp_path, monkeypatch, embedder)
+    assert cold.index.ntotal == 1
+    assert embedder.calls == 1
+
+
+def test_rebuild_encodes_only_uncached_texts(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([{"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"}])
+    store.upsert_documents([{"id": "doc_2", "title": "Refund", "content": "Refund in 10 days"}])
+
+    embedder = store.embedder
+    before = embedder.calls
+    store._rebuild_index()
+    assert embedder.calls == before
+    assert store.index.ntotal == 2
+
+
+def test_upsert_reembeds_only_changed_chunks(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([
+        {"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"},
+        {"id": "doc_2", "title": "Refund", "content": "Refund in 10 days"},
+    ])
+
+    encoded = []
+    original = store._encode
+    monkeypatch.setattr(store, "_encode", lambda texts: encoded.extend(texts) or original(texts))
+    store.upsert_documents([
+        {"id": "doc_1", "title": "Shipping (updated)", "content": "Ships in 5 days"},
+        {"id": "doc_2", "title": "Refund", "content": "Refund in 14 days"},
+    ])
+
+    assert encoded == ["Refund in 14 days"]
+    assert store.index.ntotal == 2
+    assert store.docstore.get("doc_1")["title"] == "Shipping (updated)"
+    assert store.search("Refund in 14 days", top_k=1)[0]["document"]["id"] == "doc_2"
+
+
+def test_index_is_saved_once_per_batch_and_only_when_changed(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([
+        {"id": "7_1", "document_id": 7, "title": "Shipping", "content": "Ships in 5 days"},
+        {"id": "7_2", "document_id": 7, "title": "Shipping", "content": "Ships from Berlin"},
+    ])
+    saves = []
+    original = store._save_index
+    monkeypatch.setattr(store, "_save_index", lambda: saves.append(1) or original())
+
+    # Re-ingest of document 7: one chunk rewritten, one gone -> a single save
+    assert store.sync_documents(
+        [{"id": "7_1", "document_id": 7, "title": "Shipping", "content": "Ships in 3 days"}], ["7_2"],
+    ) is True
+    assert len(saves) == 1
+    assert store.index.ntotal == 1
+
+    # Metadata-only update: the index is unchanged, nothing to save
+    store.upsert_documents([{"id": "7_1", "document_id": 7, "title": "Shipping (EU)", "content": "Ships in 3 days"}])
+    assert len(saves) == 1
+
+    warm = make_store(tmp_path, monkeypatch)
+    assert warm.docstore.get("7_1")["title"] == "Shipping (EU)"
+    assert warm.index.ntotal == 1
+
+
+def test_writable_stores_sharing_files_stay_in_sync(tmp_path, monkeypatch):
+    # Two processes' stores (e.g. ingestion workers in two web processes)
+    first = make_store(tmp_path, monkeypatch)
+    second = make_store(tmp_path, monkeypatch)
+
+    first.add_documents([{"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"}])
+    assert [r["document"]["id"] for r in second.search("Ships in 5 days", top_k=1)] == ["doc_1"]
+
+    # A write catches up first, so the index it publishes keeps the other store's vectors
+    first.docstore.put_many([  # written by a process that stopped before saving its index
+        (first.faiss_id("doc_2"), {"id": "doc_2", "title": "Refund", "content": "Refund in 10 days"}),
+    ])
+    second.add_documents([{"id": "doc_3", "title": "Returns", "content": "Returns within 30 days"}])
+    assert second.index.ntotal == 3
+    assert first.search("Refund in 10 days", top_k=1)[0]["document"]["id"] == "doc_2"
+    assert first.index.ntotal == 3
+
+
+def test_delete_documents_removes_from_search(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([
+        {"id": "7_1", "document_id": 7, "title": "Shipping", "content": "Ships in 5 days"},
+        {"id": "8_1", "document_id": 8, "title": "Refund", "content": "Refund in 10 days"},
+    ])
+
+    assert store.delete_documents(store.chunk_ids_for_document(7)) is True
+    assert store.index.ntotal == 1
+    assert [r["document"]["id"] for r in store.search("Ships in 5 days", top_k=2)] == ["8_1"]
+
+    reloaded = make_store(tmp_path, monkeypatch)
+    assert reloaded.docstore.count() == 1
+    assert reloaded.document_exists("8_1")
+    assert reloaded.index.ntotal == 1
+
+
+def test_legacy_json_docstore_and_positional_index_are_migrated(tmp_path, monkeypatch):
+    docs = {
+        "3_1": {"id": "3_1", "title": "Shipping", "content": "Ships in 5 days"},
+        "3_2": {"id": "3_2", "title": "Shipping", "content": "Free over $50"},
+    }
+    order = ["3_1", "3_2"]
+    (tmp_path / "docstore.json").write_text(json.dumps({"order": order, "docs": docs}))
+
+    # Legacy positional (IndexFlatL2) index and manifest, as written before the SQLite docstore
+    flat = faiss.IndexFlatL2(384)
+    flat.add(FakeEmbedder().encode([docs[d]["content"] for d in order]))
+    faiss.write_index(flat, str(tmp_path / "faiss.index"))
+    checksum = hashlib.sha256()
+    for doc_id in order:
+        checksum.update(doc_id.encode() + b"\0" + docs[doc_id]["content"].encode() + b"\0")
+    (tmp_path / "faiss.index.manifest.json").write_text(json.dumps({
+        "count": 2, "model_name": "all-MiniLM-L6-v2", "dim": 384, "checksum": checksum.hexdigest(),
+    }))
+
+    embedder = FakeEmbedder()
+    migrated = make_store(tmp_path, monkeypatch, embedder)
+    assert embedder.calls == 0
+    assert isinstance(migrated.index, faiss.IndexIDMap2)
+    assert migrated.chunk_ids_for_document(3) == sorted(order, key=migrated.faiss_id)
+    assert migrated.search("Free over $50", top_k=1)[0]["document"]["id"] == "3_2"
+
+
+def test_repeated_queries_are_embedded_once_and_writes_change_version(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([{"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"}])
+    version = store.version()
+
+    calls = store.embedder.calls
+    store.search("shipping?")
+    store.search("shipping?")
+    assert store.embedder.calls == calls + 1
+    assert store.cached_query_vector("shipping?") is not None
+
+    store.upsert_documents([{"id": "doc_1", "title": "Shipping (updated)", "content": "Ships in 5 days"}])
+    assert store.version() != version
+
+
+def test_search_batch_matches_single_searches(tmp_path, monkeypatch):
+    embedder = FakeEmbedder()
+    store = make_store(tmp_path, monkeypatch, embedder)
+    store.add_documents([
+        {"id": f"doc_{i}", "title": f"Doc {i}", "content": f"chunk number {i}"} for i in range(20)
+    ])
+
+    queries = ["chunk number 3", "", "chunk number 17", "chunk number 3"]
+    calls = embedder.calls
+    batch = store.search_batch(queries, top_k=2)
+    assert embedder.calls == calls + 1  # one encoder call, repeated queries encoded once
+
+    assert batch[1] == []
+    for query, results in zip(queries, batch):
+        if query:
+            assert results == store.search(query, top_k=2)
+    assert embedder.calls == calls + 1  # single searches reuse the memoized embeddings
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import pytest
+from chat.ai_services import AIService, ai_service_from_settings
+from chat.llm_providers import GeminiProvider, OpenAICompatibleProvider, ProviderError, StubProvider
+from chat.resilience import is_retryable
+
+MESSAGES = [{"role": "assistant", "content": "Hi!"}, {"role": "user", "content": "How long does shipping take?"}]
+
+
+def test_stub_is_deterministic_and_streams_at_the_token_rate():
+    stub = StubProvider(latency_ms=0, tokens_per_second=0, answer_tokens=4)
+    answer = stub.generate(MESSAGES, timeout=1)
+    assert answer == stub.generate(MESSAGES, timeout=1) == asyncio.run(stub.agenerate(MESSAGES, timeout=1))
+    assert answer.endswith("How long does")
+
+    async def collect():
+        return [token async for token in StubProvider(latency_ms=0, tokens_per_second=1000,
+                                                      answer_tokens=4).stream(MESSAGES, timeout=1)]
+
+    tokens = asyncio.run(collect())
+    assert len(tokens) == 4 and "".join(tokens) == answer
+
+
+def test_gemini_provider_maps_roles():
+    class FakeModel:
+        def generate_content(self, contents, generation_config=None, request_options=None):
+            self.contents, self.timeout = contents, request_options["timeout"]
+            return type("Response", (), {"text": "Ships in 5 days."})()
+
+    model = FakeModel()
+    assert GeminiProvider(model=model).generate(MESSAGES, timeout=3) == "Ships in 5 days."
+    assert [c["role"] for c in model.contents] == ["model", "user"] and model.timeout == 3
+    assert not GeminiProvider(api_key="").configured
+
+
+def test_openai_compatible_provider_parses_responses_and_streams(monkeypatch):
+    class FakeResponse:
+        def __init__(self, status_code=200, body=None, lines=()):
+            self.status_code, self.body, self.lines, self.text = status_code, body, lines, "error"
+
+        def json(self):
+            return self.body
+
+        def iter_lines(self, decode_unicode=True):
+            return iter(self.lines)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    class FakeSession:
+        def __init__(self, response):
+            self.response = response
+
+        def post(self, url, json=None, timeout=None, stream=False):
+            self.url, self.payload = url, json
+            return self.response
+
+    provider = OpenAICompatibleProvider(api_key="key", base_url="http://llm.local/v1/")
+    session = FakeSession(FakeResponse(body={"choices": [{"message": {"content": "Ships in 5 days."}}]}))
+    monkeypatch.setattr(provider, "_session", lambda: session)
+    assert provider.generate(MESSAGES, timeout=2) == "Ships in 5 days."
+    assert session.url == "http://llm.local/v1/chat/completions" and session.payload["messages"] == MESSAGES
+
+    events = [f"data: {json.dumps({'choices': [{'delta': {'content': text}}]})}" for text in ("Ships ", "soon")]
+    session.response = FakeResponse(lines=["", *events, "data: [DONE]"])
+
+    async def collect():
+        return [text async for text in provider.stream(MESSAGES, timeout=2)]
+
+    assert asyncio.run(collect()) == ["Ships ", "soon"]
+
+    session.response = FakeResponse(status_code=503)
+    with pytest.raises(ProviderError) as error:
+        provider.generate(MESSAGES, timeout=2)
+    assert is_retryable(error.value)
+
+
+def test_requests_can_be_routed_to_another_provider(settings):
+    settings.LLM_PROVIDER, settings.LLM_PROVIDERS = "stub", ["openai", "stub"]
+    settings.STUB_LLM_LATENCY_MS = 0
+    ai = ai_service_from_settings()
+    assert list(ai.providers) == ["stub", "openai"]
+    assert ai.prompt_version().startswith("stub:")
+    assert ai.generate_response("shipping?").startswith("[stub")
+
+    ai = AIService([StubProvider(latency_ms=0, tokens_per_second=0), GeminiProvider(api_key="")])
+    assert ai.generate_response("shipping?", provider="gemini") == "AI service is not configured."
+    assert ai.prompt_version("gemini") != ai.prompt_version() == ai.prompt_version("stub")
+    with pytest.raises(ValueError):
+        ai.generate_response("shipping?", provider="unknown")
@@ -0,0 +1,77 @@
+import pytest
+from chat.docstore import DocStore, normalize_filters
+from chat.tests.helpers import make_store
+
+DOCS = [
+    {"id": "doc_1", "title": "EU shipping", "content": "Orders ship in 5 days.",
+     "category": "Shipping", "doc_type": "faq", "tags": ["eu", "express"]},
+    {"id": "doc_2", "title": "US shipping", "content": "Orders ship in 3 days.",
+     "category": "Shipping", "doc_type": "policy", "tags": ["us"]},
+    {"id": "doc_3", "title": "Returns", "content": "Orders can be returned within 30 days.",
+     "category": "Returns", "doc_type": "faq", "tags": ["eu"]},
+]
+
+
+def ids(results):
+    return sorted(r["document"]["id"] for r in results)
+
+
+def test_normalize_filters():
+    assert normalize_filters({"tags": ["b", "a"], "category": "X", "doc_type": ""}) == (
+        ("category", ("X",)), ("tags", ("a", "b")),
+    )
+    assert normalize_filters(None) == ()
+    with pytest.raises(ValueError):
+        normalize_filters({"author": "me"})
+
+
+def test_filtered_search_only_returns_matching_chunks(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+
+    assert ids(store.search("orders", top_k=10, filters={"category": "Shipping"})) == ["doc_1", "doc_2"]
+    assert ids(store.search("orders", top_k=10, filters={"tags": ["eu", "express"]})) == ["doc_1"]
+    assert ids(store.search("orders", top_k=10, filters={"doc_type": ["faq", "policy"], "tags": ["eu"]})) == [
+        "doc_1", "doc_3",
+    ]
+    assert store.search("orders", top_k=10, filters={"category": "Billing"}) == []
+    assert ids(store.lexical_search("orders", top_k=10, filters={"category": "Returns"})) == ["doc_3"]
+    assert ids(store.hybrid_search("orders", top_k=10, filters={"tags": ["us"]})) == ["doc_2"]
+
+
+def test_filters_follow_updates_and_deletes(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+    assert ids(store.search("orders", top_k=10, filters={"tags": ["us"]})) == ["doc_2"]
+
+    store.upsert_documents([dict(DOCS[0], tags=["us"])])
+    assert ids(store.search("orders", top_k=10, filters={"tags": ["us"]})) == ["doc_1", "doc_2"]
+
+    store.delete_documents(["doc_2"])
+    assert ids(store.search("orders", top_k=10, filters={"tags": ["us"]})) == ["doc_1"]
+
+
+def test_existing_docstore_facets_are_backfilled(tmp_path, monkeypatch):
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents(DOCS)
+    conn = store.docstore._conn()
+    conn.execute("DELETE FROM facets")
+    conn.execute("DELETE FROM meta WHERE key = 'facets_synced'")
+
+    reopened = DocStore(store.docstore_path)
+    assert reopened.facet_ids(normalize_filters({"category": "Returns"})) == [store.faiss_id("doc_3")]
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf_flat"])
+def test_filters_apply_to_ann_indexes(tmp_path, monkeypatch, settings, index_type):
+    settings.VECTOR_INDEX_TYPE = index_type
+    settings.VECTOR_INDEX_TRAIN_THRESHOLD = 100
+    store = make_store(tmp_path, monkeypatch)
+    store.add_documents([
+        {"id": f"doc_{i}", "title": f"Doc {i}", "content": f"chunk number {i}", "category": f"c{i % 10}"}
+        for i in range(200)
+    ])
+
+    results = store.search("chunk number 42", top_k=5, filters={"category": "c3"})
+    assert len(results) == 5
+    assert {r["document"]["category"] for r in results} == {"c3"}
@@ -0,0 +1,54 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core import metrics
+from users.models import User
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("test_seconds", "Test durations.", ("stage",), buckets=(0.1, 1.0))
+    hist.observe(0.05, stage="a")
+    hist.observe(0.5, stage="a")
+    hist.observe(5, stage="a")
+
+    assert hist.render() == [
+        "# HELP test_seconds Test durations.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1.0"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_seconds_sum{stage="a"} 5.55',
+        'test_seconds_count{stage="a"} 3',
+    ]
+    with pytest.raises(ValueError):
+        hist.observe(1.0)  # missing label
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_reports_chat_and_retrieval_stages(monkeypatch, settings):
+    from chat import views
+    from chat.docstore import LOOKUP_SECONDS
+
+    monkeypatch.setattr(views.rag_service, "process_query",
+                        lambda *args, **kwargs: {"response": "Ships in 5 days.", "success": True})
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(username="urmi", email="urmi@example.com",
+                                                       password="pass12345"))
+    before = views.CHAT_REQUEST_SECONDS.count(view="send", status=200)
+    assert client.post(reverse("chat-send"), {"message": "Shipping?"}, format="json").status_code == 200
+    assert views.CHAT_REQUEST_SECONDS.count(view="send", status=200) == before + 1
+    LOOKUP_SECONDS.observe(0.001)
+
+    assert client.get("/metrics").status_code == 403  # no token outside DEBUG
+    settings.DEBUG = True
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.content.decode()
+    for line in ("# TYPE chat_request_seconds histogram", "# TYPE rag_docstore_lookup_seconds histogram",
+                 "# TYPE llm_retries_total counter", "# TYPE rag_index_vectors gauge", "rag_docstore_bytes "):
+        assert line in body
+
+    settings.METRICS_TOKEN = "secret"
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code == 200
@@ -0,0 +1,63 @@
+import threading
+from chat.reranker import CrossEncoderReranker
+from chat.services import AdvancedRAGService
+
+RESULTS = [
+    {"document": {"id": f"doc_{i}", "title": f"Doc {i}", "content": text}, "score": 1.0 - i / 10}
+    for i, text in enumerate(["plates", "mugs", "shipping takes 5 days", "returns"])
+]
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words occur in the passage."""
+
+    def __init__(self, delay=None):
+        self.delay = delay
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls += 1
+        if self.delay is not None:
+            self.delay.wait()
+        return [sum(word in passage for word in query.split()) for query, passage in pairs]
+
+
+def ids(results):
+    return [r["document"]["id"] for r in results]
+
+
+def test_rerank_orders_by_cross_encoder_score_in_one_pass():
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(model=model)
+
+    results = reranker.rerank("how long does shipping take", RESULTS, top_k=2)
+    assert ids(results) == ["doc_2", "doc_0"]  # ties keep retrieval order
+    assert results[0]["rerank_score"] == 2
+    assert model.calls == 1
+
+
+def test_rerank_over_budget_or_busy_keeps_retrieval_order():
+    release = threading.Event()
+    reranker = CrossEncoderReranker(model=FakeCrossEncoder(delay=release), budget_ms=20, max_concurrency=1)
+
+    assert ids(reranker.rerank("shipping", RESULTS, top_k=2)) == ["doc_0", "doc_1"]  # timed out
+    assert ids(reranker.rerank("shipping", RESULTS, top_k=2)) == ["doc_0", "doc_1"]  # slot still busy
+    release.set()
+
+
+def test_service_overfetches_candidates_when_reranking(monkeypatch, settings):
+    from chat import services
+
+    settings.HYBRID_SEARCH_ENABLED = False
+    settings.RERANK_CANDIDATES = 4
+    requested = {}
+
+    def fake_search(query, top_k=3, filters=None, timings=None):
+        requested["top_k"] = top_k
+        return RESULTS[:top_k]
+
+    monkeypatch.setattr(services.vector_db, "search", fake_search)
+    service = AdvancedRAGService(reranker=CrossEncoderReranker(model=FakeCrossEncoder()))
+
+    assert ids(service.retrieve_relevant_documents("shipping", top_k=1)) == ["doc_2"]
+    assert requested["top_k"] == 4
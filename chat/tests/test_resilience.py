@@ -0,0 +1,105 @@
+import asyncio
+from google.api_core import exceptions as api_exceptions
+from chat import ai_services
+from chat.ai_services import ERROR_RESPONSE, LLM_FAILURES, LLM_RETRIES, AIService
+from chat.llm_providers import LLMProvider
+from chat.resilience import Bulkhead, CircuitBreaker, RetryPolicy, is_retryable
+
+
+class FlakyProvider(LLMProvider):
+    """Raises the queued errors in order, then answers."""
+
+    name = "flaky"
+
+    def __init__(self, *errors, breaker=None, bulkhead=None):
+        super().__init__(
+            "flaky-1",
+            breaker=breaker or CircuitBreaker("test", failure_threshold=5, reset_timeout=60),
+            bulkhead=bulkhead or Bulkhead(2),
+        )
+        self.errors = list(errors)
+        self.calls = 0
+        self.timeouts = []
+
+    def _next(self, timeout):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def generate(self, messages, timeout):
+        self._next(timeout)
+        return "Ships in 5 days."
+
+    async def stream(self, messages, timeout):
+        self._next(timeout)
+        yield "Ships in 5 days."
+
+
+def make_service(provider, policy=None):
+    return AIService([provider], policy or RetryPolicy(max_attempts=3, backoff_base=0.01, backoff_max=0.01, deadline=5))
+
+
+def test_only_transient_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(ai_services.time, "sleep", lambda seconds: None)
+    assert is_retryable(api_exceptions.ServiceUnavailable("down")) and is_retryable(TimeoutError())
+    assert not is_retryable(api_exceptions.InvalidArgument("bad")) and not is_retryable(ValueError())
+
+    retries = LLM_RETRIES.value(provider="flaky", method="generate")
+    provider = FlakyProvider(api_exceptions.ServiceUnavailable("down"), api_exceptions.TooManyRequests("slow down"))
+    assert make_service(provider).generate_response("shipping?") == "Ships in 5 days."
+    assert provider.calls == 3 and LLM_RETRIES.value(provider="flaky", method="generate") == retries + 2
+    assert provider.timeouts[0] <= 5
+
+    refused = LLM_FAILURES.value(provider="flaky", method="generate", reason="non_retryable")
+    provider = FlakyProvider(api_exceptions.InvalidArgument("bad request"))
+    assert make_service(provider).generate_response("shipping?") == ERROR_RESPONSE
+    assert provider.calls == 1
+    assert LLM_FAILURES.value(provider="flaky", method="generate", reason="non_retryable") == refused + 1
+
+
+def test_backoff_never_outlives_the_deadline(monkeypatch):
+    slept = []
+    monkeypatch.setattr(ai_services.time, "sleep", slept.append)
+    policy = RetryPolicy(max_attempts=5, backoff_base=10, backoff_max=10, deadline=0.001)
+    provider = FlakyProvider(*[api_exceptions.ServiceUnavailable("down")] * 5)
+
+    assert make_service(provider, policy).generate_response("shipping?") == ERROR_RESPONSE
+    assert provider.calls == 1 and slept == []
+
+
+def test_circuit_opens_after_repeated_failures_and_probes_once(monkeypatch):
+    monkeypatch.setattr(ai_services.time, "sleep", lambda seconds: None)
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    provider = FlakyProvider(*[api_exceptions.ServiceUnavailable("down")] * 2, breaker=breaker)
+    ai = make_service(provider)
+
+    assert ai.generate_response("shipping?") == ERROR_RESPONSE  # attempt 2 opens the circuit, 3 is rejected
+    assert breaker.state == CircuitBreaker.OPEN and provider.calls == 2
+    assert ai.generate_response("shipping?") == ERROR_RESPONSE
+    assert provider.calls == 2  # failed fast
+
+    breaker.reset_timeout = 0
+    assert breaker.allow() and not breaker.allow()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert ai.generate_response("shipping?") == "Ships in 5 days."
+
+
+def test_bulkhead_rejects_when_all_slots_stay_busy():
+    bulkhead = Bulkhead(1)
+    assert bulkhead.acquire()
+    provider = FlakyProvider(bulkhead=bulkhead)
+    ai = make_service(provider, RetryPolicy(queue_wait=0.01))
+    rejected = LLM_FAILURES.value(provider="flaky", method="stream", reason="bulkhead_full")
+
+    async def collect():
+        return [text async for text in ai.stream_response("shipping?")]
+
+    assert asyncio.run(collect()) == [ERROR_RESPONSE]
+    assert provider.calls == 0
+    assert LLM_FAILURES.value(provider="flaky", method="stream", reason="bulkhead_full") == rejected + 1
+
+    bulkhead.release()
+    assert asyncio.run(collect()) == ["Ships in 5 days."]
+    assert bulkhead.in_flight == 0
@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+from chat import services
+from chat.response_cache import ResponseCache
+from chat.services import AdvancedRAGService
+
+DOCS = ["doc_1_0", "doc_2_0"]
+
+
+def _unit(*values):
+    vec = np.array(values, dtype="float32")
+    return vec / np.linalg.norm(vec)
+
+
+def test_exact_hit_ignores_case_whitespace_and_punctuation():
+    cache = ResponseCache()
+    cache.put("What is your shipping policy?", DOCS, "v1", "Ships in 5 days.")
+
+    assert cache.get_exact("  what is your   shipping policy ", DOCS, "v1") == "Ships in 5 days."
+    assert cache.get_exact("What is your shipping policy?", ["doc_1_0"], "v1") is None
+    assert cache.get_exact("What is your shipping policy?", DOCS, "v2") is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_semantic_hit_requires_similarity_and_same_context():
+    cache = ResponseCache(similarity=0.9)
+    cache.put("shipping policy?", DOCS, "v1", "Ships in 5 days.", query_vector=_unit(1, 0, 0))
+
+    assert cache.get_semantic(_unit(1, 0.1, 0), DOCS, "v1") == "Ships in 5 days."
+    assert cache.get_semantic(_unit(0, 1, 0), DOCS, "v1") is None
+    assert cache.get_semantic(_unit(1, 0.1, 0), ["doc_2_0"], "v1") is None
+
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 2)
+
+
+def test_ttl_lru_and_version_invalidation(monkeypatch):
+    cache = ResponseCache(max_entries=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr("chat.response_cache.time.time", lambda: now[0])
+
+    cache.put("a", DOCS, "v1", "A", version="1")
+    cache.put("b", DOCS, "v1", "B", version="1")
+    cache.get_exact("a", DOCS, "v1", version="1")  # "b" is now least recently used
+    cache.put("c", DOCS, "v1", "C", version="1")
+    assert cache.get_exact("b", DOCS, "v1", version="1") is None
+    assert cache.get_exact("a", DOCS, "v1", version="1") == "A"
+
+    now[0] += 11
+    assert cache.get_exact("a", DOCS, "v1", version="1") is None
+
+    cache.put("d", DOCS, "v1", "D", version="1")
+    assert cache.get_exact("d", DOCS, "v1", version="2") is None  # store changed
+
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"], stats["invalidations"]) == (1, 1, 1)
+
+
+@pytest.mark.django_db
+def test_process_query_reuses_cached_answer_on_first_turn_only(monkeypatch):
+    calls = []
+
+    def fake_generate(query, context="", history=None, provider=None):
+        calls.append(query)
+        return "Ships in 5 days."
+
+    service = AdvancedRAGService(preload=False, response_cache=ResponseCache())
+    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [
+        {"document": {"id": "doc_1_0", "title": "Shipping Policy", "content": "Ships in 5 days"}}
+    ])
+    monkeypatch.setattr(services.ai_service, "generate_response", fake_generate)
+
+    first = service.process_query("What is shipping?")
+    second = service.process_query("what is shipping")
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["response"] == "Ships in 5 days."
+    assert len(calls) == 1
+
+    monkeypatch.setattr(service, "get_conversation_history", lambda sid, limit=5: [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello!"},
+        {"role": "user", "content": "What is shipping?"},
+    ])
+    assert service.process_query("What is shipping?", session_id=1)["cached"] is False
+    assert len(calls) == 2
+
+
+@pytest.mark.django_db
+def test_interrupted_stream_is_not_successful_or_cached(monkeypatch):
+    import asyncio
+    from chat.ai_services import AIService
+    from chat.llm_providers import GeminiProvider
+
+    class BrokenStream:
+        def __init__(self):
+            self.chunks = iter(["Ships in "])
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return type("Chunk", (), {"text": next(self.chunks)})()
+            except StopIteration:
+                raise ConnectionError("stream reset")
+
+    class FakeModel:
+        async def generate_content_async(self, messages, generation_config=None, stream=False,
+                                         request_options=None):
+            return BrokenStream()
+
+    ai = AIService([GeminiProvider(model=FakeModel())])
+    monkeypatch.setattr(services, "ai_service", ai)
+    monkeypatch.setattr(ai, "generate_response",
+                        lambda query, context="", history=None, provider=None: "Ships in 5 days.")
+
+    service = AdvancedRAGService(preload=False, response_cache=ResponseCache())
+    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [])
+
+    async def collect():
+        return [event async for event in service.stream_query("shipping?")]
+
+    result = asyncio.run(collect())[-1]["result"]
+    assert (result["response"], result["success"]) == ("Ships in", False)
+
+    again = service.process_query("shipping?")
+    assert (again["response"], again["cached"]) == ("Ships in 5 days.", False)
+
+
+@pytest.mark.django_db
+def test_failed_generation_is_not_cached(monkeypatch):
+    answers = iter([RuntimeError("timeout"), "Ships in 5 days."])
+
+    def fake_generate(query, context="", history=None, provider=None):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    service = AdvancedRAGService(preload=False, response_cache=ResponseCache())
+    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [])
+    monkeypatch.setattr(services.ai_service, "generate_response", fake_generate)
+
+    assert service.process_query("shipping?")["success"] is False
+    second = service.process_query("shipping?")
+    assert (second["response"], second["cached"]) == ("Ships in 5 days.", False)
+    assert service.process_query("shipping?")["cached"] is True
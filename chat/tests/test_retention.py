@@ -0,0 +1,89 @@
+from datetime import timedelta
+import pytest
+from django.utils import timezone
+from users.models import User
+from chat.models import ChatMessage, ChatSession, RetentionRun
+from chat.retention import purge_old_chats
+
+
+def _backdate(model, ids, days):
+    model.objects.filter(id__in=ids).update(created_at=timezone.now() - timedelta(days=days))
+
+
+@pytest.fixture
+def chats(db):
+    """Two old sessions (one with a recent message), one new; 10 old messages, 2 recent."""
+    user = User.objects.create_user(username="ret", email="ret@example.com", password="pass12345")
+    old, mixed, new = (ChatSession.objects.create(user=user, title=t) for t in ("old", "mixed", "new"))
+    old_msgs = [ChatMessage.objects.create(session=old, role="user", content=f"m{i}") for i in range(8)]
+    old_msgs += [ChatMessage.objects.create(session=mixed, role="user", content=f"x{i}") for i in range(2)]
+    for session in (mixed, new):
+        ChatMessage.objects.create(session=session, role="user", content="recent")
+    _backdate(ChatMessage, [m.id for m in old_msgs], 40)
+    _backdate(ChatSession, [old.id, mixed.id], 40)
+    return old, mixed, new
+
+
+def test_purge_deletes_old_messages_and_empty_sessions(chats):
+    old, mixed, new = chats
+    progress = []
+
+    stats = purge_old_chats(days=30, batch_size=3, pause=0, progress=progress.append)
+
+    assert stats["finished"] and stats["messages_deleted"] == 10 and stats["sessions_deleted"] == 1
+    assert stats["rows_per_second"] is not None
+    assert len(progress) >= 4  # one per batch
+    assert list(ChatSession.objects.order_by("id").values_list("title", flat=True)) == ["mixed", "new"]
+    assert ChatMessage.objects.filter(content="recent").count() == 2 == ChatMessage.objects.count()
+    assert RetentionRun.objects.get().phase == RetentionRun.PHASE_DONE
+
+
+def test_purge_resumes_an_interrupted_run(chats, settings):
+    settings.RETENTION_LEASE_SECONDS = 0
+
+    first = purge_old_chats(days=30, batch_size=3, pause=0, max_seconds=1e-9)
+    assert not first["finished"] and first["messages_deleted"] == 3
+    run = RetentionRun.objects.get()
+    assert run.finished_at is None and run.position > 0
+
+    second = purge_old_chats(days=30, batch_size=3, pause=0)
+    assert second["run"] == run.pk and second["finished"]
+    assert second["messages_deleted"] == 10 and second["sessions_deleted"] == 1
+    assert RetentionRun.objects.count() == 1
+
+
+def test_purge_skips_a_run_another_process_is_working_on(chats):
+    purge_old_chats(days=30, batch_size=3, pause=0, max_seconds=1e-9)
+
+    assert purge_old_chats(days=30, batch_size=3, pause=0) is None
+    assert ChatMessage.objects.count() == 9
+
+
+def test_purge_seeks_past_ids_that_do_not_match(db, monkeypatch):
+    from chat import retention
+
+    user = User.objects.create_user(username="ret", email="ret@example.com", password="pass12345")
+    sessions = [ChatSession.objects.create(user=user, title=str(i)) for i in range(10)]
+    in_use = sessions[1::2]  # every other old session still has a recent message
+    for session in in_use:
+        ChatMessage.objects.create(session=session, role="user", content="recent")
+    _backdate(ChatSession, [s.id for s in sessions], 40)
+    sleeps = []
+    monkeypatch.setattr(retention.time, "sleep", sleeps.append)
+    progress = []
+
+    stats = purge_old_chats(days=30, batch_size=1, pause=0.01, progress=progress.append)
+
+    assert stats["sessions_deleted"] == 5 and len(progress) == 5  # one batch per empty session, none in between
+    assert len(sleeps) == 4  # only between batches that deleted something
+    assert set(ChatSession.objects.values_list("id", flat=True)) == {s.id for s in in_use}
+
+
+def test_only_one_unfinished_run_can_exist(db):
+    from django.db import IntegrityError, transaction
+
+    RetentionRun.objects.create(cutoff=timezone.now())
+    with pytest.raises(IntegrityError), transaction.atomic():
+        RetentionRun.objects.create(cutoff=timezone.now())
+    RetentionRun.objects.update(finished_at=timezone.now())
+    RetentionRun.objects.create(cutoff=timezone.now())
@@ -6,7 +6,7 @@ def test_process_query_returns_response(monkeypatch):
     service = AdvancedRAGService(preload=False)
 
     # Mock dependencies only
-    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3: [
+    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [
         {"document": {"id": "doc_1", "title": "Shipping Policy", "content": "Ships in 5 days"}}
     ])
     monkeypatch.setattr(service, "build_gemini_optimized_context", lambda docs: "Context here")
@@ -17,3 +17,50 @@ def test_process_query_returns_response(monkeypatch):
     assert isinstance(result, dict)
     assert "response" in result
     assert result["success"] is True
+
+
+@pytest.mark.django_db
+def test_stream_query_yields_tokens_then_result(monkeypatch):
+    import asyncio
+    from chat import services
+
+    async def fake_stream(query, context="", history=None, provider=None):
+        for text in ["Ships ", "in 5 days."]:
+            yield text
+
+    service = AdvancedRAGService(preload=False)
+    monkeypatch.setattr(service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [])
+    monkeypatch.setattr(services.ai_service, "stream_response", fake_stream)
+
+    async def collect():
+        return [event async for event in service.stream_query("What is shipping?")]
+
+    events = asyncio.run(collect())
+    assert [e["text"] for e in events if e["type"] == "token"] == ["Ships ", "in 5 days."]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["result"]["response"] == "Ships in 5 days."
+    assert events[-1]["result"]["success"] is True
+
+
+@pytest.mark.django_db
+def test_process_query_reports_stage_timings(monkeypatch):
+    import threading
+    from chat import services
+    from chat.response_cache import ResponseCache
+
+    service = AdvancedRAGService(preload=False, response_cache=ResponseCache(enabled=False))
+    retrieval_threads = []
+
+    def fake_retrieve(q, top_k=3, filters=None, timings=None):
+        retrieval_threads.append(threading.current_thread())
+        timings.update(embed=1.0, vector_search=2.0)
+        return []
+
+    monkeypatch.setattr(service, "retrieve_relevant_documents", fake_retrieve)
+    monkeypatch.setattr(service, "get_conversation_history", lambda sid, limit=5: [])
+    monkeypatch.setattr(services.ai_service, "generate_response",
+                        lambda query, context="", history=None, provider=None: "OK")
+
+    timings = service.process_query("What is shipping?", session_id=1)["timings"]
+    assert retrieval_threads[0] is not threading.current_thread()  # overlapped with the history query
+    assert {"embed", "vector_search", "history", "context_build", "cache", "generate", "total"} <= set(timings)
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import pytest
+from chat.tests.helpers import make_store
+from chat.vector_service import RemoteVectorStore, VectorStoreServer
+
+DOCS = [
+    {"id": "doc_1", "title": "Shipping", "content": "Ships in 5 days"},
+    {"id": "doc_2", "title": "Refund", "content": "Refund in 10 days"},
+]
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are length-limited, so avoid the (long) pytest tmp_path
+    directory = tempfile.mkdtemp(prefix="vs")
+    yield os.path.join(directory, "vector.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _wait_for(path, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "server did not start"
+        time.sleep(0.01)
+
+
+def test_remote_store_round_trip(tmp_path, monkeypatch, socket_path):
+    store = make_store(tmp_path, monkeypatch)
+    server = VectorStoreServer(store, socket_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _wait_for(socket_path)
+
+    try:
+        remote = RemoteVectorStore(socket_path)
+        assert remote.add_documents(DOCS) is True
+        assert remote.count() == 2
+        assert remote.document_exists("doc_1")
+        assert remote.search("Ships in 5 days", top_k=1)[0]["document"]["id"] == "doc_1"
+
+        assert remote.delete_documents(["doc_1"]) is True
+        assert store.count() == 1
+    finally:
+        server.shutdown()
+
+
+def test_remote_search_degrades_when_server_is_down(socket_path):
+    remote = RemoteVectorStore(socket_path)
+    assert remote.search("anything") == []
+    remote.initialize_index()  # logs, does not raise
+
+
+def test_read_only_replica_refuses_writes_and_reloads(tmp_path, monkeypatch):
+    writer = make_store(tmp_path, monkeypatch)
+    writer.add_documents(DOCS[:1])
+
+    replica = make_store(tmp_path, monkeypatch, read_only=True)
+    assert replica.index.ntotal == 1
+    assert replica.add_documents(DOCS[1:]) is False
+    assert replica.count() == 1
+
+    writer.add_documents(DOCS[1:])
+    # Make sure the published manifest looks newer even on coarse-mtime filesystems
+    stat = os.stat(writer.manifest_path)
+    os.utime(writer.manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert replica.search("Refund in 10 days", top_k=1)[0]["document"]["id"] == "doc_2"
+    assert replica.index.ntotal == 2
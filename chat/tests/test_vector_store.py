@@ -1,13 +1,10 @@
 import pytest
-from chat.vector_store import VectorDB
+from chat.tests.helpers import make_store
 
 
 @pytest.mark.django_db
-def test_add_and_search_documents(tmp_path):
-    index_path = tmp_path / "faiss.index"
-    docstore_path = tmp_path / "docstore.json"
-
-    db = VectorDB(index_path=str(index_path), docstore_path=str(docstore_path))
+def test_add_and_search_documents(tmp_path, monkeypatch):
+    db = make_store(tmp_path, monkeypatch, read_only=False)
     db.initialize_index()
 
     docs = [
@@ -16,10 +13,10 @@ def test_add_and_search_documents(tmp_path):
     ]
     assert db.add_documents(docs) is True
 
-    results = db.search("shipping", top_k=1)
+    results = db.search("Ships in 5 days", top_k=1)
     assert len(results) == 1
     assert results[0]["document"]["id"] == "doc_1"
 
     # Reset clears everything
     db.reset()
-    assert db.search("shipping") == []
+    assert db.search("Ships in 5 days") == []
@@ -1,3 +1,4 @@
+import json
 import pytest
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -37,6 +38,194 @@ def test_chat_history_view_returns_sessions():
     response = client.get(url)
 
     assert response.status_code == 200
-    data = response.json()
+    data = response.json()["results"]
     assert len(data) == 1
     assert data[0]["title"] == "Test Session"
+    assert (data[0]["message_count"], data[0]["last_message"]) == (1, "Hello")
+
+
+@pytest.mark.django_db
+def test_chat_history_costs_constant_queries_and_pages_by_cursor(django_assert_num_queries):
+    client = APIClient()
+    user = User.objects.create_user(username="urmi", email="urmi@example.com", password="pass12345")
+    other = User.objects.create_user(username="other", email="other@example.com", password="pass12345")
+    client.force_authenticate(user=user)
+    ChatSession.objects.create(user=other, title="Not mine")
+    for i in range(5):
+        session = ChatSession.objects.create(user=user, title=f"Session {i}")
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, role="user", content=f"Question {i}"),
+            ChatMessage(session=session, role="assistant", content=f"Answer {i} " + "x" * 500),
+        ])
+    ChatSession.objects.create(user=user, title="Empty")
+
+    with django_assert_num_queries(1):
+        first = client.get(reverse("chat-history"), {"page_size": 4}).json()
+    assert [s["title"] for s in first["results"]] == ["Empty", "Session 4", "Session 3", "Session 2"]
+    assert (first["results"][0]["message_count"], first["results"][0]["last_message"]) == (0, None)
+    assert first["results"][1]["message_count"] == 2
+    assert first["results"][1]["last_message"].startswith("Answer 4") and len(first["results"][1]["last_message"]) == 200
+
+    second = client.get(first["next"]).json()
+    assert [s["title"] for s in second["results"]] == ["Session 1", "Session 0"]
+    assert second["next"] is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_chat_stream_view_streams_tokens_and_saves_reply(client, monkeypatch):
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from chat.ai_services import ai_service
+    from chat.services import rag_service
+
+    async def fake_stream(query, context="", history=None, provider=None):
+        for text in ["Ships ", "in 5 days."]:
+            yield text
+
+    monkeypatch.setattr(rag_service, "retrieve_relevant_documents", lambda q, top_k=3, filters=None, timings=None: [])
+    monkeypatch.setattr(ai_service, "stream_response", fake_stream)
+
+    user = User.objects.create_user(username="urmi", email="urmi@example.com", password="pass12345")
+    token = RefreshToken.for_user(user).access_token
+
+    response = client.post(
+        reverse("chat-stream"),
+        {"message": "What is your shipping policy?"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert response.status_code == 200
+    assert response["Content-Type"] == "text/event-stream"
+
+    body = b"".join(response).decode()
+    events = [block.split("\n")[0] for block in body.strip().split("\n\n")]
+    assert events == ["event: session", "event: token", "event: token", "event: done"]
+
+    session = ChatSession.objects.get(user=user)
+    assert list(session.messages.values_list("role", "content")) == [
+        ("user", "What is your shipping policy?"),
+        ("assistant", "Ships in 5 days."),
+    ]
+
+
+@pytest.mark.django_db
+def test_chat_stream_view_requires_authentication(client):
+    response = client.post(reverse("chat-stream"), {"message": "Hi"}, content_type="application/json")
+    assert response.status_code == 401
+
+
+@pytest.mark.django_db
+def test_chat_view_passes_retrieval_filters(monkeypatch):
+    from chat.ai_services import ai_service
+    from chat.services import rag_service
+
+    seen = {}
+
+    def fake_retrieve(q, top_k=3, filters=None, timings=None):
+        seen["filters"] = filters
+        return []
+
+    monkeypatch.setattr(rag_service, "retrieve_relevant_documents", fake_retrieve)
+    monkeypatch.setattr(ai_service, "generate_response",
+                        lambda query, context="", history=None, provider=None: "Answer")
+
+    client = APIClient()
+    user = User.objects.create_user(username="urmi", email="urmi@example.com", password="pass12345")
+    client.force_authenticate(user=user)
+
+    filters = {"category": "Shipping", "tags": ["eu", "express"]}
+    response = client.post(reverse("chat-send"), {"message": "Delivery time?", "filters": filters}, format="json")
+    assert response.status_code == 200
+    assert seen["filters"] == filters
+
+    response = client.post(reverse("chat-send"), {"message": "Hi", "filters": {"tags": "eu"}}, format="json")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_session_messages_are_keyset_paginated_and_exportable(settings, django_assert_max_num_queries):
+    client = APIClient()
+    user = User.objects.create_user(username="urmi", email="urmi@example.com", password="pass12345")
+    other = User.objects.create_user(username="other", email="other@example.com", password="pass12345")
+    client.force_authenticate(user=user)
+    session = ChatSession.objects.create(user=user, title="Long chat")
+    ChatMessage.objects.bulk_create([
+        ChatMessage(session=session, role="user" if i % 2 == 0 else "assistant", content=f"Message {i}")
+        for i in range(7)
+    ])
+    url = reverse("chat-session-messages", kwargs={"session_id": session.id})
+
+    first = client.get(url, {"page_size": 5}).json()
+    assert [m["content"] for m in first["results"]] == [f"Message {i}" for i in range(5)]
+    assert (first["session"]["title"], first["session"]["message_count"]) == ("Long chat", 7)
+    second = client.get(first["next"]).json()
+    assert [m["content"] for m in second["results"]] == ["Message 5", "Message 6"]
+    assert second["next"] is None
+
+    settings.CHAT_EXPORT_BATCH_SIZE = 3
+    response = client.get(url, {"stream": "true"})
+    assert response["Content-Type"] == "application/x-ndjson"
+    with django_assert_max_num_queries(3):  # 7 messages in batches of 3
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+    assert [m["content"] for m in lines] == [f"Message {i}" for i in range(7)]
+    assert set(lines[0]) == {"id", "role", "content", "created_at"}
+
+    foreign = ChatSession.objects.create(user=other)
+    assert client.get(reverse("chat-session-messages", kwargs={"session_id": foreign.id})).status_code == 404
+
+
+@pytest.mark.django_db
+def test_chat_turn_is_saved_in_at_most_two_writes(monkeypatch):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from chat import views
+
+    monkeypatch.setattr(views.rag_service, "process_query",
+                        lambda *args, **kwargs: {"response": "Ships in 5 days.", "success": True})
+    client = APIClient()
+    user = User.objects.create_user(username="urmi", email="urmi@example.com", password="pass12345")
+    client.force_authenticate(user=user)
+
+    def send(payload):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(reverse("chat-send"), payload, format="json")
+        assert response.status_code == 200
+        writes = [q["sql"].split()[0] for q in ctx.captured_queries
+                  if q["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")]
+        return response.json(), writes
+
+    data, writes = send({"message": "How long does shipping take?"})
+    assert writes == ["INSERT", "INSERT"]  # titled session, both messages
+    assert data["session"]["title"] == "How long does shipping take?"
+    assert (data["session"]["message_count"], data["session"]["last_message"]) == (2, "Ships in 5 days.")
+    assert data["user_message"]["id"] and data["assistant_message"]["role"] == "assistant"
+
+    data, writes = send({"message": "And returns?", "session_id": data["session"]["id"]})
+    assert writes == ["INSERT"]
+    assert data["session"]["message_count"] == 4
+    roles = list(ChatMessage.objects.filter(session_id=data["session"]["id"]).order_by("created_at", "id")
+                 .values_list("role", flat=True))
+    assert roles == ["user", "assistant", "user", "assistant"]
+
+    untitled = ChatSession.objects.create(user=user)
+    data, writes = send({"message": "Hello", "session_id": untitled.id})
+    assert writes == ["UPDATE", "INSERT"] and data["session"]["title"] == "Hello"
+
+
+@pytest.mark.django_db
+def test_chat_request_can_choose_the_llm_provider(monkeypatch):
+    from chat import views
+
+    calls = []
+    monkeypatch.setattr(views.rag_service, "process_query",
+                        lambda *args, **kwargs: calls.append(kwargs) or {"response": "Hi.", "success": True})
+    monkeypatch.setattr(views.ai_service, "providers", {"gemini": object(), "stub": object()})
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(username="urmi", email="urmi@example.com",
+                                                       password="pass12345"))
+
+    assert client.post(reverse("chat-send"), {"message": "Hi", "provider": "stub"}, format="json").status_code == 200
+    assert client.post(reverse("chat-send"), {"message": "Hi"}, format="json").status_code == 200
+    assert [call["provider"] for call in calls] == ["stub", None]
+
+    response = client.post(reverse("chat-send"), {"message": "Hi", "provider": "openai"}, format="json")
+    assert response.status_code == 400 and "provider" in response.json()
@@ -1,11 +1,17 @@
 # chat/urls.py
 from django.urls import path
-from .views import ChatHistoryView, ChatView
+from .views import ChatHistoryView, ChatSessionMessagesView, ChatView, chat_stream_view
 
 urlpatterns = [
     # Returns all chat sessions for the authenticated user
     path("history/", ChatHistoryView.as_view(), name="chat-history"),
 
+    # Messages of one session, oldest first (cursor-paginated, or ?stream=true for JSON lines)
+    path("sessions/<int:session_id>/messages/", ChatSessionMessagesView.as_view(), name="chat-session-messages"),
+
     # Send a message to the chatbot and get a response
     path("send/", ChatView.as_view(), name="chat-send"),
+
+    # Same as send/, but streams the response token by token (Server-Sent Events)
+    path("stream/", chat_stream_view, name="chat-stream"),
 ]
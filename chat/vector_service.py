@@ -0,0 +1,231 @@
+# chat/vector_service.py
+"""
+Sidecar mode for the vector store.
+
+One process (`python manage.py run_vector_server`) owns the embedding model,
+the FAISS index and all writes, and serves the VectorStore API over a Unix
+socket. Web workers set VECTOR_STORE_SOCKET and get a RemoteVectorStore,
+which has the same methods as VectorStore, so memory scales with one
+model + index instead of one per worker.
+"""
+import os
+import logging
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Methods callers may invoke remotely, split by whether they mutate the store
+READ_METHODS = (
+    "search", "search_batch", "search_by_vector", "lexical_search", "hybrid_search",
+    "embed_query", "embed_queries", "cached_query_vector",
+    "document_exists", "chunk_ids_for_document", "count", "stats", "version",
+)
+WRITE_METHODS = (
+    "add_documents", "upsert_documents", "delete_documents", "sync_documents", "reset", "initialize_index",
+)
+
+
+def _authkey() -> bytes:
+    key = getattr(settings, "VECTOR_STORE_AUTHKEY", "") or settings.SECRET_KEY
+    return key.encode("utf-8")
+
+
+class VectorStoreServer:
+    """
+    Serves a VectorStore over a Unix socket (one thread per client connection).
+    VectorStore serializes writers and lets searches run concurrently itself.
+    """
+
+    def __init__(self, store, address: str):
+        self.store = store
+        self.address = address
+        self._listener = None
+
+    def dispatch(self, method: str, args, kwargs):
+        if method not in READ_METHODS and method not in WRITE_METHODS:
+            raise AttributeError(f"VectorStore method not exposed: {method}")
+        if "timings" in kwargs:
+            # Stage timings can't be filled in across processes: send them back
+            timings = kwargs["timings"] = {}
+            return {"result": getattr(self.store, method)(*args, **kwargs), "timings": timings}
+        return getattr(self.store, method)(*args, **kwargs)
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    conn.send(("ok", self.dispatch(method, args, kwargs)))
+                except Exception as e:
+                    logger.exception("Vector server call %s failed", method)
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from a previous run
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=_authkey())
+        os.chmod(self.address, 0o660)
+        logger.info("Vector store server listening on %s", self.address)
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    if self._listener is None:
+                        return  # closed by shutdown()
+                    logger.exception("Vector server failed to accept a connection")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+
+
+class RemoteVectorStoreError(RuntimeError):
+    pass
+
+
+class RemoteVectorStore:
+    """
+    Client for VectorStoreServer with the same API as VectorStore.
+    Connections are opened lazily, one per thread, and re-opened once if the
+    server restarted.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _call(self, method: str, *args, **kwargs):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((method, args, kwargs))
+                status, payload = conn.recv()
+                break
+            except (OSError, EOFError):
+                self._drop_connection()
+                if attempt:
+                    raise
+        if status == "error":
+            raise RemoteVectorStoreError(payload)
+        return payload
+
+    def _timed_call(self, method: str, timings: Optional[Dict], *args, **kwargs):
+        """_call for methods that fill in stage timings (see VectorStoreServer.dispatch)."""
+        if timings is None:
+            return self._call(method, *args, **kwargs)
+        payload = self._call(method, *args, timings={}, **kwargs)
+        timings.update(payload["timings"])
+        return payload["result"]
+
+    # --- VectorStore API ---
+    def initialize_index(self):
+        try:
+            self._call("initialize_index")
+        except (OSError, EOFError) as e:
+            logger.warning("Vector store server at %s not reachable yet: %s", self.address, e)
+
+    def document_exists(self, doc_id: str) -> bool:
+        return self._call("document_exists", doc_id)
+
+    def count(self) -> int:
+        return self._call("count")
+
+    def chunk_ids_for_document(self, document_id) -> List[str]:
+        return self._call("chunk_ids_for_document", document_id)
+
+    def add_documents(self, docs: List[Dict]) -> bool:
+        return self._call("add_documents", docs)
+
+    def upsert_documents(self, docs: List[Dict]) -> bool:
+        return self._call("upsert_documents", docs)
+
+    def delete_documents(self, ids: List[str]) -> bool:
+        return self._call("delete_documents", ids)
+
+    def sync_documents(self, docs: List[Dict], delete_ids: List[str]) -> bool:
+        return self._call("sync_documents", docs, delete_ids)
+
+    def reset(self):
+        return self._call("reset")
+
+    def stats(self) -> Dict[str, int]:
+        return self._call("stats")
+
+    def version(self) -> str:
+        return self._call("version")
+
+    def embed_query(self, query: str):
+        return self._call("embed_query", query)
+
+    def embed_queries(self, queries: List[str]):
+        return self._call("embed_queries", queries)
+
+    def cached_query_vector(self, query: str):
+        return self._call("cached_query_vector", query)
+
+    def search(self, query: str, top_k: int = 3, filters: Optional[Dict] = None,
+               timings: Optional[Dict] = None) -> List[Dict]:
+        try:
+            return self._timed_call("search", timings, query, top_k, filters)
+        except Exception:
+            logger.exception("Remote search failed")
+            return []
+
+    def search_batch(self, queries: List[str], top_k: int = 3, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        try:
+            return self._call("search_batch", queries, top_k, filters)
+        except Exception:
+            logger.exception("Remote search failed")
+            return [[] for _ in queries]
+
+    def search_by_vector(self, query_vector, top_k: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        try:
+            return self._call("search_by_vector", query_vector, top_k, filters)
+        except Exception:
+            logger.exception("Remote search failed")
+            return []
+
+    def lexical_search(self, query: str, top_k: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        try:
+            return self._call("lexical_search", query, top_k, filters)
+        except Exception:
+            logger.exception("Remote search failed")
+            return []
+
+    def hybrid_search(self, query: str, top_k: int = 3, candidates=None,
+                      filters: Optional[Dict] = None, timings: Optional[Dict] = None) -> List[Dict]:
+        try:
+            return self._timed_call("hybrid_search", timings, query, top_k, candidates, filters)
+        except Exception:
+            logger.exception("Remote search failed")
+            return []
@@ -1,46 +1,165 @@
 # chat/vector_store.py
 import os
 import json
+import time
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 import faiss
 import numpy as np
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from django.conf import settings
 from sentence_transformers import SentenceTransformer
+from core import metrics
+from .docstore import DocStore, content_hash, normalize_filters
+from .embedding_cache import EmbeddingCache
+from .locks import FileLock, ReadWriteLock
+from .index_factory import (
+    configure_search,
+    effective_index_type,
+    id_map_view,
+    index_settings,
+    index_type_of,
+    is_id_mapped,
+    measure_recall,
+    new_index,
+    search_excluding,
+    search_parameters,
+    supports_remove,
+)
 
 logger = logging.getLogger(__name__)
 
+EMBED_SECONDS = metrics.histogram(
+    "rag_embed_seconds", "Sentence-transformer encode calls (cache misses only).", ("kind",)
+)
+VECTOR_SEARCH_SECONDS = metrics.histogram("rag_vector_search_seconds", "FAISS index.search calls.")
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+def _writer(method):
+    """Run a mutating VectorStore method as a batch (writer lock held, index saved once)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.batch():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class VectorStore:
     """
     FAISS-based vector database with persistent docstore.
     - Embeddings: all-MiniLM-L6-v2 (384-dim)
+    - Index: keyed by stable int64 ids derived from doc ids, so upserts and
+      deletes touch only the changed vectors. The index type (flat, HNSW,
+      IVF-Flat, IVF-PQ) comes from VECTOR_INDEX_* settings (or index_config); see index_factory.
+      HNSW cannot remove vectors, so replaced/deleted ones are tombstoned and
+      the graph is compacted once too many are dead.
     - Persists:
-        - FAISS index to FAISS_INDEX_PATH
-        - Doc metadata mapping to DOCSTORE_PATH
+        - FAISS index to FAISS_INDEX_PATH, once per batch() of writes and
+          only if the index changed (each write method is its own batch)
+        - Index manifest (count, model, dim, checksum, docstore generation)
+          next to the index
+        - Doc metadata (SQLite, one row per chunk keyed by FAISS id) to DOCSTORE_PATH
+        - Document embeddings cache to EMBEDDING_CACHE_DIR (optional)
+    - read_only (VECTOR_INDEX_MMAP): memory-map the persisted index so worker
+      processes share its pages; such replicas never write and reload when
+      the writer (e.g. the run_vector_server sidecar) publishes a new index
+    - Several writable stores (e.g. ingestion workers in each web process)
+      may share the files: writes hold a cross-process lock and first catch
+      up with the docstore, and searches pick up indexes published by the
+      other processes
     """
 
+    REBUILD_BATCH_SIZE = 1000
+    QUERY_CACHE_SIZE = 1024  # recent query embeddings kept in memory
+    HYBRID_RRF_K = 60  # reciprocal-rank fusion constant (dampens top-rank dominance)
+    FILTER_CACHE_SIZE = 256  # metadata filters whose id selectors are kept
+
     def __init__(
         self,
         model_name: str = "all-MiniLM-L6-v2",
         dim: int = 384,
         index_path: str = None,
         docstore_path: str = None,
+        manifest_path: str = None,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        read_only: Optional[bool] = None,
+        embedder=None,
+        index_config: Optional[Dict] = None,
+        cache_embeddings: bool = True,
     ):
         self.model_name = model_name
         self.dim = dim
-        self._embedder = None  # lazy init
+        self._embedder = embedder  # lazy init (SentenceTransformer) when None
+        self._query_vectors = OrderedDict()
+        self._query_lock = threading.Lock()
+        self._selectors = OrderedDict()  # normalized filters -> (n ids, IDSelectorBatch)
+        self._selectors_generation = None
+        # Writers (ingestion, possibly on background threads) run one at a time;
+        # in-place index updates exclude searches, which otherwise run concurrently
+        self._write_lock = threading.RLock()
+        self._batch_depth = 0
+        self._dirty = False  # in-memory index changed since it was last saved
+        self._index_lock = ReadWriteLock()
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
 
         self.index_path = index_path or getattr(settings, "FAISS_INDEX_PATH", "faiss.index")
-        self.docstore_path = docstore_path or getattr(settings, "DOCSTORE_PATH", "docstore.json")
+        self.docstore_path = docstore_path or getattr(settings, "DOCSTORE_PATH", "docstore.sqlite3")
+        if self.docstore_path.endswith(".json"):
+            # Pre-SQLite configuration: keep the JSON file as the import source
+            self.docstore_path = os.path.splitext(self.docstore_path)[0] + ".sqlite3"
+        self.legacy_docstore_path = os.path.splitext(self.docstore_path)[0] + ".json"
+        self.manifest_path = manifest_path or f"{self.index_path}.manifest.json"
+        self.lock_path = f"{self.index_path}.lock"
+        self.embedding_cache = (
+            embedding_cache if embedding_cache is not None else self._default_embedding_cache()
+        ) if cache_embeddings else None
+
+        self.read_only = getattr(settings, "VECTOR_INDEX_MMAP", False) if read_only is None else read_only
+        self._manifest_mtime = None
+        self._synced_generation = None  # docstore generation the in-memory index reflects
 
-        self.index = faiss.IndexFlatL2(self.dim)
-        self.doc_store: Dict[str, Dict] = {}
-        self.doc_order: List[str] = []
+        self.index_config = index_config or index_settings()
+        self.build_report: Dict = {}
+        self.index = self._new_index()
+        self._tombstones = set()  # HNSW positions of replaced/deleted vectors
+        self._dead = None  # IDSelectorBatch over _tombstones
+        self.docstore = DocStore(self.docstore_path)
+        self._legacy_order: Optional[List[str]] = None
 
         # Initialize from persisted files if available
-        self._load_docstore()
-        self._rebuild_index()
+        with self._process_lock():
+            if not self.read_only:
+                self._migrate_legacy_docstore()
+            self._load_or_rebuild_index()
+
+    # --- Ids ---
+    @staticmethod
+    def faiss_id(doc_id: str) -> int:
+        """Stable non-negative int64 id for a doc id (same in every process)."""
+        digest = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF
+
+    def _faiss_ids(self, doc_ids: List[str]) -> np.ndarray:
+        return np.array([self.faiss_id(doc_id) for doc_id in doc_ids], dtype="int64")
+
+    def _new_index(self):
+        return new_index(self.dim, "flat", self.index_config)
+
+    def _target_index_type(self, count: int) -> str:
+        return effective_index_type(self.index_config, count)
+
+    def _needs_rebuild(self, count: int) -> bool:
+        """True when a corpus of `count` docs calls for a different index type."""
+        return index_type_of(self.index) != self._target_index_type(count)
 
     # --- Embedding ---
     @property
@@ -50,144 +169,810 @@ class VectorStore:
             self._embedder = SentenceTransformer(self.model_name)
         return self._embedder
 
-    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+    def _default_embedding_cache(self) -> Optional[EmbeddingCache]:
+        if not getattr(settings, "EMBEDDING_CACHE_ENABLED", True):
+            return None
+        directory = getattr(settings, "EMBEDDING_CACHE_DIR", None)
+        if not directory:
+            return None
+        try:
+            return EmbeddingCache(
+                directory,
+                model_name=self.model_name,
+                dim=self.dim,
+                max_entries=getattr(settings, "EMBEDDING_CACHE_MAX_ENTRIES", 200_000),
+            )
+        except Exception:
+            logger.exception("Embedding cache unavailable, embedding without cache")
+            return None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
         vecs = self.embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
         return vecs.astype("float32")
 
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed document texts, encoding only those missing from the embedding cache."""
+        if self.embedding_cache is None or not texts:
+            with EMBED_SECONDS.time(kind="document"):
+                return self._encode(texts)
+
+        hits, missing = self.embedding_cache.get_many(texts)
+        vecs = np.empty((len(texts), self.dim), dtype="float32")
+        for pos, vec in hits.items():
+            vecs[pos] = vec
+
+        if missing:
+            with EMBED_SECONDS.time(kind="document"):
+                encoded = self._encode([texts[pos] for pos in missing])
+            vecs[missing] = encoded
+            try:
+                self.embedding_cache.put_many([texts[pos] for pos in missing], encoded)
+            except Exception:
+                logger.exception("Failed to write embedding cache")
+
+        logger.debug("Embedded %d texts (%d from cache)", len(texts), len(hits))
+        return vecs
+
     # --- Persistence ---
     def _ensure_dir(self, path: str):
         directory = os.path.dirname(path)
         if directory:
             os.makedirs(directory, exist_ok=True)
 
-    def _save_docstore(self):
-        self._ensure_dir(self.docstore_path)
-        with open(self.docstore_path, "w", encoding="utf-8") as f:
-            json.dump({"order": self.doc_order, "docs": self.doc_store}, f, ensure_ascii=False)
-
-    def _load_docstore(self):
-        if os.path.exists(self.docstore_path):
-            with open(self.docstore_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.doc_order = data.get("order", [])
-                self.doc_store = data.get("docs", {})
-            logger.info("Loaded docstore with %d documents", len(self.doc_order))
-        else:
-            self.doc_order = []
-            self.doc_store = {}
+    def _migrate_legacy_docstore(self):
+        """
+        One-time import of a legacy docstore.json into the SQLite docstore.
+        Keeps the JSON order so a positional index can be migrated too, and
+        carries a matching manifest over so the index is not re-embedded.
+        """
+        if not os.path.exists(self.legacy_docstore_path) or self.docstore.get_meta("legacy_imported"):
+            return
+
+        with open(self.legacy_docstore_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        order = [doc_id for doc_id in data.get("order", []) if doc_id in data.get("docs", {})]
+        docs = data.get("docs", {})
+
+        legacy_checksum = hashlib.sha256()
+        for doc_id in order:
+            legacy_checksum.update(doc_id.encode("utf-8") + b"\0")
+            legacy_checksum.update((docs[doc_id].get("content") or "").encode("utf-8") + b"\0")
+
+        for doc_id in order:
+            # chunks ingested as "<document.id>_<n>" before document_id was recorded
+            prefix, _, suffix = doc_id.rpartition("_")
+            if "document_id" not in docs[doc_id] and prefix.isdigit() and suffix.isdigit():
+                docs[doc_id]["document_id"] = int(prefix)
+        self.docstore.put_many([(self.faiss_id(doc_id), docs[doc_id]) for doc_id in order])
+        self.docstore.set_meta("legacy_imported", "1")
+        self._legacy_order = order
+        logger.info("Imported %d documents from legacy %s", len(order), self.legacy_docstore_path)
+
+        manifest = self._load_manifest()
+        if manifest and manifest.get("checksum") == legacy_checksum.hexdigest() and manifest.get("count") == len(order):
+            manifest["checksum"] = self.docstore.checksum()
+            self._write_manifest(manifest)
+
+    @contextmanager
+    def batch(self):
+        """
+        Group writes: the writer lock is held throughout and the index, whose
+        file is rewritten in full, is saved once at the end if it changed.
+        """
+        with self._write_lock:
+            outermost = not self._batch_depth
+            with self._process_lock() if outermost else nullcontext():
+                if outermost:
+                    self._sync_for_write()
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                    if outermost:
+                        self._publish()
+
+    def _process_lock(self):
+        """Serializes writers across processes sharing the index files."""
+        if self.read_only:
+            return nullcontext()
+        self._ensure_dir(self.lock_path)
+        return FileLock(self.lock_path)
+
+    def _sync_for_write(self):
+        """
+        Bring the in-memory index up to date with documents written by other
+        processes before changing it: load their published index, or rebuild
+        if they stopped before publishing one.
+        """
+        if self.read_only or self.docstore.generation() == self._synced_generation:
+            return
+        if not self._load_index():
+            self._rebuild_index(measure=False)
+
+    def _publish(self):
+        """End of a batch: save a changed index, or just record metadata-only changes."""
+        if self._dirty:
+            self._save_index()
+        elif not self.read_only and self.docstore.generation() != self._synced_generation:
+            self._save_manifest()
+
+    def _index_changed(self):
+        """Save now, or at the end of the enclosing batch."""
+        self._dirty = True
+        if not self._batch_depth:
+            self._save_index()
 
     def _save_index(self):
+        self._dirty = False
         self._ensure_dir(self.index_path)
-        faiss.write_index(self.index, self.index_path)
-
-    def _rebuild_index(self):
-        """Rebuild FAISS index from docstore to ensure alignment."""
-        self.index = faiss.IndexFlatL2(self.dim)
-        if self.doc_order:
-            contents = [self.doc_store[doc_id]["content"] for doc_id in self.doc_order if doc_id in self.doc_store]
-            if contents:
-                embeddings = self._embed_batch(contents)
-                self.index.add(embeddings)
-        self._save_index()
+        # Write-then-rename: read-only replicas may have the old file mmapped
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._save_manifest()
+
+    # --- Manifest ---
+    def _manifest_identity(self) -> Dict:
+        """Manifest fields that must match for the persisted index to be reused."""
+        return {
+            "model_name": self.model_name,
+            "dim": self.dim,
+            "index_type": self._target_index_type(self.docstore.count()),
+            "checksum": self.docstore.checksum(),
+        }
+
+    def _build_manifest(self) -> Dict:
+        manifest = self._manifest_identity()
+        manifest["count"] = self.index.ntotal  # vectors in the saved file
+        manifest["generation"] = self.docstore.generation()
+        manifest["build"] = self.build_report
+        return manifest
+
+    def _manifest_matches(self, manifest: Optional[Dict]) -> bool:
+        if not manifest:
+            return False
+        defaults = {"index_type": "flat"}  # manifests written before index types existed
+        return all(
+            manifest.get(key, defaults.get(key)) == value
+            for key, value in self._manifest_identity().items()
+        )
+
+    def _save_manifest(self):
+        manifest = self._build_manifest()
+        self._write_manifest(manifest)
+        self._synced_generation = manifest["generation"]
+        self._manifest_mtime = os.path.getmtime(self.manifest_path)  # not a reload trigger for ourselves
+
+    def _write_manifest(self, manifest: Dict):
+        self._ensure_dir(self.manifest_path)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _load_manifest(self) -> Optional[Dict]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Unreadable index manifest at %s", self.manifest_path)
+            return None
+
+    def _load_index(self) -> bool:
+        """
+        Warm start: read the persisted FAISS index if its manifest matches the
+        current docstore. Returns False when the index must be rebuilt.
+        """
+        if not os.path.exists(self.index_path):
+            return False
+
+        if os.path.exists(self.manifest_path):
+            self._manifest_mtime = os.path.getmtime(self.manifest_path)
+        manifest = self._load_manifest()
+        if not self._manifest_matches(manifest):
+            logger.info("Index manifest missing or stale, index will be rebuilt")
+            return False
+
+        try:
+            index = faiss.read_index(self.index_path, self._read_flags())
+        except Exception:
+            logger.exception("Failed to read FAISS index from %s", self.index_path)
+            return False
+
+        if index.ntotal != manifest.get("count") or index.d != self.dim:
+            logger.warning(
+                "FAISS index shape (%d x %d) does not match manifest, index will be rebuilt",
+                index.ntotal, index.d,
+            )
+            return False
+
+        if not is_id_mapped(index):
+            if self.read_only or self._legacy_order is None or len(self._legacy_order) != index.ntotal:
+                logger.info("Positional FAISS index without its legacy order, index will be rebuilt")
+                return False
+            self._set_index(self._migrate_positional_index(index, self._legacy_order))
+            self._index_changed()
+        else:
+            self._set_index(index, self._derive_tombstones(index))
+
+        self.build_report = manifest.get("build", {})
+        self._synced_generation = manifest.get("generation", self.docstore.generation())
+        configure_search(self.index, self.index_config)
+        logger.info("Loaded FAISS index with %d vectors from %s", index.ntotal, self.index_path)
+        return True
+
+    def _read_flags(self) -> int:
+        if not self.read_only:
+            return 0
+        # IO_FLAG_MMAP_IFC maps flat/HNSW storage too (plain IO_FLAG_MMAP only maps IVF lists)
+        return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+
+    def _maybe_reload(self):
+        """Pick up indexes published by other processes (the writer, or other writable stores)."""
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        if self.read_only:
+            if self._load_index():
+                logger.info("Reloaded published FAISS index (%d vectors)", self.index.ntotal)
+            return
+        if not self._write_lock.acquire(blocking=False):
+            return  # a local write is in progress and syncs before it changes anything
+        try:
+            if self.docstore.generation() != self._synced_generation and self._load_index():
+                logger.info("Reloaded FAISS index published by another process (%d vectors)", self.index.ntotal)
+        finally:
+            self._write_lock.release()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("VectorStore is a read-only (mmap) replica; write through the indexing process")
+
+    def _migrate_positional_index(self, index, order: List[str]):
+        """
+        Convert a legacy positional index (row i == order[i]) into an
+        ID-mapped one by re-adding its stored vectors; nothing is re-embedded.
+        """
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, self.dim), "float32")
+        migrated = self._new_index()
+        if len(vectors):
+            migrated.add_with_ids(vectors, self._faiss_ids(order))
+        logger.info("Migrated positional FAISS index (%d vectors) to IndexIDMap2", index.ntotal)
+        return migrated
+
+    def _load_or_rebuild_index(self):
+        if self._load_index():
+            return
+        if self.read_only:
+            logger.error(
+                "No up-to-date FAISS index at %s for read-only replica; serving an empty index "
+                "until the writer publishes one", self.index_path,
+            )
+            self._set_index(self._new_index())
+            return
+        self._rebuild_index()
+
+    def _rebuild_index(self, measure: bool = True):
+        """
+        Rebuild FAISS index from docstore to ensure alignment.
+        Approximate indexes are trained on the corpus and, when measure is
+        set (startup and index type changes), their recall@k against exact
+        search is recorded in build_report.
+        """
+        start = time.time()
+        count = self.docstore.count()
+        index_type = self._target_index_type(count)
+
+        if not count:
+            self._set_index(self._new_index())
+            self.build_report = {"index_type": "flat", "count": 0}
+            self._index_changed()
+            return
+
+        embeddings = np.empty((count, self.dim), dtype="float32")
+        ids = np.empty(count, dtype="int64")
+        filled = 0
+        for faiss_ids, _, contents in self.docstore.iter_batches(self.REBUILD_BATCH_SIZE):
+            embeddings[filled:filled + len(faiss_ids)] = self._embed_batch(contents)
+            ids[filled:filled + len(faiss_ids)] = faiss_ids
+            filled += len(faiss_ids)
+        embeddings, ids = embeddings[:filled], ids[:filled]
+
+        index = new_index(self.dim, index_type, self.index_config, training_vectors=embeddings)
+        index.add_with_ids(embeddings, ids)
+        self._set_index(index)
+
+        if measure:
+            recall = measure_recall(index, embeddings, ids, self.index_config)
+        elif self.build_report.get("index_type") == index_type:
+            recall = self.build_report.get("recall_at_k")  # same kind of index, last measured value
+        else:
+            recall = None
+        self.build_report = {
+            "index_type": index_type,
+            "count": filled,
+            "build_seconds": round(time.time() - start, 3),
+            "recall_at_k": recall,
+            "recall_k": self.index_config["recall_k"] if recall is not None else None,
+        }
+        if measure and recall is not None:
+            logger.info(
+                "Built %s index over %d vectors: recall@%d vs flat = %.3f",
+                index_type, filled, self.index_config["recall_k"], recall,
+            )
+        self._index_changed()
+
+    # --- Tombstones (HNSW) ---
+    def _set_index(self, index, tombstones=()):
+        with self._index_lock.writing():
+            self.index = index
+            self._set_tombstones(tombstones)
+
+    def _set_tombstones(self, positions):
+        """Call with the index write lock held (searches read both together)."""
+        self._tombstones = set(int(p) for p in positions)
+        self._dead = (
+            faiss.IDSelectorBatch(np.fromiter(self._tombstones, dtype="int64", count=len(self._tombstones)))
+            if self._tombstones else None
+        )
+
+    def _derive_tombstones(self, index) -> np.ndarray:
+        """
+        Dead positions of a loaded HNSW index: every position but the last
+        one of each id, and positions of ids no longer in the docstore.
+        """
+        if supports_remove(index) or not index.ntotal:
+            return np.empty(0, dtype="int64")
+        ids = id_map_view(index)
+        _, last_from_end = np.unique(ids[::-1], return_index=True)
+        latest = len(ids) - 1 - last_from_end
+        alive = np.zeros(len(ids), dtype=bool)
+        alive[latest] = np.isin(ids[latest], np.asarray(self.docstore.faiss_ids(), dtype="int64"))
+        return np.flatnonzero(~alive)
+
+    def _live_count(self) -> int:
+        return self.index.ntotal - len(self._tombstones)
+
+    def _remove_vectors(self, doc_ids: List[str]):
+        """Remove in place, or tombstone on HNSW. Call with the index write lock held."""
+        if supports_remove(self.index):
+            self.index.remove_ids(self._faiss_ids(doc_ids))
+            return
+        dead = np.flatnonzero(np.isin(id_map_view(self.index), self._faiss_ids(doc_ids)))
+        self._set_tombstones(self._tombstones.union(dead.tolist()))
+
+    def _maybe_compact(self):
+        """Rebuild an HNSW graph from its live vectors once too many are tombstoned."""
+        if not self._tombstones or len(self._tombstones) <= self.index_config["compact_fraction"] * self.index.ntotal:
+            return
+        start = time.time()
+        live = np.setdiff1d(np.arange(self.index.ntotal), np.fromiter(self._tombstones, dtype="int64"))
+        vectors = faiss.downcast_index(self.index.index).reconstruct_n(0, self.index.ntotal)[live]
+        ids = id_map_view(self.index)[live].copy()
+        index = new_index(self.dim, index_type_of(self.index), self.index_config)
+        index.add_with_ids(vectors, ids)
+        removed = len(self._tombstones)
+        self._set_index(index)
+        self.build_report = dict(self.build_report, count=len(ids))
+        logger.info(
+            "Compacted HNSW index: dropped %d dead vectors, %d left (%.2fs)",
+            removed, len(ids), time.time() - start,
+        )
 
     # --- Public lifecycle ---
+    @_writer
     def initialize_index(self):
         """
         Ensure the FAISS index and docstore are loaded and aligned.
         Called at app startup (ChatConfig.ready()).
         """
         try:
-            self._load_docstore()
-            self._rebuild_index()
-            logger.info("VectorStore initialized with %d documents", len(self.doc_order))
+            if not self._manifest_matches(self._load_manifest()) or self._live_count() != self.docstore.count():
+                self._load_or_rebuild_index()
+            logger.info("VectorStore initialized with %d documents", self._live_count())
         except Exception:
             logger.exception("Failed to initialize VectorStore")
 
     # --- Document Operations ---
     def document_exists(self, doc_id: str) -> bool:
         """Check if a document ID already exists in the store."""
-        return doc_id in self.doc_store
+        return self.docstore.contains(doc_id)
 
+    def count(self) -> int:
+        return self.docstore.count()
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes reported as /metrics gauges."""
+        try:
+            index_bytes = os.path.getsize(self.index_path)
+        except OSError:
+            index_bytes = 0
+        return {
+            "vectors": self._live_count(),
+            "index_bytes": index_bytes,
+            "docstore_bytes": self.docstore.size_bytes(),
+        }
+
+    @_writer
     def add_documents(self, docs: List[Dict]) -> bool:
         """
         Add new documents to the vector store.
         Each doc must have: {"id", "title", "content", ...}
         """
         try:
-            new_docs = [d for d in docs if d["id"] not in self.doc_store]
+            self._check_writable()
+            latest = {d["id"]: d for d in docs}
+            existing = self.docstore.content_hashes(list(latest))
+            new_docs = [d for doc_id, d in latest.items() if doc_id not in existing]
             if not new_docs:
                 return True
 
-            contents = [d.get("content", "") for d in new_docs]
-            embeddings = self._embed_batch(contents)
-            self.index.add(embeddings)
+            rebuild = self._needs_rebuild(self.docstore.count() + len(new_docs))
+            if not rebuild:
+                contents = [d.get("content", "") for d in new_docs]
+                embeddings = self._embed_batch(contents)
+                with self._index_lock.writing():
+                    self.index.add_with_ids(embeddings, self._faiss_ids([d["id"] for d in new_docs]))
 
-            for d in new_docs:
-                self.doc_store[d["id"]] = d
-                self.doc_order.append(d["id"])
+            self.docstore.put_many([(self.faiss_id(d["id"]), d) for d in new_docs])
 
-            self._save_index()
-            self._save_docstore()
+            if rebuild:
+                self._rebuild_index()  # corpus crossed the ANN training threshold
+            else:
+                self._index_changed()
             logger.info("Added %d documents to vector store", len(new_docs))
             return True
         except Exception:
             logger.exception("Error adding documents to vector store")
             return False
 
+    @_writer
     def upsert_documents(self, docs: List[Dict]) -> bool:
         """
         Insert or update documents.
+        Only new docs and docs whose content changed are re-embedded;
+        metadata-only changes just update the docstore.
         """
         try:
-            for d in docs:
-                if d["id"] not in self.doc_store:
-                    self.doc_order.append(d["id"])
-                self.doc_store[d["id"]] = d
+            self._check_writable()
+            latest = {d["id"]: d for d in docs}
+            existing = self.docstore.content_hashes(list(latest))
+            changed = [
+                d for doc_id, d in latest.items()
+                if existing.get(doc_id) != content_hash(d.get("content", ""))
+            ]
 
-            self._rebuild_index()
-            self._save_docstore()
-            logger.info("Upserted %d documents", len(docs))
+            replaced = [d["id"] for d in changed if d["id"] in existing]
+            count_after = self.docstore.count() + len(changed) - len(replaced)
+            rebuild = self._needs_rebuild(count_after)
+
+            if changed and not rebuild:
+                embeddings = self._embed_batch([d.get("content", "") for d in changed])
+                with self._index_lock.writing():
+                    if replaced:
+                        self._remove_vectors(replaced)
+                    self.index.add_with_ids(embeddings, self._faiss_ids([d["id"] for d in changed]))
+                self._maybe_compact()
+
+            self.docstore.put_many([(self.faiss_id(doc_id), d) for doc_id, d in latest.items()])
+
+            if rebuild:
+                self._rebuild_index()
+            elif changed:
+                self._index_changed()  # metadata-only updates leave the index as it was
+            logger.info("Upserted %d documents (%d re-embedded)", len(latest), len(changed))
             return True
         except Exception:
             logger.exception("Error upserting documents")
             return False
 
+    @_writer
+    def delete_documents(self, ids: List[str]) -> bool:
+        """
+        Remove documents (by doc id) from the index and docstore.
+        Unknown ids are ignored.
+        """
+        try:
+            self._check_writable()
+            doomed = list(self.docstore.content_hashes(list(set(ids))))
+            if not doomed:
+                return True
+
+            rebuild = self._needs_rebuild(self.docstore.count() - len(doomed))
+            if not rebuild:
+                with self._index_lock.writing():
+                    self._remove_vectors(doomed)
+                self._maybe_compact()
+            self.docstore.delete_many(doomed)
+
+            if rebuild:
+                self._rebuild_index()  # corpus fell below the ANN threshold
+            else:
+                self._index_changed()
+            logger.info("Deleted %d documents from vector store", len(doomed))
+            return True
+        except Exception:
+            logger.exception("Error deleting documents from vector store")
+            return False
+
+    @_writer
+    def sync_documents(self, docs: List[Dict], delete_ids: List[str]) -> bool:
+        """upsert_documents(docs) then delete_documents(delete_ids), saving the index once."""
+        return self.upsert_documents(docs) and self.delete_documents(delete_ids)
+
+    def chunk_ids_for_document(self, document_id) -> List[str]:
+        """Ids of all chunks ingested from a given Document (see chat.ingestion)."""
+        return self.docstore.ids_for_document(document_id)
+
+    @_writer
     def reset(self):
         """Clear all documents and reset index."""
-        self.index = faiss.IndexFlatL2(self.dim)
-        self.doc_store = {}
-        self.doc_order = []
-        self._save_index()
-        self._save_docstore()
+        self._check_writable()
+        self._set_index(self._new_index())
+        self.build_report = {}
+        self.docstore.clear()
+        self.docstore.set_meta("legacy_imported", "1")
+        self._index_changed()
         logger.info("Vector store reset")
 
     # --- Search ---
-    def search(self, query: str, top_k: int = 3) -> List[Dict]:
+    def version(self) -> str:
+        """Changes whenever stored documents change (including from other processes)."""
+        return f"{self.docstore.generation()}:{self.docstore.checksum()}"
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Query embedding (1-d), memoized for the QUERY_CACHE_SIZE most recent queries."""
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """embed_query for many queries (2-d); the ones not memoized are encoded in one call."""
+        vecs = np.empty((len(queries), self.dim), dtype="float32")
+        missing: Dict[str, List[int]] = {}
+        for pos, query in enumerate(queries):
+            vec = self.cached_query_vector(query)
+            if vec is None:
+                missing.setdefault(query, []).append(pos)
+            else:
+                vecs[pos] = vec
+
+        if missing:
+            with EMBED_SECONDS.time(kind="query"):
+                encoded = self._encode(list(missing))
+            with self._query_lock:
+                for (query, positions), vec in zip(missing.items(), encoded):
+                    vecs[positions] = vec
+                    self._query_vectors[query] = vec
+                    self._query_vectors.move_to_end(query)
+                while len(self._query_vectors) > self.QUERY_CACHE_SIZE:
+                    self._query_vectors.popitem(last=False)
+        return vecs
+
+    def cached_query_vector(self, query: str) -> Optional[np.ndarray]:
+        """The memoized embedding of query, or None if it hasn't been embedded recently."""
+        with self._query_lock:
+            vec = self._query_vectors.get(query)
+            if vec is not None:
+                self._query_vectors.move_to_end(query)
+            return vec
+
+    def search(self, query: str, top_k: int = 3, filters: Optional[Dict] = None,
+               timings: Optional[Dict[str, float]] = None) -> List[Dict]:
         """
         Search for most relevant documents given a query string.
         Returns list of {"document": doc_dict, "score": similarity}
+        Only the top-k hits are read from the docstore.
+        filters ({"category", "doc_type", "tags"}) restrict the search to
+        matching chunks inside FAISS, see _selector.
+        Stage durations ("embed", "vector_search"; ms) are added to timings.
         """
-        if not query.strip() or len(self.doc_order) == 0:
+        timings = {} if timings is None else timings
+        if not query.strip():
+            return []
+        try:
+            started = time.perf_counter()
+            query_vector = self.embed_query(query)
+            timings["embed"] = _elapsed_ms(started)
+            started = time.perf_counter()
+            results = self.search_by_vector(query_vector, top_k, filters)
+            timings["vector_search"] = _elapsed_ms(started)
+            return results
+        except Exception:
+            logger.exception("Search failed")
             return []
 
+    def _selector(self, filters: Tuple) -> Tuple[int, Optional["faiss.IDSelector"]]:
+        """
+        (number of matching chunks, IDSelectorBatch over their FAISS ids) for
+        normalized filters. Selectors are built from the docstore's facet
+        table once and reused until the stored documents change.
+        """
+        generation = self.docstore.generation()
+        with self._query_lock:
+            if generation != self._selectors_generation:
+                self._selectors.clear()
+                self._selectors_generation = generation
+            cached = self._selectors.get(filters)
+            if cached is not None:
+                self._selectors.move_to_end(filters)
+                return cached
+
+        ids = np.asarray(self.docstore.facet_ids(filters), dtype="int64")
+        cached = (len(ids), faiss.IDSelectorBatch(ids) if len(ids) else None)
+        with self._query_lock:
+            if generation == self._selectors_generation:
+                self._selectors[filters] = cached
+                if len(self._selectors) > self.FILTER_CACHE_SIZE:
+                    self._selectors.popitem(last=False)
+        return cached
+
+    def _vector_candidates(self, query_vector: np.ndarray, k: int,
+                           filters: Optional[Dict] = None) -> List[Tuple[int, float]]:
+        """(faiss_id, L2 distance) of the k nearest chunks (matching filters), nearest first."""
+        return self._vector_candidates_batch(np.asarray(query_vector).reshape(1, -1), k, filters)[0]
+
+    def _vector_candidates_batch(self, query_vectors: np.ndarray, k: int,
+                                 filters: Optional[Dict] = None) -> List[List[Tuple[int, float]]]:
+        """_vector_candidates for each row of query_vectors, in one index.search call."""
+        empty = [[] for _ in range(len(query_vectors))]
+        self._maybe_reload()
+        if self.index.ntotal == 0 or not len(query_vectors):
+            return empty
+        filters = normalize_filters(filters)
+        selector = None
+        if filters:
+            allowed, selector = self._selector(filters)
+            if not allowed:
+                return empty
+            k = min(k, allowed)
+        q = np.ascontiguousarray(query_vectors, dtype="float32")
+        with self._index_lock.reading():
+            index = self.index
+            k = min(k, self._live_count())
+            if k <= 0:
+                return empty
+            with VECTOR_SEARCH_SECONDS.time():
+                if self._dead is not None:
+                    distances, indices = search_excluding(index, q, k, self._dead, selector)
+                else:
+                    params = search_parameters(index, selector) if selector is not None else None
+                    distances, indices = index.search(q, k, params=params)
+        return [
+            [(int(idx), float(dist)) for idx, dist in zip(row_ids, row_dists) if idx >= 0]
+            for row_ids, row_dists in zip(indices, distances)
+        ]
+
+    def _resolve(self, scored: List[Tuple[int, float]]) -> List[Dict]:
+        """[(faiss_id, score)] -> [{"document", "score"}], reading only these rows."""
+        docs = self.docstore.get_many([faiss_id for faiss_id, _ in scored])
+        return [
+            {"document": docs[faiss_id], "score": score}
+            for faiss_id, score in scored
+            if faiss_id in docs
+        ]
+
+    def search_by_vector(self, query_vector: np.ndarray, top_k: int = 3,
+                         filters: Optional[Dict] = None) -> List[Dict]:
+        """search() for an already-embedded query."""
         try:
-            q = self._embed_batch([query])
-            distances, indices = self.index.search(q, min(top_k, len(self.doc_order)))
+            hits = self._vector_candidates(query_vector, top_k, filters)
+            return self._resolve([(faiss_id, 1 / (1 + dist)) for faiss_id, dist in hits])  # similarity score
+        except Exception:
+            logger.exception("Search failed")
+            return []
 
-            results = []
-            for idx, dist in zip(indices[0], distances[0]):
-                if idx < 0 or idx >= len(self.doc_order):
-                    continue
-                doc_id = self.doc_order[idx]
-                results.append({
-                    "document": self.doc_store[doc_id],
-                    "score": 1 / (1 + float(dist)),  # similarity score
-                })
+    def search_batch(self, queries: List[str], top_k: int = 3,
+                     filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        search() for many queries at once: one encoder call, one index.search
+        over the stacked query matrix and one docstore read. Returns one
+        result list per query (empty for blank queries).
+        """
+        results: List[List[Dict]] = [[] for _ in queries]
+        positions = [pos for pos, query in enumerate(queries) if query.strip()]
+        if not positions:
+            return results
+        try:
+            vectors = self.embed_queries([queries[pos] for pos in positions])
+            hits = self._vector_candidates_batch(vectors, top_k, filters)
+            docs = self.docstore.get_many(list({faiss_id for row in hits for faiss_id, _ in row}))
+        except Exception:
+            logger.exception("Batch search failed")
             return results
+        for pos, row in zip(positions, hits):
+            results[pos] = [
+                {"document": docs[faiss_id], "score": 1 / (1 + dist)}
+                for faiss_id, dist in row
+                if faiss_id in docs
+            ]
+        return results
+
+    def lexical_search(self, query: str, top_k: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        """BM25 keyword search over chunk titles and contents (see DocStore.lexical_search)."""
+        try:
+            return self._resolve(self.docstore.lexical_search(query, top_k, normalize_filters(filters)))
         except Exception:
+            logger.exception("Lexical search failed")
+            return []
+
+    def hybrid_search(self, query: str, top_k: int = 3, candidates: Optional[int] = None,
+                      filters: Optional[Dict] = None, timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Vector + BM25 retrieval fused with reciprocal-rank fusion:
+            score(chunk) = sum over both rankings of 1 / (HYBRID_RRF_K + rank)
+        Each path ranks `candidates` chunks (HYBRID_CANDIDATES); the lexical
+        query runs on a worker thread while the query is embedded and searched.
+        Exact tokens (SKUs, order numbers, policy names) that embeddings blur
+        are caught by BM25.
+        Stage durations ("embed", "vector_search", "lexical_search"; ms) are
+        added to timings.
+        """
+        timings = {} if timings is None else timings
+        if not query.strip():
+            return []
+        candidates = max(top_k, candidates or getattr(settings, "HYBRID_CANDIDATES", 20))
+        try:
+            normalized = normalize_filters(filters)
+        except ValueError:
             logger.exception("Search failed")
             return []
 
+        def timed_lexical():
+            started = time.perf_counter()
+            try:
+                return self.docstore.lexical_search(query, candidates, normalized)
+            finally:
+                timings["lexical_search"] = _elapsed_ms(started)
+
+        lexical = self._retrieval_pool.submit(timed_lexical)
+        try:
+            started = time.perf_counter()
+            query_vector = self.embed_query(query)
+            timings["embed"] = _elapsed_ms(started)
+            started = time.perf_counter()
+            vector_hits = self._vector_candidates(query_vector, candidates, filters)
+            timings["vector_search"] = _elapsed_ms(started)
+        except Exception:
+            logger.exception("Vector search failed, using lexical results only")
+            vector_hits = []
+        try:
+            lexical_hits = lexical.result()
+        except Exception:
+            logger.exception("Lexical search failed, using vector results only")
+            lexical_hits = []
+
+        scores: Dict[int, float] = {}
+        for hits in (vector_hits, lexical_hits):
+            for rank, (faiss_id, _) in enumerate(hits, start=1):
+                scores[faiss_id] = scores.get(faiss_id, 0.0) + 1.0 / (self.HYBRID_RRF_K + rank)
+        best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        try:
+            return self._resolve([(faiss_id, round(scores[faiss_id], 6)) for faiss_id in best])
+        except Exception:
+            logger.exception("Search failed")
+            return []
+
+
+def get_vector_store():
+    """
+    The process-wide store: a client of the run_vector_server sidecar when
+    VECTOR_STORE_SOCKET is set, otherwise an in-process VectorStore.
+    """
+    socket_path = getattr(settings, "VECTOR_STORE_SOCKET", "")
+    if socket_path:
+        from .vector_service import RemoteVectorStore
+        return RemoteVectorStore(socket_path)
+    return VectorStore()
+
 
 # Singleton instance
-vector_db = VectorStore()
+vector_db = get_vector_store()
+
+metrics.gauge("rag_index_vectors", "Live vectors in the FAISS index.", lambda: vector_db.stats()["vectors"])
+metrics.gauge("rag_index_bytes", "Size of the persisted FAISS index file.", lambda: vector_db.stats()["index_bytes"])
+metrics.gauge("rag_docstore_bytes", "Size of the SQLite docstore file.", lambda: vector_db.stats()["docstore_bytes"])
@@ -1,30 +1,136 @@
 # chat/views.py
+import json
+import time
 import logging
-from rest_framework import generics, status, serializers
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import exceptions, generics, status, serializers
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
+from core import metrics
+from .ai_services import ERROR_RESPONSE, ai_service
 from .models import ChatSession, ChatMessage
+from . import repository
 from .serializers import ChatSessionSerializer, ChatMessageSerializer
 from .services import rag_service
 
 logger = logging.getLogger(__name__)
 
+CHAT_REQUEST_SECONDS = metrics.histogram(
+    "chat_request_seconds", "Chat requests end to end (streams: until the done event).", ("view", "status")
+)
+
+
+def _observe_request(view: str, start: float, status_code: int) -> None:
+    CHAT_REQUEST_SECONDS.observe(time.perf_counter() - start, view=view, status=status_code)
+
+
+class ChatHistoryPagination(CursorPagination):
+    """Newest sessions first; cursors seek on the (user, created_at) index."""
+    ordering = "-created_at"
+    page_size = getattr(settings, "CHAT_HISTORY_PAGE_SIZE", 50)
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
 
 class ChatHistoryView(generics.ListAPIView):
     """
-    Returns all chat sessions for the authenticated user,
-    including their messages.
+    Returns the authenticated user's chat sessions, newest first, with
+    each session's message count and last message preview (see
+    ChatSessionSerializer). Paginated by cursor (?cursor=, ?page_size=).
     """
     serializer_class = ChatSessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ChatHistoryPagination
 
     def get_queryset(self):
-        return (
-            ChatSession.objects.filter(user=self.request.user)
-            .prefetch_related("messages")
-            .order_by("-created_at")
-        )
+        return ChatSession.objects.filter(user=self.request.user).with_summary()
+
+
+# --- Session messages ---
+class ChatMessagePagination(CursorPagination):
+    """Oldest messages first; cursors seek on the (session, created_at) index."""
+    ordering = ("created_at", "id")
+    page_size = getattr(settings, "CHAT_MESSAGES_PAGE_SIZE", 100)
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+def _export_lines(session_id: int, batch_size: int):
+    """
+    One JSON line per message of the session, oldest first. Reads
+    batch_size messages at a time, seeking past the last (created_at, id)
+    seen, so memory stays flat however long the session is.
+    """
+    messages = ChatMessage.objects.filter(session_id=session_id).order_by("created_at", "id")
+    batch = list(messages[:batch_size])
+    while batch:
+        for msg in batch:
+            yield json.dumps(ChatMessageSerializer(msg).data, ensure_ascii=False) + "\n"
+        if len(batch) < batch_size:
+            break
+        last = batch[-1]
+        batch = list(messages.filter(
+            Q(created_at__gt=last.created_at) | Q(created_at=last.created_at, id__gt=last.id)
+        )[:batch_size])
+
+
+class ChatSessionMessagesView(generics.ListAPIView):
+    """
+    Messages of one of the user's sessions, oldest first, paginated by
+    cursor (?cursor=, ?page_size=). The response also carries the session
+    (title, message count, last message preview).
+    With ?stream=true the whole conversation is streamed instead, as JSON
+    lines (application/x-ndjson), for exports of long sessions.
+    """
+    serializer_class = ChatMessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ChatMessagePagination
+
+    def get_session(self):
+        if not hasattr(self, "_session"):
+            self._session = get_object_or_404(
+                ChatSession.objects.with_summary(), id=self.kwargs["session_id"], user=self.request.user
+            )
+        return self._session
+
+    def get_queryset(self):
+        return ChatMessage.objects.filter(session=self.get_session())
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream", "").lower() in ("1", "true", "yes"):
+            session = self.get_session()
+            response = StreamingHttpResponse(
+                _export_lines(session.id, getattr(settings, "CHAT_EXPORT_BATCH_SIZE", 500)),
+                content_type="application/x-ndjson",
+            )
+            response["Content-Disposition"] = f'attachment; filename="chat-session-{session.id}.jsonl"'
+            return response
+        return super().list(request, *args, **kwargs)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["session"] = ChatSessionSerializer(self.get_session()).data
+        return response
+
+
+class ChatFiltersSerializer(serializers.Serializer):
+    """
+    Restricts retrieval to matching documents, like DocumentViewSet's
+    ?category= / ?tags= filters (every listed tag must be present).
+    """
+    category = serializers.CharField(required=False, allow_blank=True)
+    doc_type = serializers.CharField(required=False, allow_blank=True)
+    tags = serializers.ListField(child=serializers.CharField(), required=False)
 
 
 class ChatRequestSerializer(serializers.Serializer):
@@ -33,19 +139,32 @@ class ChatRequestSerializer(serializers.Serializer):
     """
     message = serializers.CharField()
     session_id = serializers.IntegerField(required=False)
+    filters = ChatFiltersSerializer(required=False)
+    provider = serializers.CharField(required=False, help_text="LLM provider to answer with (default: LLM_PROVIDER)")
+
+    def validate_provider(self, value):
+        if value not in ai_service.providers:
+            raise serializers.ValidationError(f"Choose one of: {', '.join(ai_service.providers)}.")
+        return value
 
 
 class ChatView(APIView):
     """
     Handles chat requests:
-    - Creates or retrieves a chat session
-    - Saves the user message
+    - Retrieves the chat session (if one is given)
     - Runs the RAG pipeline
-    - Saves the assistant response
+    - Saves the session, user message and assistant response together
+      (see chat/repository.py)
     - Returns session, messages, and metadata
     """
     permission_classes = [IsAuthenticated]
 
+    def dispatch(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().dispatch(request, *args, **kwargs)
+        _observe_request("send", start, response.status_code)
+        return response
+
     def post(self, request, *args, **kwargs):
         serializer = ChatRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -58,45 +177,32 @@ class ChatView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Get or create session
+        # Existing session (a new one is created when the turn is saved)
+        session = None
         if session_id:
-            try:
-                session = ChatSession.objects.get(id=session_id, user=request.user)
-            except ChatSession.DoesNotExist:
+            session = repository.get_session(request.user, session_id)
+            if session is None:
                 return Response(
                     {"error": "Chat session not found"},
                     status=status.HTTP_404_NOT_FOUND,
                 )
-        else:
-            session = ChatSession.objects.create(user=request.user)
-
-        # Save user message
-        user_msg = ChatMessage.objects.create(
-            session=session, role="user", content=user_message
-        )
 
         # Run RAG pipeline
         try:
-            rag_result = rag_service.process_query(user_message, session.id)
+            rag_result = rag_service.process_query(
+                user_message,
+                session.id if session else None,
+                serializer.validated_data.get("filters"),
+                provider=serializer.validated_data.get("provider"),
+            )
             ai_response = rag_result.get("response", "No response generated.")
         except Exception as e:
             logger.error("RAG service failed: %s", e, exc_info=True)
-            ai_response = (
-                "Sorry, I had trouble generating a response. Please try again later."
-            )
+            ai_response = ERROR_RESPONSE
             rag_result = {"success": False}
 
-        # Save assistant message
-        ai_msg = ChatMessage.objects.create(
-            session=session, role="assistant", content=ai_response
-        )
-
-        # Auto‑title session if empty
-        if not session.title:
-            session.title = (
-                user_message[:50] + ("..." if len(user_message) > 50 else "")
-            )
-            session.save(update_fields=["title"])
+        # One transaction: session/title, then both messages in one insert
+        session, user_msg, ai_msg = repository.save_turn(request.user, session, user_message, ai_response)
 
         return Response(
             {
@@ -107,3 +213,111 @@ class ChatView(APIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+# --- Streaming chat (Server-Sent Events) ---
+def _sse(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
+
+
+def _start_stream(request):
+    """
+    Sync prelude of ChatStreamView: authenticate with the DRF settings,
+    validate the body, and save the user message.
+    Returns (session, user_msg, message, filters, provider) or an error JsonResponse.
+    """
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = drf_request.user
+        data = drf_request.data
+    except exceptions.APIException as e:
+        return JsonResponse({"detail": str(e.detail)}, status=e.status_code)
+    if not user or not user.is_authenticated:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    serializer = ChatRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    user_message = serializer.validated_data["message"].strip()
+    if not user_message:
+        return JsonResponse({"error": "Message cannot be empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+    session = None
+    session_id = serializer.validated_data.get("session_id")
+    if session_id:
+        session = repository.get_session(user, session_id)
+        if session is None:
+            return JsonResponse({"error": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    session, user_msg = repository.start_turn(user, session, user_message)
+    validated = serializer.validated_data
+    return session, user_msg, user_message, validated.get("filters"), validated.get("provider")
+
+
+def _finish_stream(session, ai_response: str) -> dict:
+    ai_msg = repository.finish_turn(session, ai_response)
+    return {
+        "session": ChatSessionSerializer(session).data,
+        "assistant_message": ChatMessageSerializer(ai_msg).data,
+    }
+
+
+async def _stream_events(session, user_msg, user_message: str, filters=None, provider=None, started_at=None):
+    # Sent before retrieval so the client gets its first byte immediately
+    yield _sse("session", {
+        "session_id": session.id,
+        "user_message": ChatMessageSerializer(user_msg).data,
+    })
+
+    rag_result = {"success": False}
+    parts = []
+    try:
+        async for event in rag_service.stream_query(user_message, session.id, filters, provider=provider):
+            if event["type"] == "token":
+                parts.append(event["text"])
+                yield _sse("token", {"text": event["text"]})
+            else:
+                rag_result = event["result"]
+    except Exception as e:
+        logger.error("RAG stream failed: %s", e, exc_info=True)
+        if not parts:
+            parts.append(ERROR_RESPONSE)
+            yield _sse("token", {"text": ERROR_RESPONSE})
+
+    ai_response = rag_result.get("response") or "".join(parts).strip() or ERROR_RESPONSE
+    saved = await sync_to_async(_finish_stream)(session, ai_response)
+    yield _sse("done", {**saved, "rag_metadata": rag_result})
+    if started_at is not None:
+        _observe_request("stream", started_at, status.HTTP_200_OK)
+
+
+@csrf_exempt
+@require_POST
+async def chat_stream_view(request):
+    """
+    Streaming counterpart of ChatView, served as text/event-stream:
+        event: session  {"session_id", "user_message"}
+        event: token    {"text"}  (one per generated chunk)
+        event: done     {"session", "assistant_message", "rag_metadata"}
+    The assistant message is saved once generation has finished. Runs
+    natively under ASGI (core.asgi) so no worker is held while Gemini streams.
+    """
+    started_at = time.perf_counter()
+    started = await sync_to_async(_start_stream)(request)
+    if isinstance(started, JsonResponse):
+        _observe_request("stream", started_at, started.status_code)
+        return started
+
+    response = StreamingHttpResponse(
+        _stream_events(*started, started_at=started_at), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
@@ -0,0 +1,5 @@
+# The scheduler starts on import (core/__init__.py); its background jobs
+# (chat cleanup, ingestion queue) must not run against the test database.
+from core.scheduler import stop_scheduler
+
+stop_scheduler()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import socket
+import tempfile
+import subprocess
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+
+POSTGRES_TUNING = "-c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pg_tool(name, pg_bin):
+    path = shutil.which(name, path=pg_bin) if pg_bin else shutil.which(name)
+    return path or ""
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a command (e.g. `-- python -m pytest -q`) against a throwaway database: a temporary local "
+        "Postgres cluster if initdb/pg_ctl are installed (no Docker), else a file SQLite database in WAL mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("args", nargs="+", metavar="command", help="Command to run, after --.")
+        parser.add_argument("--sqlite", action="store_true", help="Use SQLite (WAL) even if Postgres is installed.")
+        parser.add_argument("--pg-bin", default=os.environ.get("PG_BIN", ""),
+                            help="Directory with initdb and pg_ctl (default: PATH, or $PG_BIN).")
+        parser.add_argument("--keep", action="store_true", help="Keep the database directory afterwards.")
+
+    def handle(self, *args, **options):
+        initdb, pg_ctl = _pg_tool("initdb", options["pg_bin"]), _pg_tool("pg_ctl", options["pg_bin"])
+        use_postgres = not options["sqlite"] and initdb and pg_ctl
+        if not options["sqlite"] and not use_postgres:
+            self.stderr.write(self.style.WARNING("initdb/pg_ctl not found; falling back to SQLite (WAL)."))
+
+        workdir = Path(tempfile.mkdtemp(prefix="ephemeral-db-"))
+        data = workdir / "data"
+        started = False
+        env = dict(os.environ)
+        try:
+            if use_postgres:
+                port = _free_port()
+                subprocess.run([initdb, "-D", str(data), "-U", "postgres", "--auth=trust", "-E", "UTF8",
+                                "--no-sync"], check=True, stdout=subprocess.DEVNULL)
+                subprocess.run([pg_ctl, "-D", str(data), "-l", str(workdir / "postgres.log"), "-w", "start",
+                                "-o", f"-p {port} -c listen_addresses=127.0.0.1 -k {workdir} {POSTGRES_TUNING}"],
+                               check=True, stdout=subprocess.DEVNULL)
+                started = True
+                env["DATABASE_URL"] = f"postgres://postgres@127.0.0.1:{port}/postgres"
+            else:
+                env["DATABASE_URL"] = f"sqlite:///{workdir / 'db.sqlite3'}"
+                env["DB_TEST_NAME"] = str(workdir / "test.sqlite3")  # a real file, so WAL applies
+            self.stderr.write(f"DATABASE_URL={env['DATABASE_URL']}")
+        except (OSError, subprocess.CalledProcessError) as e:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise CommandError(f"Could not start Postgres: {e}")
+        try:
+            code = subprocess.run(list(args), env=env).returncode
+        except OSError as e:
+            raise CommandError(f"Could not run {args[0]}: {e}")
+        finally:
+            if started:
+                subprocess.run([pg_ctl, "-D", str(data), "-m", "immediate", "stop"], stdout=subprocess.DEVNULL)
+            if options["keep"]:
+                self.stderr.write(f"Database kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+        if code:
+            raise SystemExit(code)
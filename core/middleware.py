@@ -0,0 +1,53 @@
+# core/middleware.py
+"""
+StatementTimeoutMiddleware: per-endpoint Postgres statement timeouts.
+
+DB_STATEMENT_TIMEOUTS maps path prefixes to milliseconds (longest prefix
+wins); other paths keep the connection default (DB_STATEMENT_TIMEOUT_MS).
+The timeout is SET on the request's connection before the view runs and
+left in place afterwards, so streamed responses keep it while they read.
+The value is remembered per connection: a persistent connection only pays
+for the SET when the timeout changes, and a new (or newly borrowed pooled)
+connection starts from the default again (pooled connections are RESET
+when returned, see core.db.reset_session).
+
+No-op on other databases.
+"""
+import logging
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .db import statement_timeout_for
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(connection_created)
+def _reset_statement_timeout(sender, connection, **kwargs):
+    connection.statement_timeout_ms = None  # the connection default
+
+
+def set_statement_timeout(timeout_ms):
+    """SET (or, with None, RESET) statement_timeout on this thread's connection if it differs."""
+    if connection.vendor != "postgresql" or getattr(connection, "statement_timeout_ms", None) == timeout_ms:
+        return
+    if timeout_ms is None and connection.connection is None:
+        return  # the next connection starts with the default anyway
+    with connection.cursor() as cursor:
+        if timeout_ms is None:
+            cursor.execute("RESET statement_timeout")
+        else:
+            cursor.execute("SELECT set_config('statement_timeout', %s, false)", [f"{int(timeout_ms)}ms"])
+    connection.statement_timeout_ms = timeout_ms
+
+
+class StatementTimeoutMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timeouts = getattr(settings, "DB_STATEMENT_TIMEOUTS", [])
+        if timeouts:
+            set_statement_timeout(statement_timeout_for(request.path, timeouts))
+        return self.get_response(request)
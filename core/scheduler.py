@@ -1,6 +1,5 @@
 # core/scheduler.py
 import logging
-from datetime import timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.utils import timezone
 from django.conf import settings
@@ -14,26 +13,26 @@ scheduler = BackgroundScheduler(timezone=str(timezone.get_current_timezone()))
 def cleanup_old_chats():
     """
     Delete chat messages older than CHAT_RETENTION_DAYS (default: 30)
-    and remove empty sessions.
+    and remove empty sessions, in resumable batches (see chat/retention.py).
     """
-    from chat.models import ChatMessage, ChatSession
+    from chat.retention import purge_old_chats
 
     try:
-        days = getattr(settings, "CHAT_RETENTION_DAYS", 30)
-        cutoff = timezone.now() - timedelta(days=days)
-
-        deleted_messages, _ = ChatMessage.objects.filter(created_at__lt=cutoff).delete()
-        deleted_sessions, _ = ChatSession.objects.filter(messages__isnull=True).delete()
-
-        logger.info(
-            "Cleanup job: deleted %s old messages and %s empty sessions",
-            deleted_messages,
-            deleted_sessions,
-        )
+        purge_old_chats()
     except Exception as e:
         logger.error("Cleanup job failed: %s", e)
 
 
+def dispatch_ingestion_jobs():
+    """
+    Run queued document ingestion jobs in the background
+    (see documents/tasks.py).
+    """
+    from documents.tasks import dispatch_ingestion_jobs as dispatch
+
+    dispatch()
+
+
 def send_verification_email(user):
     """
     Sends a verification email to a newly registered user.
@@ -72,10 +71,23 @@ def start_scheduler():
         minute=0,
         id="cleanup_old_chats",
         replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+    )
+
+    # Poll the ingestion queue; claimed jobs run on the scheduler's thread pool
+    scheduler.add_job(
+        dispatch_ingestion_jobs,
+        "interval",
+        seconds=getattr(settings, "INGESTION_POLL_SECONDS", 2),
+        id="dispatch_ingestion_jobs",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
     )
 
     scheduler.start()
-    logger.info("APScheduler started with cleanup job.")
+    logger.info("APScheduler started with cleanup and ingestion jobs.")
 
 
 def stop_scheduler():
@@ -2,6 +2,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
+from core.metrics import metrics_view
 
 urlpatterns = [
     # Django admin
@@ -21,4 +22,7 @@ urlpatterns = [
 
     # DRF browsable API login/logout (useful in dev)
     path("api-auth/", include("rest_framework.urls")),
+
+    # Prometheus scrape endpoint (core/metrics.py)
+    path("metrics", metrics_view, name="metrics"),
 ]
@@ -1,6 +1,6 @@
 # documents/admin.py
 from django.contrib import admin
-from .models import Document
+from .models import Document, IngestionJob
 
 
 @admin.register(Document)
@@ -18,3 +18,12 @@ class DocumentAdmin(admin.ModelAdmin):
         """Preview of the document content (first 75 chars)."""
         return (obj.content[:75] + "...") if obj.content and len(obj.content) > 75 else obj.content
     short_content.short_description = "Preview"
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    """Background ingestion queue (see documents/tasks.py)."""
+    list_display = ("id", "document_id", "action", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "action")
+    search_fields = ("document_id", "last_error")
+    ordering = ("-created_at",)
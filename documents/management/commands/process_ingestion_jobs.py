@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from documents.tasks import process_ingestion_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued document ingestion jobs (for deployments without the in-process scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting once the queue is drained.",
+        )
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_ingestion_jobs()
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} ingestion jobs."))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -23,11 +23,18 @@ class Document(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, extract=True, **kwargs):
         """
         On save, if a file is uploaded but no content is provided,
         attempt to extract text from the file.
+        extract=False defers that (slow) step to the ingestion job.
         """
+        if extract:
+            self.extract_content()
+        super().save(*args, **kwargs)
+
+    def extract_content(self) -> bool:
+        """Fill content from the uploaded file if it is empty. Returns True if filled."""
         if self.file and not self.content:
             ext = os.path.splitext(self.file.name)[1].lower()
             try:
@@ -49,8 +56,57 @@ class Document(models.Model):
 
             except Exception as e:
                 logger.warning("Failed to extract text from %s: %s", self.file.name, e)
-
-        super().save(*args, **kwargs)
+            return bool(self.content)
+        return False
 
     def __str__(self):
         return self.title or f"Document {self.pk}"
+
+
+class IngestionJob(models.Model):
+    """
+    A queued vector store update for one Document, processed in the
+    background by documents.tasks (see core/scheduler.py).
+    document_id is a plain id so removal jobs outlive the deleted row.
+    """
+    ACTION_INGEST = "ingest"
+    ACTION_REMOVE = "remove"
+    ACTION_CHOICES = [
+        (ACTION_INGEST, "Ingest"),
+        (ACTION_REMOVE, "Remove"),
+    ]
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    document_id = models.BigIntegerField(db_index=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=ACTION_INGEST)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(help_text="Not picked up before this time (retry backoff)")
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+        ]
+
+    def __str__(self):
+        return f"{self.action} document {self.document_id} ({self.status})"
@@ -1,6 +1,6 @@
 # documents/serializers.py
 from rest_framework import serializers
-from .models import Document
+from .models import Document, IngestionJob
 
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -26,6 +26,22 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "uploaded_by", "created_at", "updated_at"]
 
+    def create(self, validated_data):
+        # defer_extraction: the ingestion job extracts file text, not the request
+        if not self.context.get("defer_extraction"):
+            return super().create(validated_data)
+        instance = Document(**validated_data)
+        instance.save(extract=False)
+        return instance
+
+    def update(self, instance, validated_data):
+        if not self.context.get("defer_extraction"):
+            return super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(extract=False)
+        return instance
+
     # Field-level validations
     def validate_title(self, value):
         if not value or not value.strip():
@@ -42,3 +58,24 @@ class DocumentSerializer(serializers.ModelSerializer):
         if value and value not in allowed:
             raise serializers.ValidationError(f"doc_type must be one of {allowed}.")
         return value
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    """Read-only status of a background ingestion job."""
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            "id",
+            "document_id",
+            "action",
+            "status",
+            "attempts",
+            "max_attempts",
+            "last_error",
+            "run_after",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
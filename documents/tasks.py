@@ -0,0 +1,214 @@
+# documents/tasks.py
+"""
+Background ingestion queue.
+
+Document create/update/delete only record an IngestionJob and return.
+The APScheduler tick dispatch_ingestion_jobs (see core/scheduler.py) claims
+due jobs and runs them on the scheduler's thread pool, at most
+INGESTION_WORKERS at a time. A failed job is retried with exponential
+backoff (INGESTION_RETRY_BACKOFF * 2^n seconds) up to INGESTION_MAX_ATTEMPTS
+times.
+
+Every job reconciles the vector store with the document's *current* state
+(active with content -> ingest, otherwise -> remove), so jobs are idempotent
+and a newer job for the same document always wins.
+"""
+import logging
+from datetime import timedelta
+from typing import Optional
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Document, IngestionJob
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentIngestionError(Exception):
+    """Retrying cannot help (e.g. no text could be extracted)."""
+
+
+def enqueue_ingestion(document_id: int, action: str = IngestionJob.ACTION_INGEST, user=None) -> IngestionJob:
+    """
+    Queue a vector store update for a document. A job for the same document
+    that has not started yet is reused instead of adding another one.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            IngestionJob.objects.filter(document_id=document_id, status=IngestionJob.STATUS_QUEUED)
+            .order_by("created_at")
+            .first()
+        )
+        if job is not None:
+            job.action = action
+            job.run_after = min(job.run_after, now)
+            job.save(update_fields=["action", "run_after", "updated_at"])
+            return job
+
+        return IngestionJob.objects.create(
+            document_id=document_id,
+            action=action,
+            created_by=user if getattr(user, "is_authenticated", False) else None,
+            max_attempts=getattr(settings, "INGESTION_MAX_ATTEMPTS", 3),
+            run_after=now,
+        )
+
+
+def submit_ingestion(document_id: int, action: str = IngestionJob.ACTION_INGEST, user=None) -> IngestionJob:
+    """
+    enqueue_ingestion, then either leave the job to the background workers
+    (INGESTION_ASYNC, the default) or run it right away.
+    """
+    job = enqueue_ingestion(document_id, action, user)
+    if not getattr(settings, "INGESTION_ASYNC", True) and _claim(job.id):
+        run_job(job.id)
+        job.refresh_from_db()
+    return job
+
+
+# --- Workers ---
+def _sync_document(document_id: int) -> None:
+    from chat.ingestion import ingest_document, remove_document  # chat loads the vector store
+
+    document = Document.objects.filter(id=document_id).first()
+    if document is None or not document.is_active:
+        if not remove_document(document_id):
+            raise RuntimeError("Vector store rejected the removal")
+        return
+
+    if document.extract_content():
+        document.save(update_fields=["content"], extract=False)
+    if not document.content or not document.content.strip():
+        remove_document(document_id)  # nothing left to search
+        raise PermanentIngestionError("Document has no text content to ingest")
+    if not ingest_document(document):
+        raise RuntimeError("Vector store rejected the update")
+
+
+def _claim(job_id: int) -> bool:
+    """Atomically move a queued job to running (False if another worker got it)."""
+    now = timezone.now()
+    return bool(
+        IngestionJob.objects.filter(id=job_id, status=IngestionJob.STATUS_QUEUED).update(
+            status=IngestionJob.STATUS_RUNNING,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            updated_at=now,
+        )
+    )
+
+
+def claim_next_job() -> Optional[int]:
+    """Claim the oldest due job whose document has no job running. Returns its id."""
+    busy = IngestionJob.objects.filter(status=IngestionJob.STATUS_RUNNING).values("document_id")
+    candidates = (
+        IngestionJob.objects.filter(status=IngestionJob.STATUS_QUEUED, run_after__lte=timezone.now())
+        .exclude(document_id__in=busy)
+        .order_by("created_at")
+        .values_list("id", flat=True)[:10]
+    )
+    for job_id in candidates:
+        if _claim(job_id):
+            return job_id
+    return None
+
+
+def run_job(job_id: int) -> None:
+    """Run a claimed job and record the outcome (success, retry, or failure)."""
+    job = IngestionJob.objects.get(id=job_id)
+    now = timezone.now()
+    try:
+        _sync_document(job.document_id)
+    except Exception as e:
+        retry = not isinstance(e, PermanentIngestionError) and job.attempts < job.max_attempts
+        logger.warning(
+            "Ingestion job %s (document %s) attempt %s failed%s: %s",
+            job.id, job.document_id, job.attempts, ", will retry" if retry else "", e,
+        )
+        if retry:
+            backoff = getattr(settings, "INGESTION_RETRY_BACKOFF", 30) * 2 ** (job.attempts - 1)
+            updates = {"status": IngestionJob.STATUS_QUEUED, "run_after": now + timedelta(seconds=backoff)}
+        else:
+            updates = {"status": IngestionJob.STATUS_FAILED, "finished_at": now}
+        IngestionJob.objects.filter(id=job.id).update(last_error=str(e)[:2000], updated_at=now, **updates)
+        return
+
+    IngestionJob.objects.filter(id=job.id).update(
+        status=IngestionJob.STATUS_SUCCEEDED, finished_at=now, last_error="", updated_at=now
+    )
+    logger.info("Ingestion job %s (%s document %s) succeeded", job.id, job.action, job.document_id)
+
+
+def requeue_stale_jobs() -> int:
+    """Jobs left running by a worker that died are retried (or failed when out of attempts)."""
+    now = timezone.now()
+    stale = IngestionJob.objects.filter(
+        status=IngestionJob.STATUS_RUNNING,
+        started_at__lt=now - timedelta(seconds=getattr(settings, "INGESTION_JOB_TIMEOUT", 900)),
+    )
+    message = "Worker stopped before the job finished"
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=IngestionJob.STATUS_FAILED, finished_at=now, last_error=message, updated_at=now
+    )
+    requeued = stale.update(status=IngestionJob.STATUS_QUEUED, run_after=now, last_error=message, updated_at=now)
+    if failed or requeued:
+        logger.warning("Recovered stale ingestion jobs: %s requeued, %s failed", requeued, failed)
+    return requeued
+
+
+def _run_claimed_job(job_id: int):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("Ingestion job %s crashed", job_id)
+    finally:
+        close_old_connections()
+
+
+def dispatch_ingestion_jobs():
+    """
+    Scheduler tick: hand due jobs to the scheduler's thread pool, keeping at
+    most INGESTION_WORKERS running (across all processes sharing the DB).
+    """
+    from core.scheduler import scheduler
+
+    close_old_connections()
+    try:
+        requeue_stale_jobs()
+        running = IngestionJob.objects.filter(status=IngestionJob.STATUS_RUNNING).count()
+        for _ in range(getattr(settings, "INGESTION_WORKERS", 2) - running):
+            job_id = claim_next_job()
+            if job_id is None:
+                break
+            try:
+                # misfire_grace_time=None: a claimed job must run even if the pool is busy
+                scheduler.add_job(
+                    _run_claimed_job, args=[job_id], name=f"ingestion_job_{job_id}", misfire_grace_time=None
+                )
+            except Exception:
+                IngestionJob.objects.filter(id=job_id).update(
+                    status=IngestionJob.STATUS_QUEUED, attempts=F("attempts") - 1
+                )
+                raise
+    except DatabaseError as e:
+        logger.warning("Ingestion queue unavailable (migrations not applied?): %s", e)
+    except Exception:
+        logger.exception("Ingestion dispatch failed")
+    finally:
+        close_old_connections()
+
+
+def process_ingestion_jobs(max_jobs: Optional[int] = None) -> int:
+    """Run due jobs inline until the queue is drained (or max_jobs ran). Returns the count."""
+    requeue_stale_jobs()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job_id = claim_next_job()
+        if job_id is None:
+            break
+        run_job(job_id)
+        processed += 1
+    return processed
@@ -0,0 +1,98 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from chat import ingestion
+from documents.models import Document, IngestionJob
+from documents.tasks import enqueue_ingestion, process_ingestion_jobs
+from users.models import User
+
+
+@pytest.fixture
+def vector_calls(monkeypatch):
+    """Record vector store updates instead of embedding anything."""
+    calls = []
+    monkeypatch.setattr(ingestion, "ingest_document", lambda doc: calls.append(("ingest", doc.id)) or True)
+    monkeypatch.setattr(ingestion, "remove_document", lambda doc_id: calls.append(("remove", doc_id)) or True)
+    return calls
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    user = User.objects.create_user(username="urmi", email="urmi@example.com", password="pass12345")
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.mark.django_db
+def test_create_returns_queued_job_and_worker_ingests(client, vector_calls):
+    response = client.post(
+        reverse("documents-list"),
+        {"title": "Return Policy", "content": "Items can be returned within 30 days."},
+        format="json",
+    )
+
+    assert response.status_code == 201
+    job = response.data["ingestion_job"]
+    assert job["status"] == IngestionJob.STATUS_QUEUED
+    assert vector_calls == []  # nothing happened inside the request
+
+    assert process_ingestion_jobs() == 1
+    assert vector_calls == [("ingest", response.data["id"])]
+
+    status = client.get(reverse("ingestion-jobs-detail", args=[job["id"]]))
+    assert status.status_code == 200
+    assert status.data["status"] == IngestionJob.STATUS_SUCCEEDED
+    assert status.data["attempts"] == 1
+
+
+@pytest.mark.django_db
+def test_failed_job_is_retried_then_marked_failed(settings, monkeypatch, vector_calls):
+    settings.INGESTION_RETRY_BACKOFF = 0
+    monkeypatch.setattr(ingestion, "ingest_document", lambda doc: False)
+    doc = Document.objects.create(title="Shipping", content="Ships in 5 days.")
+
+    job = enqueue_ingestion(doc.id)
+    assert process_ingestion_jobs() == job.max_attempts
+
+    job.refresh_from_db()
+    assert job.status == IngestionJob.STATUS_FAILED
+    assert job.attempts == job.max_attempts
+    assert "rejected" in job.last_error
+
+
+@pytest.mark.django_db
+def test_pending_jobs_coalesce_and_reconcile_current_state(vector_calls):
+    doc = Document.objects.create(title="Shipping", content="Ships in 5 days.")
+    doc_id = doc.id
+
+    first = enqueue_ingestion(doc_id)
+    second = enqueue_ingestion(doc_id)
+    assert first.id == second.id
+
+    doc.delete()  # the queued "ingest" job now removes it
+    assert process_ingestion_jobs() == 1
+    assert vector_calls == [("remove", doc_id)]
+
+
+@pytest.mark.django_db
+def test_synchronous_mode_runs_job_in_request(client, settings, vector_calls):
+    settings.INGESTION_ASYNC = False
+    response = client.post(
+        reverse("documents-list"),
+        {"title": "Return Policy", "content": "Items can be returned within 30 days."},
+        format="json",
+    )
+
+    assert response.data["ingestion_job"]["status"] == IngestionJob.STATUS_SUCCEEDED
+    assert vector_calls == [("ingest", response.data["id"])]
+
+
+@pytest.mark.django_db
+def test_job_list_rejects_non_numeric_document_filter(client, vector_calls):
+    doc = Document.objects.create(title="Shipping", content="Ships in 5 days.")
+    enqueue_ingestion(doc.id)
+
+    assert client.get(reverse("ingestion-jobs-list"), {"document": "abc"}).status_code == 400
+    response = client.get(reverse("ingestion-jobs-list"), {"document": str(doc.id)})
+    assert response.status_code == 200
@@ -1,9 +1,11 @@
 # documents/urls.py
 from rest_framework.routers import DefaultRouter
-from .views import DocumentViewSet
+from .views import DocumentViewSet, IngestionJobViewSet
 
 router = DefaultRouter()
 # Use plural for both the URL prefix and the basename for consistency
 router.register(r"documents", DocumentViewSet, basename="documents")
+# Background ingestion status: /api/documents/ingestion-jobs/<id>/
+router.register(r"ingestion-jobs", IngestionJobViewSet, basename="ingestion-jobs")
 
 urlpatterns = router.urls
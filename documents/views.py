@@ -1,9 +1,10 @@
 # documents/views.py
 import logging
-from rest_framework import viewsets, permissions, filters
-from .models import Document
-from .serializers import DocumentSerializer
-from chat.ingestion import ingest_document
+from django.conf import settings
+from rest_framework import viewsets, permissions, filters, serializers
+from .models import Document, IngestionJob
+from .serializers import DocumentSerializer, IngestionJobSerializer
+from .tasks import submit_ingestion
 
 logger = logging.getLogger(__name__)
 
@@ -43,23 +44,72 @@ class DocumentViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # File text extraction happens in the ingestion job when it runs in the background
+        context["defer_extraction"] = getattr(settings, "INGESTION_ASYNC", True)
+        return context
+
+    def _with_job(self, response):
+        job = getattr(self, "ingestion_job", None)
+        if job is not None:
+            response.data["ingestion_job"] = {"id": job.id, "status": job.status}
+        return response
+
+    def create(self, request, *args, **kwargs):
+        return self._with_job(super().create(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        return self._with_job(super().update(request, *args, **kwargs))
+
     def perform_create(self, serializer):
         """
-        Save document and ingest into FAISS for retrieval.
-        Ensures content is extracted before ingestion.
+        Save document and queue its ingestion into FAISS.
+        The response carries the job id; poll ingestion-jobs/<id>/ for status.
         """
         doc = serializer.save(uploaded_by=self.request.user)
-        if not doc.content and doc.file:
-            doc.save()  # triggers extraction in models.py
-        success = ingest_document(doc)
-        logger.info("Document %s ingested: %s", doc.id, success)
+        self.ingestion_job = submit_ingestion(doc.id, IngestionJob.ACTION_INGEST, self.request.user)
+        logger.info("Document %s created, ingestion job %s", doc.id, self.ingestion_job.id)
 
     def perform_update(self, serializer):
         """
-        Update document and re-ingest into FAISS.
+        Update document and queue re-ingestion.
+        Deactivated documents are removed from the index instead.
         """
         doc = serializer.save()
-        if not doc.content and doc.file:
-            doc.save()  # ensure content extracted
-        success = ingest_document(doc)
-        logger.info("Document %s re-ingested: %s", doc.id, success)
+        action = IngestionJob.ACTION_INGEST if doc.is_active else IngestionJob.ACTION_REMOVE
+        self.ingestion_job = submit_ingestion(doc.id, action, self.request.user)
+        logger.info("Document %s updated, %s job %s", doc.id, action, self.ingestion_job.id)
+
+    def perform_destroy(self, instance):
+        """
+        Delete document and queue removal of its chunks from FAISS.
+        """
+        doc_id = instance.id
+        instance.delete()
+        job = submit_ingestion(doc_id, IngestionJob.ACTION_REMOVE, self.request.user)
+        logger.info("Document %s deleted, removal job %s", doc_id, job.id)
+
+
+class IngestionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background ingestion jobs.
+    Supports filtering by ?status= and ?document=.
+    """
+    serializer_class = IngestionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = IngestionJob.objects.all()
+        job_status = self.request.query_params.get("status")
+        document_id = self.request.query_params.get("document")
+
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+
+        if document_id:
+            if not document_id.isdigit():
+                raise serializers.ValidationError({"document": "Must be a document id."})
+            queryset = queryset.filter(document_id=int(document_id))
+
+        return queryset